@@ -4,9 +4,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.db.models import Count, Q
 from bookings.models import UserProfile
 from bookings.forms import UserProfileForm, UserUpdateForm
+from travel_booking.query_budget import query_budget
 
+@query_budget(6)
 def register(request):
     """User registration"""
     if request.method == 'POST':
@@ -22,6 +25,7 @@ def register(request):
         form = UserCreationForm()
     return render(request, 'registration/register.html', {'form': form})
 
+@query_budget(8)
 @login_required
 def profile(request):
     """User profile view"""
@@ -43,9 +47,15 @@ def profile(request):
         user_form = UserUpdateForm(instance=request.user)
         profile_form = UserProfileForm(instance=user_profile)
     
+    booking_stats = request.user.bookings.aggregate(
+        total=Count('id'),
+        confirmed=Count('id', filter=Q(status='confirmed')),
+    )
+    
     context = {
         'user_form': user_form,
         'profile_form': profile_form,
         'user_profile': user_profile,
+        'booking_stats': booking_stats,
     }
     return render(request, 'accounts/profile.html', context)
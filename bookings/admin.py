@@ -1,13 +1,49 @@
-from django.contrib import admin
-from .models import TravelOption, Booking, UserProfile
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from .bulk import add_seats, cancel_bookings, reprice_travel_options
+from .lifecycle import cancel_travel_options, complete_departed
+from .models import ArchivedBooking, ArchivedTravelOption, TravelOption, Booking, Passenger, UserProfile
+from .pagination import EstimatedCountPaginator
+from .search import city_filter
+
+class TravelOptionActionForm(ActionForm):
+    """Action bar with the inputs of the reprice and add-seats actions"""
+    percent = forms.DecimalField(required=False, max_digits=5, decimal_places=2, min_value=-99,
+                                 max_value=999, label='Percent')
+    seats = forms.IntegerField(required=False, min_value=1, max_value=10000, label='Seats')
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists that stay fast on tables with millions of rows"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def action_value(self, request, name):
+        """Clean an action form input, reporting a missing or invalid value"""
+        field = self.action_form.base_fields[name]
+        try:
+            value = field.clean(request.POST.get(name))
+        except ValidationError as error:
+            self.message_user(request, f'{field.label}: {" ".join(error.messages)}', messages.ERROR)
+            return None
+        if value is None:
+            self.message_user(request, f'Enter a value for {field.label.lower()}.', messages.ERROR)
+        return value
 
 @admin.register(TravelOption)
-class TravelOptionAdmin(admin.ModelAdmin):
+class TravelOptionAdmin(LargeTableAdmin):
     list_display = ['travel_id', 'travel_type', 'source', 'destination', 
                    'departure_date', 'departure_time', 'price', 'available_seats', 'status']
     list_filter = ['travel_type', 'status', 'departure_date']
     search_fields = ['travel_id', 'source', 'destination']
     readonly_fields = ['created_at', 'updated_at']
+    # Served by the departure_at index, with the primary key as tie-breaker
+    ordering = ['departure_at', 'pk']
+    action_form = TravelOptionActionForm
+    actions = ['complete_departed_options', 'cancel_options', 'reprice_options', 'add_seats_to_options']
     
     fieldsets = (
         ('Basic Information', {
@@ -27,18 +63,79 @@ class TravelOptionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Match travel IDs exactly and cities through the city key indexes
+        instead of scanning the table with LIKE '%term%'"""
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        matches = Q(travel_id__in={term, term.upper()})
+        for field in ('source_key', 'destination_key'):
+            match = city_filter(term, field)
+            if match is not None:
+                matches |= match
+        return queryset.filter(matches), False
+    
+    @admin.action(description='Mark departed options as completed')
+    def complete_departed_options(self, request, queryset):
+        completed = complete_departed(pks=queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Completed {completed} departed travel option(s).')
+    
+    @admin.action(description='Cancel selected options and their bookings')
+    def cancel_options(self, request, queryset):
+        cancelled, bookings = cancel_travel_options(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Cancelled {cancelled} travel option(s) and {bookings} booking(s).',
+                          messages.WARNING if bookings else messages.SUCCESS)
+    
+    @admin.action(description='Reprice selected active options by percent')
+    def reprice_options(self, request, queryset):
+        percent = self.action_value(request, 'percent')
+        if percent is None:
+            return
+        repriced = reprice_travel_options(queryset.values_list('pk', flat=True), percent)
+        self.message_user(request, f'Repriced {repriced} travel option(s) by {percent}%.')
+    
+    @admin.action(description='Add seats to selected active options')
+    def add_seats_to_options(self, request, queryset):
+        seats = self.action_value(request, 'seats')
+        if seats is None:
+            return
+        extended = add_seats(queryset.values_list('pk', flat=True), seats)
+        self.message_user(request, f'Added {seats} seat(s) to {extended} travel option(s).')
+
+class BookingSearchMixin:
+    """Search bookings by booking or group ID, exactly, or by the customer's
+    username prefix or exact email, through indexes instead of LIKE '%term%'
+    over every booking"""
+    search_fields = ['booking_id', 'group_id', 'user__username', 'user__email']
+    
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        ids = {term, term.upper()}
+        users = User.objects.filter(Q(username__startswith=term) | Q(email=term)).values('pk')
+        return queryset.filter(Q(booking_id__in=ids) | Q(group_id__in=ids) | Q(user__in=users)), False
+
+class PassengerInline(admin.TabularInline):
+    model = Passenger
+    extra = 0
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(BookingSearchMixin, LargeTableAdmin):
     list_display = ['booking_id', 'user', 'travel_option', 'number_of_seats', 
                    'total_price', 'status', 'booking_date']
     list_filter = ['status', 'booking_date', 'travel_option__travel_type']
-    search_fields = ['booking_id', 'user__username', 'passenger_name', 'passenger_email']
-    readonly_fields = ['booking_id', 'booking_date', 'updated_at', 'total_price']
+    list_select_related = ['user', 'travel_option']
+    readonly_fields = ['booking_id', 'group_id', 'booking_date', 'updated_at', 'total_price']
+    autocomplete_fields = ['user', 'travel_option']
+    inlines = [PassengerInline]
+    actions = ['cancel_selected_bookings']
     
     fieldsets = (
         ('Booking Information', {
-            'fields': ('booking_id', 'user', 'travel_option', 'status')
+            'fields': ('booking_id', 'group_id', 'user', 'travel_option', 'status')
         }),
         ('Booking Details', {
             'fields': ('number_of_seats', 'total_price')
@@ -51,9 +148,43 @@ class BookingAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    @admin.action(description='Cancel selected bookings and release their seats')
+    def cancel_selected_bookings(self, request, queryset):
+        cancelled = cancel_bookings(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Cancelled {cancelled} booking(s).')
+
+class ArchiveAdmin(LargeTableAdmin):
+    """Archived rows are history: viewable and searchable, never edited"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedTravelOption)
+class ArchivedTravelOptionAdmin(ArchiveAdmin):
+    list_display = ['travel_id', 'travel_type', 'source', 'destination',
+                   'departure_date', 'departure_time', 'price', 'status', 'archived_at']
+    list_filter = ['travel_type', 'status']
+    search_fields = ['travel_id', 'source', 'destination']
+    date_hierarchy = 'departure_date'
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(BookingSearchMixin, ArchiveAdmin):
+    list_display = ['booking_id', 'user', 'travel_option', 'number_of_seats',
+                   'total_price', 'status', 'booking_date']
+    list_filter = ['status']
+    list_select_related = ['user', 'travel_option']
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone_number', 'date_of_birth']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
     search_fields = ['user__username', 'user__email', 'phone_number']
     readonly_fields = ['created_at', 'updated_at']
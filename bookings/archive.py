@@ -0,0 +1,113 @@
+"""
+Hot/cold archival of departed travel options and their bookings.
+
+archive_departed() moves travel options that departed more than
+ARCHIVE_AFTER_DAYS ago, together with their bookings and passengers, into
+ArchivedTravelOption and ArchivedBooking. Each batch is copied with bulk
+inserts and removed with set-based deletes in one short transaction, so the
+hot tables and their indexes only hold the part of the schedule that can
+still be searched and booked. Archived rows keep their primary keys, and
+inserts ignore conflicts, so an interrupted run can simply be repeated.
+
+Reads that cover history (the dashboard, booking_detail, the admin) look in
+the hot table first and fall back to the archive; see find_booking().
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .bulk import delete_rows
+from .cities import city_index
+from .connections import connection_graph
+from .fares import CELL_FIELDS, refresh_fare_cells
+from .models import ArchivedBooking, ArchivedTravelOption, Booking, Passenger, SeatShard, TravelOption
+from .search_cache import invalidate_routes
+
+OPTION_FIELDS = [field.attname for field in ArchivedTravelOption._meta.concrete_fields
+                 if field.name != 'archived_at']
+BOOKING_FIELDS = [field.attname for field in ArchivedBooking._meta.concrete_fields
+                  if field.name not in ('passengers', 'archived_at')]
+# Columns read from the hot table besides the archived ones, for the
+# cache, calendar and index bookkeeping done once per batch
+BOOKKEEPING_FIELDS = ['source_key', 'destination_key']
+
+
+def archive_cutoff(now=None):
+    """Departure time before which travel options are archived"""
+    if now is None:
+        now = timezone.now()
+    return now - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archive_departed(before=None, batch_size=200):
+    """Move travel options that departed before `before` and their bookings
+    to the archive tables. Returns (options archived, bookings archived).
+    """
+    if before is None:
+        before = archive_cutoff()
+
+    options_archived = bookings_archived = 0
+    while True:
+        batch = list(TravelOption.objects.filter(departure_at__lt=before)
+                     .order_by('departure_at').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            options, bookings = _archive_batch(batch)
+        options_archived += options
+        bookings_archived += bookings
+    return options_archived, bookings_archived
+
+
+def _archive_batch(pks):
+    options = list(TravelOption.objects.select_for_update().filter(pk__in=pks)
+                   .values(*OPTION_FIELDS, *BOOKKEEPING_FIELDS))
+    bookings = list(Booking.objects.filter(travel_option__in=pks).order_by().values(*BOOKING_FIELDS))
+    passengers = defaultdict(list)
+    for row in (Passenger.objects.filter(booking__travel_option__in=pks)
+                .order_by('pk').values('booking_id', 'name', 'email', 'phone')):
+        passengers[row.pop('booking_id')].append(row)
+
+    archived_options = []
+    for row in options:
+        fields = {name: row[name] for name in OPTION_FIELDS}
+        if fields['status'] == 'active':
+            # It departed; the lifecycle sweep may just not have run yet
+            fields['status'] = 'completed'
+        archived_options.append(ArchivedTravelOption(**fields))
+    ArchivedTravelOption.objects.bulk_create(archived_options, ignore_conflicts=True)
+    ArchivedBooking.objects.bulk_create([
+        ArchivedBooking(**row, passengers=passengers.get(row['id'], []))
+        for row in bookings
+    ], batch_size=500, ignore_conflicts=True)
+
+    Passenger.objects.filter(booking__travel_option__in=pks).delete()
+    Booking.objects.filter(travel_option__in=pks).delete()
+    SeatShard.objects.filter(travel_option__in=pks).delete()
+    # A plain DELETE sends no post_delete signals (see bookings.signals);
+    # their cache, calendar and index work is done once for the whole batch
+    delete_rows(TravelOption, pks)
+
+    invalidate_routes({(row['source_key'], row['destination_key']) for row in options})
+    refresh_fare_cells(tuple(row[field] for field in CELL_FIELDS) for row in options)
+    transaction.on_commit(lambda: _forget(pks))
+    return len(options), len(bookings)
+
+
+def _forget(pks):
+    city_index.invalidate()
+    for pk in pks:
+        connection_graph.remove(pk)
+
+
+def find_booking(booking_id, user=None):
+    """Return a booking from the hot table or the archive, or None"""
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.select_related('travel_option').filter(booking_id=booking_id)
+        if user is not None:
+            bookings = bookings.filter(user=user)
+        booking = bookings.first()
+        if booking is not None:
+            return booking
+    return None
@@ -0,0 +1,18 @@
+"""
+URL patterns for the ASGI application: bookings.urls with the search and API
+views swapped for their native async versions.
+"""
+from django.urls import path
+from . import async_views
+from .urls import app_name, urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'search_results': async_views.search_results,
+    'travel_detail': async_views.travel_option_detail,
+    'api_travel_options': async_views.api_travel_options,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
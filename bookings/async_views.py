@@ -0,0 +1,92 @@
+"""
+Native async versions of the read-heavy views, served by the ASGI application.
+
+They share forms, filters and response formatting with bookings.views but use
+the async ORM and cache APIs, so a request waiting on the database or cache
+does not hold a worker thread. Templates are rendered through sync_to_async
+because context processors read the session and user, which are sync-only.
+travel_booking/asgi.py routes requests here via travel_booking.asgi_urls; the
+WSGI application keeps the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from travel_booking.db_router import read_replica
+from travel_booking.query_budget import query_budget
+from .forms import TravelSearchForm
+from .models import TravelOption
+from .pagination import apaginate, aapproximate_count
+from .search import afilter_route
+from .search_cache import acached_search
+from .views import (
+    _apply_filters, _api_params, _api_payload, _connections_without_direct, _cursor_query,
+    _ordering, _upcoming_travel_options, _with_count,
+)
+
+
+async def _afiltered_travel_options(filters):
+    travel_options = await afilter_route(
+        _upcoming_travel_options(),
+        source=filters.get('source'),
+        destination=filters.get('destination'),
+    )
+    return _apply_filters(travel_options, filters)
+
+
+@query_budget(8)
+@read_replica
+async def search_results(request):
+    """Search and filter travel options"""
+    form = TravelSearchForm(request.GET)
+    filters = form.cleaned_data if form.is_valid() else {}
+    cursor = request.GET.get('cursor')
+    with_count = _with_count(request, cursor)
+
+    async def build():
+        travel_options = await _afiltered_travel_options(filters)
+        return {
+            'page_obj': await apaginate(travel_options, cursor, 10, _ordering(filters)),
+            'result_count': await aapproximate_count(travel_options) if with_count else None,
+        }
+
+    results = await acached_search('search_results', {**filters, 'cursor': cursor, 'count': with_count}, build)
+    page_obj = results['page_obj']
+
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'travel_options': page_obj,
+        'result_count': results['result_count'],
+        'next_query': _cursor_query(request, page_obj.next_cursor),
+        'previous_query': _cursor_query(request, page_obj.previous_cursor),
+        # Loading the connection graph and its legs uses the sync ORM
+        'connections': await sync_to_async(_connections_without_direct)(filters, page_obj, cursor),
+    }
+    return await sync_to_async(render)(request, 'bookings/search_results.html', context)
+
+
+@query_budget(4)
+@read_replica
+async def travel_option_detail(request, travel_id):
+    """Detail view for a travel option"""
+    travel_option = await aget_object_or_404(TravelOption, travel_id=travel_id, status='active')
+
+    context = {
+        'travel_option': travel_option,
+    }
+    return await sync_to_async(render)(request, 'bookings/travel_detail.html', context)
+
+
+@query_budget(6)
+@read_replica
+async def api_travel_options(request):
+    """API endpoint for travel options (for AJAX calls)"""
+    filters, params = _api_params(request)
+
+    async def build():
+        travel_options = await _afiltered_travel_options(filters)
+        page = await apaginate(travel_options, params['cursor'], params['limit'], _ordering(filters))
+        count = await aapproximate_count(travel_options) if params['count'] else None
+        return _api_payload(page, count)
+
+    return JsonResponse(await acached_search('api_travel_options', params, build))
@@ -0,0 +1,527 @@
+"""
+End-to-end benchmarks for the bookings views.
+
+A Workload turns whatever data is in the database (typically a dataset built
+with `manage.py generate_load_data`) into a list of requests per scenario. A
+driver replays them and records latency, SQL queries and status per request:
+
+* ClientDriver sends requests one at a time through django.test.Client, so the
+  numbers measure the view stack without any network or server overhead.
+* WSGIDriver serves the project's WSGI application from a threaded HTTP
+  server on localhost and replays requests from several client threads, which
+  adds real connection handling, concurrency and database connection setup.
+
+WSGIAppDriver and ASGIAppDriver call the project's WSGI and ASGI application
+callables directly, with the same number of concurrent connections (threads
+for WSGI, asyncio tasks for ASGI), to compare the two serving paths without a
+server in front of either.
+
+Results are plain dicts that can be written as JSON and compared against a
+stored baseline with compare().
+"""
+import asyncio
+import http.client
+import io
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import timedelta, time as dt_time
+from decimal import Decimal
+from urllib.parse import urlencode
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from travel_booking.query_budget import QueryLog
+from .models import TravelOption, Booking
+
+SCENARIOS = (
+    'home', 'search_results', 'travel_option_detail',
+    'book_travel', 'dashboard', 'api_travel_options',
+)
+PERCENTILES = (50, 90, 95, 99)
+QUERY_HEADER = 'X-Benchmark-Queries'
+
+
+class Workload:
+    """Requests for each scenario, sampled deterministically from the database"""
+
+    def __init__(self, seed=0, samples=50, username=None):
+        self.rng = random.Random(seed)
+        self.samples = samples
+        self.username = username
+        self.user = None
+        self.created_user = False
+        self.option = None
+        self.requests = {}
+
+    def prepare(self, capacity):
+        """Pick the user and sample data, and create the departure used for bookings"""
+        self.user = self._pick_user()
+        departure = timezone.now().date() + timedelta(days=30)
+        self.option = TravelOption.objects.create(
+            travel_id=f"BENCH{uuid.uuid4().hex[:8].upper()}",
+            travel_type='flight',
+            source='Benchmark City',
+            destination='Benchmark Town',
+            departure_date=departure,
+            departure_time=dt_time(9, 0),
+            arrival_date=departure,
+            arrival_time=dt_time(11, 0),
+            price=Decimal('100.00'),
+            available_seats=capacity,
+            total_seats=capacity,
+            status='active',
+        )
+
+        upcoming = TravelOption.objects.filter(status='active', departure_date__gte=timezone.now().date())
+        routes = list(
+            upcoming.order_by().values('source', 'destination')
+            .annotate(departures=Count('id')).order_by('-departures')[:self.samples]
+        )
+        travel_ids = self._sample_travel_ids(upcoming)
+
+        booking = {
+            'number_of_seats': 1,
+            'passenger_name': 'Benchmark Passenger',
+            'passenger_email': 'benchmark@example.com',
+            'passenger_phone': '5550000000',
+        }
+        self.requests = {
+            'home': [('GET', reverse('bookings:home'), None)],
+            'search_results': [
+                ('GET', reverse('bookings:search_results') + '?' + urlencode(route), None)
+                for route in self._route_params(routes)
+            ],
+            'travel_option_detail': [
+                ('GET', reverse('bookings:travel_detail', args=[travel_id]), None)
+                for travel_id in travel_ids
+            ],
+            'book_travel': [('POST', reverse('bookings:book_travel', args=[self.option.travel_id]), booking)],
+            'dashboard': [('GET', reverse('bookings:dashboard'), None)],
+            'api_travel_options': [
+                ('GET', reverse('bookings:api_travel_options') + '?' + urlencode(route), None)
+                for route in self._route_params(routes)
+            ],
+        }
+
+    def cleanup(self):
+        if self.option is not None:
+            self.option.delete()
+        if self.created_user:
+            self.user.delete()
+
+    def _pick_user(self):
+        if self.username:
+            return User.objects.get(username=self.username)
+        # The customer with the most bookings is the worst case for the dashboard
+        top = (Booking.objects.order_by().values('user')
+               .annotate(bookings=Count('id')).order_by('-bookings').first())
+        if top:
+            return User.objects.get(pk=top['user'])
+        user, self.created_user = User.objects.get_or_create(username='benchmark_user')
+        return user
+
+    def _sample_travel_ids(self, queryset):
+        bounds = list(queryset.order_by('pk').values_list('pk', flat=True)[:1]) + \
+            list(queryset.order_by('-pk').values_list('pk', flat=True)[:1])
+        if not bounds:
+            return [self.option.travel_id]
+        travel_ids = []
+        for _ in range(self.samples):
+            pk = self.rng.randint(bounds[0], bounds[1])
+            travel_id = (queryset.filter(pk__gte=pk).order_by('pk')
+                         .values_list('travel_id', flat=True).first())
+            travel_ids.append(travel_id)
+        return travel_ids
+
+    def _route_params(self, routes):
+        if not routes:
+            return [{'source': self.option.source, 'destination': self.option.destination}]
+        # Mix exact route searches with the prefix searches users type
+        params = []
+        for route in routes:
+            if self.rng.random() < 0.5:
+                params.append({'source': route['source'], 'destination': route['destination']})
+            else:
+                params.append({'source': route['source'][:3]})
+        return params
+
+
+def request_host():
+    """A Host header value that ALLOWED_HOSTS accepts"""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    # An empty list allows localhost while DEBUG is on
+    return 'localhost'
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(p / 100 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Reduce (seconds, queries, status) samples to the reported metrics"""
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = [count for _, count, _ in samples if count is not None]
+    result = {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status in samples if status >= 400),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+    }
+    for p in PERCENTILES:
+        value = percentile(latencies, p)
+        result[f'p{p}_ms'] = round(value, 3) if value is not None else None
+    result['max_ms'] = round(latencies[-1], 3) if latencies else None
+    result['queries_mean'] = round(sum(queries) / len(queries), 2) if queries else None
+    result['queries_max'] = max(queries) if queries else None
+    result['throughput_rps'] = round(len(samples) / elapsed, 1) if elapsed else None
+    return result
+
+
+class ClientDriver:
+    """Replay requests sequentially through the Django test client"""
+
+    name = 'client'
+
+    def __init__(self, user):
+        self.client = Client(HTTP_HOST=request_host())
+        self.client.force_login(user)
+
+    def run(self, requests, count):
+        samples = []
+        started = time.perf_counter()
+        for i in range(count):
+            method, path, data = requests[i % len(requests)]
+            with QueryLog() as log:
+                begin = time.perf_counter()
+                if method == 'POST':
+                    response = self.client.post(path, data)
+                else:
+                    response = self.client.get(path)
+                seconds = time.perf_counter() - begin
+            # Flash messages are never displayed here, so drop them before
+            # they pile up in the cookie
+            self.client.cookies.pop('messages', None)
+            samples.append((seconds, log.count, response.status_code))
+        return samples, time.perf_counter() - started
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _counting_app(app):
+    """Wrap a WSGI app to report the queries each request ran in a header"""
+    def wrapped(environ, start_response):
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['response'] = (status, headers, exc_info)
+
+        with QueryLog() as log:
+            body = app(environ, capture)
+        status, headers, exc_info = captured['response']
+        start_response(status, headers + [(QUERY_HEADER, str(log.count))], exc_info)
+        return body
+    return wrapped
+
+
+class WSGIDriver:
+    """Replay requests over HTTP against a threaded WSGI server on localhost"""
+
+    name = 'wsgi'
+
+    def __init__(self, user, threads=8):
+        self.threads = threads
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=True)
+        self.server.daemon_threads = True
+        self.server.set_app(_counting_app(get_internal_wsgi_application()))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+        self.host = request_host()
+
+        client = Client()
+        client.force_login(user)
+        self.cookies = {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+        self.csrf_token = None
+
+    def request(self, method, path, data=None):
+        headers = {'Host': self.host, 'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items())}
+        body = None
+        if method == 'POST':
+            data = {**data, 'csrfmiddlewaretoken': self.csrf_token}
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            queries = response.getheader(QUERY_HEADER)
+            return response, int(queries) if queries is not None else None
+        finally:
+            connection.close()
+
+    def _fetch_csrf_token(self, path):
+        response, _ = self.request('GET', path)
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie' and value.startswith(f'{settings.CSRF_COOKIE_NAME}='):
+                self.csrf_token = value.split(';', 1)[0].split('=', 1)[1]
+                self.cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token
+
+    def run(self, requests, count):
+        if self.csrf_token is None and any(method == 'POST' for method, _, _ in requests):
+            self._fetch_csrf_token(requests[0][1])
+
+        samples = []
+        lock = threading.Lock()
+        counter = iter(range(count))
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                method, path, data = requests[i % len(requests)]
+                begin = time.perf_counter()
+                response, queries = self.request(method, path, data)
+                seconds = time.perf_counter() - begin
+                with lock:
+                    samples.append((seconds, queries, response.status))
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def _split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+class WSGIAppDriver:
+    """Call a WSGI application in-process from one thread per connection.
+
+    With `threads` below `connections`, requests queue for one of that many
+    worker slots, like a server with a fixed thread pool, and the wait counts
+    toward their latency.
+    """
+
+    name = 'wsgi'
+
+    def __init__(self, application, connections=32, threads=None):
+        self.application = application
+        self.connections = connections
+        self.slots = threading.BoundedSemaphore(threads or connections)
+        self.host = request_host()
+
+    def request(self, method, path):
+        path, query = _split(path)
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': self.host,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = self.application(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            for _ in response:
+                pass
+        finally:
+            # Fires request_finished, which returns the database connection
+            response.close()
+        return int(status[0].split()[0])
+
+    def run(self, requests, count):
+        samples = []
+        lock = threading.Lock()
+        counter = iter(range(count))
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                method, path, _ = requests[i % len(requests)]
+                begin = time.perf_counter()
+                with self.slots:
+                    status = self.request(method, path)
+                seconds = time.perf_counter() - begin
+                with lock:
+                    samples.append((seconds, None, status))
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(self.connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    def close(self):
+        pass
+
+
+class ASGIAppDriver:
+    """Drive an ASGI application in-process from concurrent asyncio tasks"""
+
+    name = 'asgi'
+
+    def __init__(self, application, connections=32):
+        self.application = application
+        self.connections = connections
+        self.host = request_host()
+
+    async def request(self, method, path):
+        path, query = _split(path)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+        pending = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        status = []
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Nothing more to send; Django cancels its disconnect listener
+            # once the response is complete
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await self.application(scope, receive, send)
+        return status[0]
+
+    async def _run(self, requests, count):
+        samples = []
+        counter = iter(range(count))
+
+        async def worker():
+            for i in counter:
+                method, path, _ = requests[i % len(requests)]
+                begin = time.perf_counter()
+                status = await self.request(method, path)
+                samples.append((time.perf_counter() - begin, None, status))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.connections)))
+        return samples, time.perf_counter() - started
+
+    def run(self, requests, count):
+        return asyncio.run(self._run(requests, count))
+
+    def close(self):
+        pass
+
+
+def simulate_db_latency(seconds):
+    """Add a fixed delay to every SQL statement on new connections.
+
+    Models a database across the network, where the time a request spends
+    waiting on round trips is what separates the thread-per-request and
+    async serving models. Returns a function that removes the delay again.
+    """
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False, dispatch_uid='benchmark-db-latency')
+    return lambda: connection_created.disconnect(dispatch_uid='benchmark-db-latency')
+
+
+def run(driver, workload, scenarios=SCENARIOS, requests=200, warmup=10):
+    """Benchmark each scenario with the driver and return {scenario: metrics}"""
+    results = {}
+    for name in scenarios:
+        plan = workload.requests[name]
+        if warmup:
+            driver.run(plan, warmup)
+        samples, elapsed = driver.run(plan, requests)
+        results[name] = summarize(samples, elapsed)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Return a list of regressions of results against a baseline.
+
+    Latency and throughput may drift by `tolerance` (a fraction) before they
+    count as regressions. Query counts are deterministic, so any increase in
+    the maximum is reported.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if current.get(metric) and previous.get(metric) and \
+                    current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+        if current.get('throughput_rps') and previous.get('throughput_rps') and \
+                current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput_rps {previous['throughput_rps']} -> {current['throughput_rps']}"
+            )
+        if current.get('queries_max') is not None and previous.get('queries_max') is not None and \
+                current['queries_max'] > previous['queries_max']:
+            regressions.append(f"{name}: queries_max {previous['queries_max']} -> {current['queries_max']}")
+        if current.get('errors', 0) > previous.get('errors', 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
@@ -0,0 +1,120 @@
+"""
+Set-based bulk edits of travel options and bookings, used by the admin actions.
+
+Like the lifecycle transitions, each function works through the selected
+primary keys in batches, with one UPDATE per batch in its own short
+transaction, so editing a large selection never loads model instances or
+holds locks on more than batch_size rows at a time. Caches, the fare
+calendar and the connection graph are refreshed once per batch.
+"""
+from decimal import Decimal
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+from .connections import connection_graph
+from .fares import refresh_fare_cells_for_options
+from .models import SeatShard, TravelOption
+from .reservations import cancel_locked, lock_bookings, rebalance_seat_shards
+from .search_cache import invalidate_travel_options
+
+
+def _batches(pks, batch_size):
+    pks = sorted(set(pks))
+    for start in range(0, len(pks), batch_size):
+        yield pks[start:start + batch_size]
+
+
+def _options_changed(pks):
+    invalidate_travel_options(pks)
+    refresh_fare_cells_for_options(pks)
+    transaction.on_commit(connection_graph.invalidate)
+
+
+def delete_rows(model, pks, using=DEFAULT_DB_ALIAS):
+    """Delete rows by primary key with one plain DELETE statement.
+
+    Rows are neither loaded nor collected, so there is no cascade and no
+    delete signal: delete the rows that reference them first, and do the
+    per-row signal work (caches, fare calendar, city index) once for the
+    whole set. Returns the number of rows deleted.
+    """
+    pks = list(pks)
+    if not pks:
+        return 0
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN ({placeholders})',
+            pks)
+        return cursor.rowcount
+
+
+def reprice_travel_options(pks, percent, batch_size=1000):
+    """Change the price of active travel options by `percent` (e.g. -10 or 12.5).
+
+    Prices are rounded to cents; existing bookings keep the price they paid.
+    Returns the number of travel options repriced.
+    """
+    factor = (Decimal(100) + Decimal(percent)) / 100
+    if factor <= 0:
+        raise ValueError('A price cut must be less than 100%.')
+
+    repriced = 0
+    for batch in _batches(pks, batch_size):
+        with transaction.atomic():
+            repriced += TravelOption.objects.filter(pk__in=batch, status='active').update(
+                price=Round(F('price') * factor, 2), updated_at=timezone.now())
+            _options_changed(batch)
+    return repriced
+
+
+def add_seats(pks, seats, batch_size=1000):
+    """Add `seats` to the capacity and free seats of active travel options.
+
+    Striped options get the seats on their first shard, are re-summed in the
+    same UPDATE and spread over their shards after commit. Returns the number
+    of travel options extended.
+    """
+    if seats < 1:
+        raise ValueError('Add at least one seat.')
+
+    extended = 0
+    shard_total = SeatShard.objects.filter(travel_option_id=OuterRef('pk')).values(
+        'travel_option_id').annotate(total=Sum('available_seats')).values('total')
+    for batch in _batches(pks, batch_size):
+        with transaction.atomic():
+            active = TravelOption.objects.filter(pk__in=batch, status='active')
+            striped = list(active.filter(seat_shards__gt=0).values_list('pk', flat=True))
+            SeatShard.objects.filter(travel_option__in=striped, shard=0).update(
+                available_seats=F('available_seats') + seats)
+            extended += active.filter(seat_shards=0).update(
+                total_seats=F('total_seats') + seats,
+                available_seats=F('available_seats') + seats,
+                updated_at=timezone.now(),
+            )
+            extended += TravelOption.objects.filter(pk__in=striped).update(
+                total_seats=F('total_seats') + seats,
+                available_seats=Coalesce(Subquery(shard_total), 0),
+                updated_at=timezone.now(),
+            )
+            _options_changed(batch)
+            for pk in striped:
+                transaction.on_commit(lambda pk=pk: rebalance_seat_shards(pk), robust=True)
+    return extended
+
+
+def cancel_bookings(pks, batch_size=500):
+    """Cancel confirmed or held bookings and give their seats back.
+
+    Each batch locks the bookings that are still confirmed or held, then
+    cancels and returns the seats of exactly those rows, as
+    release_expired_holds() does. Returns the number of bookings cancelled.
+    """
+    cancelled = 0
+    for batch in _batches(pks, batch_size):
+        with transaction.atomic():
+            cancelled += cancel_locked(lock_bookings(batch, status__in=['confirmed', 'pending']))
+    return cancelled
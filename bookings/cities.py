@@ -0,0 +1,120 @@
+import bisect
+import heapq
+import threading
+import time
+from django.conf import settings
+from django.db.models import Count
+from .models import TravelOption
+from .search import normalize_city
+
+# Sorts after every character a city key can contain: key + PREFIX_SENTINEL
+# is the exclusive upper bound of the keys starting with key, for bisect
+PREFIX_SENTINEL = '\uffff'
+
+
+class CityIndex:
+    """Process-local prefix index of city names ranked by departure volume.
+
+    City keys are kept in a sorted list, so a prefix lookup is two bisects
+    followed by a top-N selection on departure counts; no database access is
+    needed once the index is loaded. Saves and deletes of single TravelOption
+    rows are applied incrementally through signals once their transaction
+    commits (see bookings.signals).
+    Bulk operations bypass signals, so they call invalidate(), and the index
+    also reloads after CITY_INDEX_MAX_AGE seconds to pick up writes made by
+    other processes, or as soon as the search cache reports a new city (see
+    sync()).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._names = {}
+        self._departures = {}
+        self._loaded_at = None
+        self._generation = None
+
+    def load(self):
+        """Rebuild the index from the database"""
+        departures = {}
+        names = {}
+        for key_field, name_field in (('source_key', 'source'), ('destination_key', 'destination')):
+            rows = (TravelOption.objects.order_by()
+                    .values(key_field, name_field)
+                    .annotate(departures=Count('id')))
+            for row in rows:
+                key = row[key_field]
+                departures[key] = departures.get(key, 0) + row['departures']
+                names.setdefault(key, row[name_field])
+
+        with self._lock:
+            self._departures = departures
+            self._names = names
+            self._keys = sorted(departures)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        with self._lock:
+            self._loaded_at = None
+
+    def sync(self, generation):
+        """Reload if cities were added since the index saw `generation`.
+
+        generation is the search cache's shared new-city counter, read before
+        the reload so a city committed during it bumps the counter again.
+        """
+        if generation != self._generation:
+            self._generation = generation
+            self.load()
+
+    def _ensure_loaded(self):
+        max_age = getattr(settings, 'CITY_INDEX_MAX_AGE', 300)
+        loaded_at = self._loaded_at
+        if loaded_at is None or (max_age and time.monotonic() - loaded_at > max_age):
+            self.load()
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` (name, departures) pairs whose key starts with prefix"""
+        self._ensure_loaded()
+        key = normalize_city(prefix)
+        with self._lock:
+            start = bisect.bisect_left(self._keys, key)
+            end = bisect.bisect_left(self._keys, key + PREFIX_SENTINEL, lo=start)
+            best = heapq.nsmallest(
+                limit, self._keys[start:end],
+                key=lambda k: (-self._departures[k], k),
+            )
+            return [(self._names[k], self._departures[k]) for k in best]
+
+    def matching_keys(self, text):
+        """Return every city key containing text.
+
+        This is a superset of what bookings.search.city_filter can match
+        (prefix or substring, source or destination), which is what cache
+        invalidation needs.
+        """
+        self._ensure_loaded()
+        key = normalize_city(text)
+        with self._lock:
+            return [k for k in self._keys if key in k]
+
+    def add(self, name, delta=1):
+        """Adjust the departure count for a city, inserting or dropping its key"""
+        key = normalize_city(name)
+        if not key or self._loaded_at is None:
+            return
+        with self._lock:
+            count = self._departures.get(key, 0) + delta
+            if count > 0:
+                if key not in self._departures:
+                    bisect.insort(self._keys, key)
+                    self._names[key] = name
+                self._departures[key] = count
+            elif key in self._departures:
+                del self._departures[key]
+                del self._names[key]
+                self._keys.pop(bisect.bisect_left(self._keys, key))
+
+
+city_index = CityIndex()
@@ -0,0 +1,438 @@
+"""
+Multi-leg connection search over the network of active travel options.
+
+ConnectionGraph keeps every upcoming active TravelOption as one leg of a
+time-expanded graph held in flat typed arrays (departure and arrival minutes,
+cities, mode, fare in cents, seats), plus, per city, its outgoing legs sorted
+by departure. Finding the legs that can follow an arrival is then a bisect
+into that city's departures, and the graph for a few hundred thousand legs
+fits in a few megabytes.
+
+Searches run round by round, one more leg per round (McRAPTOR style). Each
+round extends the itineraries found in the previous one with the legs that
+leave their last city after the minimum connection time and within the
+maximum layover, and keeps, per (city, arrival mode), only itineraries that
+are not beaten on both arrival time and fare. An earlier arrival only beats a
+later one if no departure leaves between the ends of their layover windows,
+since the later arrival could still catch it. The itineraries that reach the
+destination form the Pareto set over arrival time, fare and number of legs,
+which is ranked for the requested objective: earliest arrival, cheapest or
+fewest transfers.
+
+Like the city index, the graph is process-local: single saves and deletes are
+applied through signals, reservations update seat counts, bulk writers call
+invalidate(), and the graph reloads after CONNECTION_GRAPH_MAX_AGE seconds to
+pick up writes made by other processes. Results are therefore re-checked
+against the database before they are shown.
+"""
+import bisect
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+from .models import TravelOption
+from .cities import PREFIX_SENTINEL
+from .search import normalize_city
+
+MODES = [code for code, _ in TravelOption.TRAVEL_TYPES]
+OBJECTIVES = ('earliest', 'cheapest', 'fewest')
+
+DEFAULT_MIN_CONNECTION_MINUTES = {'flight': 60, 'train': 15, 'bus': 15}
+DEFAULT_MODE_CHANGE_MINUTES = 30
+DEFAULT_MAX_LAYOVER_MINUTES = 12 * 60
+DEFAULT_MAX_LEGS = 3
+
+# Ranking of the Pareto set for each objective, over (arrival, fare, legs)
+RANKINGS = {
+    'earliest': lambda r: (r['arrival'], r['legs_count'], r['price']),
+    'cheapest': lambda r: (r['price'], r['arrival'], r['legs_count']),
+    'fewest': lambda r: (r['legs_count'], r['arrival'], r['price']),
+}
+
+
+def to_minutes(moment):
+    """Minutes since the epoch for a datetime"""
+    return int(moment.timestamp()) // 60
+
+
+def day_start(day):
+    """Midnight at the start of a date, in the timezone schedules are stored in"""
+    moment = datetime.combine(day, dt_time())
+    if settings.USE_TZ:
+        moment = timezone.make_aware(moment, timezone.get_default_timezone())
+    return moment
+
+
+def connection_minutes():
+    """Minimum minutes between an arrival and the next departure, by mode pair"""
+    minimum = getattr(settings, 'CONNECTION_MIN_MINUTES', DEFAULT_MIN_CONNECTION_MINUTES)
+    change = getattr(settings, 'CONNECTION_MODE_CHANGE_MINUTES', DEFAULT_MODE_CHANGE_MINUTES)
+    # Both ends need their own time (leaving an airport, checking in for a
+    # flight), and switching modes usually means switching stations
+    return [
+        [max(minimum[arriving], minimum[departing]) + (change if arriving != departing else 0)
+         for departing in MODES]
+        for arriving in MODES
+    ]
+
+
+class Timetable:
+    """The legs of the graph as flat typed arrays.
+
+    Per-leg columns are indexed by slot; per-city columns by city id. A
+    removed leg leaves its slot behind until the next full load.
+    """
+
+    def __init__(self):
+        self.dep = array('i')
+        self.arr = array('i')
+        self.src = array('i')
+        self.dst = array('i')
+        self.mode = array('b')
+        self.price = array('q')
+        self.seats = array('i')
+        self.pk = array('q')
+        self.slots = {}
+        self.removed = 0
+        self.names = []
+        self.out_dep = []
+        self.out_slot = []
+        self.city_ids = {}
+        self.keys = []
+
+    def city(self, name, key):
+        city = self.city_ids.get(key)
+        if city is None:
+            city = len(self.names)
+            self.city_ids[key] = city
+            self.names.append(name)
+            self.out_dep.append(array('i'))
+            self.out_slot.append(array('i'))
+            bisect.insort(self.keys, key)
+        return city
+
+    def append(self, pk, source, source_key, destination, destination_key,
+               travel_type, departure_at, arrival_at, price, seats):
+        slot = len(self.pk)
+        src = self.city(source, source_key)
+        departure = to_minutes(departure_at)
+        self.dep.append(departure)
+        self.arr.append(to_minutes(arrival_at))
+        self.src.append(src)
+        self.dst.append(self.city(destination, destination_key))
+        self.mode.append(MODES.index(travel_type))
+        self.price.append(int(Decimal(price) * 100))
+        self.seats.append(seats)
+        self.pk.append(pk)
+        self.slots[pk] = slot
+
+        # Loads arrive in departure order, so this is normally an append
+        departures = self.out_dep[src]
+        position = bisect.bisect_right(departures, departure)
+        departures.insert(position, departure)
+        self.out_slot[src].insert(position, slot)
+
+    def remove(self, pk):
+        slot = self.slots.pop(pk, None)
+        if slot is None:
+            return
+        departures, slots = self.out_dep[self.src[slot]], self.out_slot[self.src[slot]]
+        position = bisect.bisect_left(departures, self.dep[slot])
+        while slots[position] != slot:
+            position += 1
+        del departures[position]
+        del slots[position]
+        self.removed += 1
+
+    def memory(self):
+        """Approximate bytes held by the arrays and indexes"""
+        columns = [self.dep, self.arr, self.src, self.dst, self.mode, self.price, self.seats, self.pk]
+        total = sum(sys.getsizeof(column) for column in columns + self.out_dep + self.out_slot)
+        for index in (self.slots, self.city_ids, self.keys, self.names, self.out_dep, self.out_slot):
+            total += sys.getsizeof(index)
+        return total
+
+
+class ConnectionGraph:
+    """Process-local timetable graph of upcoming active travel options"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = Timetable()
+        self._loaded_at = None
+        self.build_seconds = None
+
+    def load(self):
+        """Rebuild the graph from the database"""
+        started = time.perf_counter()
+        rows = (TravelOption.objects
+                .filter(status='active', departure_at__gte=timezone.now())
+                .order_by('departure_at')
+                .values_list('pk', 'source', 'source_key', 'destination', 'destination_key',
+                             'travel_type', 'departure_at', 'arrival_at', 'price', 'available_seats')
+                .iterator(chunk_size=5000))
+        table = Timetable()
+        for row in rows:
+            table.append(*row)
+
+        with self._lock:
+            self._table = table
+            self._loaded_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - started
+
+    def invalidate(self):
+        """Force a rebuild on the next search"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        max_age = getattr(settings, 'CONNECTION_GRAPH_MAX_AGE', 300)
+        loaded_at = self._loaded_at
+        if loaded_at is None or (max_age and time.monotonic() - loaded_at > max_age):
+            self.load()
+
+    def update(self, option):
+        """Apply a saved travel option to a loaded graph"""
+        if self._loaded_at is None:
+            return
+        fields = ('source', 'source_key', 'destination', 'destination_key', 'travel_type',
+                  'departure_at', 'arrival_at', 'price', 'available_seats', 'status')
+        # Read from __dict__ so deferred fields are never fetched
+        values = [option.__dict__.get(field) for field in fields]
+        if None in values:
+            self.invalidate()
+            return
+        with self._lock:
+            self._table.remove(option.pk)
+            if values[-1] == 'active' and values[5] >= timezone.now():
+                self._table.append(option.pk, *values[:-1])
+
+    def remove(self, pk):
+        """Drop a deleted travel option from a loaded graph"""
+        with self._lock:
+            self._table.remove(pk)
+
+    def set_seats(self, pk, seats):
+        """Record a travel option's new seat count"""
+        with self._lock:
+            slot = self._table.slots.get(pk)
+            if slot is not None:
+                self._table.seats[slot] = seats
+
+    def city_names(self):
+        """Display names of the cities with upcoming departures or arrivals"""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._table.names)
+
+    def _resolve(self, text):
+        """City ids for typed text: exact or prefix matches on the city key"""
+        key = normalize_city(text)
+        if not key:
+            return []
+        keys = self._table.keys
+        start = bisect.bisect_left(keys, key)
+        end = bisect.bisect_left(keys, key + PREFIX_SENTINEL, lo=start)
+        return [self._table.city_ids[k] for k in keys[start:end]]
+
+    def search(self, source, destination, start, end, objective='earliest', max_legs=DEFAULT_MAX_LEGS,
+               passengers=1, travel_types=None, limit=5):
+        """Best itineraries whose first leg departs between two datetimes.
+
+        Returns up to `limit` dicts with the legs' travel option pks, departure
+        and arrival (minutes since the epoch), fare in cents and leg count,
+        ranked for `objective`.
+        """
+        self._ensure_loaded()
+        connection = connection_minutes()
+        max_layover = getattr(settings, 'CONNECTION_MAX_LAYOVER_MINUTES', DEFAULT_MAX_LAYOVER_MINUTES)
+        allowed = [not travel_types or mode in travel_types for mode in MODES]
+        start, end = to_minutes(start), to_minutes(end)
+
+        with self._lock:
+            table = self._table
+            sources = self._resolve(source)
+            targets = set(self._resolve(destination))
+            if not sources or not targets:
+                return []
+            dep, arr, dst = table.dep, table.arr, table.dst
+            modes, prices, seats = table.mode, table.price, table.seats
+
+            def dominates(first, first_fare, second, second_fare, at):
+                """Whether arriving at city `at` at minute `first` for first_fare is
+                no later and no dearer than the second arrival, and catches every
+                departure the second could within the maximum layover"""
+                if first > second or first_fare > second_fare:
+                    return False
+                departures = table.out_dep[at]
+                return (bisect.bisect_right(departures, first + max_layover) ==
+                        bisect.bisect_right(departures, second + max_layover))
+
+            # Labels are parallel lists; label i reached city[i] at arrival[i]
+            # by taking leg slot[i] after label parent[i]
+            city, arrival, fare, mode, slot, parent, count, alive = [], [], [], [], [], [], [], []
+            for source_city in sources:
+                city.append(source_city)
+                arrival.append(start)
+                fare.append(0)
+                mode.append(-1)
+                slot.append(-1)
+                parent.append(-1)
+                count.append(0)
+                alive.append(True)
+            frontier = list(range(len(sources)))
+            bags = {}
+            # Labels that reached the destination
+            results = []
+
+            for legs in range(1, max_legs + 1):
+                next_frontier = []
+                for label in frontier:
+                    if not alive[label]:
+                        continue
+                    here, prev_mode = city[label], mode[label]
+                    if prev_mode < 0:
+                        earliest, latest, ready = start, end, None
+                    else:
+                        ready = connection[prev_mode]
+                        earliest = arrival[label] + min(ready)
+                        latest = arrival[label] + max_layover
+                    visited = set()
+                    walk = label
+                    while walk >= 0:
+                        visited.add(city[walk])
+                        walk = parent[walk]
+
+                    departures, out = table.out_dep[here], table.out_slot[here]
+                    for position in range(bisect.bisect_left(departures, earliest),
+                                          bisect.bisect_right(departures, latest)):
+                        leg = out[position]
+                        leg_mode = modes[leg]
+                        if not allowed[leg_mode] or seats[leg] < passengers:
+                            continue
+                        if ready is not None and departures[position] < arrival[label] + ready[leg_mode]:
+                            continue
+                        to = dst[leg]
+                        if to in visited:
+                            continue
+                        reached, cost = arr[leg], fare[label] + prices[leg]
+                        # Extending an itinerary only makes it later and dearer, so
+                        # anything a result already beats can be dropped
+                        if any(arrival[r] <= reached and fare[r] <= cost for r in results):
+                            continue
+
+                        # Labels kept so far used at most this many legs, so
+                        # one that is no later and no dearer beats the new one
+                        bag = bags.setdefault((to, leg_mode), []) if to not in targets else results
+                        if to not in targets and (legs == max_legs or any(
+                                dominates(arrival[b], fare[b], reached, cost, to) for b in bag)):
+                            continue
+                        # Labels from this round that the new one beats are
+                        # dropped; earlier rounds used fewer legs, so they stay.
+                        # Results take no further legs, so only time and fare count
+                        if to in targets:
+                            beaten = [b for b in bag if count[b] == legs and arrival[b] >= reached and fare[b] >= cost]
+                        else:
+                            beaten = [b for b in bag if count[b] == legs and
+                                      dominates(reached, cost, arrival[b], fare[b], to)]
+                        for b in beaten:
+                            alive[b] = False
+                            bag.remove(b)
+
+                        bag.append(len(city))
+                        if to not in targets:
+                            next_frontier.append(len(city))
+                        city.append(to)
+                        arrival.append(reached)
+                        fare.append(cost)
+                        mode.append(leg_mode)
+                        slot.append(leg)
+                        parent.append(label)
+                        count.append(legs)
+                        alive.append(True)
+                frontier = next_frontier
+
+            itineraries = []
+            for label in results:
+                if not alive[label]:
+                    continue
+                path = []
+                walk = label
+                while slot[walk] >= 0:
+                    path.append(slot[walk])
+                    walk = parent[walk]
+                path.reverse()
+                itineraries.append({
+                    'legs': [table.pk[leg] for leg in path],
+                    'departure': dep[path[0]],
+                    'arrival': arrival[label],
+                    'price': fare[label],
+                    'legs_count': count[label],
+                })
+        itineraries.sort(key=RANKINGS[objective])
+        return itineraries[:limit]
+
+    def stats(self):
+        """Size of the loaded graph, its build time and approximate memory use"""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                'legs': len(self._table.slots),
+                'removed_slots': self._table.removed,
+                'cities': len(self._table.names),
+                'build_seconds': self.build_seconds,
+                'memory_bytes': self._table.memory(),
+            }
+
+
+
+connection_graph = ConnectionGraph()
+
+
+class Itinerary:
+    """A sequence of travel options leading from one city to another"""
+
+    def __init__(self, legs):
+        self.legs = legs
+        self.price = sum((leg.price for leg in legs), Decimal('0.00'))
+        self.departure_at = legs[0].departure_at
+        self.arrival_at = legs[-1].arrival_at
+        self.transfers = len(legs) - 1
+
+    def get_duration(self):
+        return self.arrival_at - self.departure_at
+
+    def layovers(self):
+        return [later.departure_at - earlier.arrival_at for earlier, later in zip(self.legs, self.legs[1:])]
+
+
+def find_connections(source, destination, day=None, objective='earliest', max_legs=DEFAULT_MAX_LEGS,
+                     passengers=1, travel_types=None, limit=5):
+    """Search the connection graph and load the legs of the best itineraries.
+
+    The first leg departs on `day`, or within the next 24 hours when no day is
+    given. Itineraries with a leg that was withdrawn or sold out since the
+    graph was loaded are dropped.
+    """
+    now = timezone.now()
+    if day is None:
+        start, end = now, now + timedelta(days=1)
+    else:
+        start, end = max(day_start(day), now), day_start(day + timedelta(days=1))
+    if start >= end:
+        return []
+
+    # Ask for spares in case some fail the database check
+    found = connection_graph.search(source, destination, start, end, objective, max_legs,
+                                    passengers, travel_types, limit * 2)
+    options = TravelOption.objects.in_bulk({pk for itinerary in found for pk in itinerary['legs']})
+    itineraries = []
+    for itinerary in found:
+        legs = [options.get(pk) for pk in itinerary['legs']]
+        if all(leg is not None and leg.is_available() and leg.available_seats >= passengers for leg in legs):
+            itineraries.append(Itinerary(legs))
+    return itineraries[:limit]
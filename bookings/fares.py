@@ -0,0 +1,176 @@
+"""
+Fare calendar: the lowest fare and seat availability per day for a route.
+
+FareCalendarDay holds one row per (source_key, destination_key,
+departure_date, travel_type) cell, aggregated over the active travel options
+in that cell. Every write path that changes an option's price, status, seats
+or schedule refreshes the cells it touched by re-aggregating just those
+cells, which reads a handful of rows through travel_route_key_idx. Bulk loads
+rebuild the whole table instead (see the rebuild_fare_calendar command).
+
+Edits of travel options refresh inside the writer's transaction. Bookings,
+cancellations and expiring holds refresh after they commit instead
+(refresh_fare_cells_on_commit), like sync_striped_seats(): upserting the
+calendar row inside the booking transaction would hold its lock until commit
+and queue every buyer on that route and day behind it. A rolled back booking
+never touches the calendar. Two transactions refreshing the same cell at the
+same time, or a process dying between a commit and its refresh, can still
+leave a slightly stale total; the next change to the cell, or a rebuild,
+corrects it.
+"""
+import calendar
+import itertools
+from datetime import datetime
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q, Sum
+from .models import FareCalendarDay, TravelOption
+from .search import city_filter
+
+CELL_FIELDS = ('source_key', 'destination_key', 'departure_date', 'travel_type')
+
+# Cells refreshed per statement; each cell adds four parameters
+REFRESH_BATCH_SIZE = 250
+
+
+def fare_cell(option):
+    """Return the calendar cell a travel option counts towards"""
+    # Read from __dict__ so deferred fields are never fetched; values may
+    # still be strings when assigned directly before save()
+    cell = tuple(
+        TravelOption._meta.get_field(field).to_python(option.__dict__.get(field))
+        for field in CELL_FIELDS
+    )
+    return None if None in cell else cell
+
+
+def _rollup(queryset):
+    """Aggregate active travel options into calendar rows, one per cell"""
+    return (queryset.filter(status='active')
+            .order_by()
+            .values(*CELL_FIELDS)
+            .annotate(
+                cheapest=Min('price', filter=Q(available_seats__gt=0)),
+                seats=Sum('available_seats'),
+                count=Count('id'),
+            ))
+
+
+def _calendar_day(row):
+    return FareCalendarDay(
+        source_key=row['source_key'],
+        destination_key=row['destination_key'],
+        departure_date=row['departure_date'],
+        travel_type=row['travel_type'],
+        min_price=row['cheapest'],
+        available_seats=row['seats'],
+        options=row['count'],
+    )
+
+
+def _upsert(days):
+    upsert = {'update_conflicts': True, 'update_fields': ['min_price', 'available_seats', 'options']}
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = list(CELL_FIELDS)
+    FareCalendarDay.objects.bulk_create(days, **upsert)
+
+
+def _cells_filter(cells):
+    condition = Q()
+    for cell in cells:
+        condition |= Q(**dict(zip(CELL_FIELDS, cell)))
+    return condition
+
+
+def refresh_fare_cells(cells):
+    """Recompute the calendar rows for the given cells.
+
+    Cells left without active travel options are deleted.
+    """
+    cells = {cell for cell in cells if cell is not None}
+    iterator = iter(sorted(cells))
+    # Callers are usually inside a booking transaction already; a savepoint
+    # would only add two statements to every reservation
+    with transaction.atomic(savepoint=False):
+        while True:
+            batch = list(itertools.islice(iterator, REFRESH_BATCH_SIZE))
+            if not batch:
+                break
+            days = [_calendar_day(row) for row in _rollup(TravelOption.objects.filter(_cells_filter(batch)))]
+            if days:
+                _upsert(days)
+            empty = set(batch) - {tuple(getattr(day, field) for field in CELL_FIELDS) for day in days}
+            if empty:
+                FareCalendarDay.objects.filter(_cells_filter(empty)).delete()
+
+
+def refresh_fare_cells_on_commit(cells):
+    """Recompute the calendar rows for the given cells once the current
+    transaction commits (at once outside a transaction)"""
+    cells = {cell for cell in cells if cell is not None}
+    if cells:
+        transaction.on_commit(lambda: refresh_fare_cells(cells), robust=True)
+
+
+def fare_cells_for_options(pks):
+    """Return the calendar cells of the given travel options"""
+    return list(TravelOption.objects.filter(pk__in=list(pks)).order_by().values_list(*CELL_FIELDS).distinct())
+
+
+def refresh_fare_cells_for_options(pks):
+    """Recompute the calendar rows for the cells of the given travel options"""
+    refresh_fare_cells(fare_cells_for_options(pks))
+
+
+def rebuild_fare_calendar(batch_size=2000):
+    """Replace the whole calendar with a fresh aggregate; returns rows written"""
+    written = 0
+    with transaction.atomic():
+        FareCalendarDay.objects.all().delete()
+        rows = _rollup(TravelOption.objects.all()).iterator(chunk_size=batch_size)
+        while True:
+            days = [_calendar_day(row) for row in itertools.islice(rows, batch_size)]
+            if not days:
+                break
+            FareCalendarDay.objects.bulk_create(days)
+            written += len(days)
+    return written
+
+
+def month_range(month):
+    """Return the first and last day of a 'YYYY-MM' month"""
+    first = datetime.strptime(month, '%Y-%m').date()
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def fare_calendar(source, destination, start, end, travel_type=None):
+    """Cheapest fare, open seats and option count per day between two dates.
+
+    source and destination are typed city text, resolved the same way as the
+    search form. Days without active departures are left out.
+    """
+    source_match = city_filter(source, 'source_key')
+    destination_match = city_filter(destination, 'destination_key')
+    if source_match is None or destination_match is None:
+        return []
+
+    days = FareCalendarDay.objects.filter(
+        source_match,
+        destination_match,
+        departure_date__gte=start,
+        departure_date__lte=end,
+    )
+    if travel_type:
+        days = days.filter(travel_type=travel_type)
+
+    rows = (days.order_by('departure_date')
+            .values('departure_date')
+            .annotate(cheapest=Min('min_price'), seats=Sum('available_seats'), count=Sum('options')))
+    return [
+        {
+            'date': row['departure_date'].isoformat(),
+            'min_price': f"{row['cheapest']:.2f}" if row['cheapest'] is not None else None,
+            'available_seats': row['seats'],
+            'options': row['count'],
+        }
+        for row in rows
+    ]
@@ -1,7 +1,7 @@
 from django import forms
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
-from .models import Booking, TravelOption, UserProfile
+from .models import Booking, Passenger, TravelOption, UserProfile
 
 class TravelSearchForm(forms.Form):
     source = forms.CharField(
@@ -45,6 +45,21 @@ class TravelSearchForm(forms.Form):
             'step': '0.01',
         })
     )
+    max_duration = forms.IntegerField(
+        min_value=1,
+        required=False,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Max Hours',
+        })
+    )
+    sort = forms.ChoiceField(
+        choices=[('', 'Earliest departure'), ('duration', 'Shortest first')],
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'form-control',
+        })
+    )
 
 class BookingForm(forms.ModelForm):
     class Meta:
@@ -75,6 +90,11 @@ class BookingForm(forms.ModelForm):
         for field_name, field in self.fields.items():
             field.required = True
 
+class PassengerForm(forms.ModelForm):
+    class Meta:
+        model = Passenger
+        fields = ['name', 'email', 'phone']
+
 class UserProfileForm(forms.ModelForm):
     class Meta:
         model = UserProfile
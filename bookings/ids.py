@@ -0,0 +1,126 @@
+"""
+Booking ID generation.
+
+IDs are a prefix followed by 18 Crockford base32 characters encoding 90 bits:
+
+    45 bits  milliseconds since the Unix epoch (good until the year 3084)
+    20 bits  node, identifying the generating process
+    25 bits  sequence within the millisecond
+
+The alphabet is in ASCII order, so IDs sort by creation time as plain strings
+and new bookings append to the end of the booking_id index instead of landing
+on random pages of it. Within a process the generator is monotonic: if the
+clock steps back it keeps counting from the last timestamp, and if the
+sequence runs out it borrows the next millisecond.
+
+Uniqueness across processes depends on the node. Set BOOKING_ID_NODE to a
+distinct value per worker to rule out collisions; by default each process
+draws a random node, and the sequence starts at a random offset every
+millisecond, so two processes collide only if they pick the same node and
+overlapping sequences in the same millisecond.
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+TIME_BITS = 45
+NODE_BITS = 20
+SEQUENCE_BITS = 25
+ID_LENGTH = (TIME_BITS + NODE_BITS + SEQUENCE_BITS) // 5
+PREFIX = 'BK'
+
+# Encode ten bits (two characters) per lookup
+_PAIRS = [a + b for a in ALPHABET for b in ALPHABET]
+_SHIFTS = tuple(range((ID_LENGTH - 2) * 5, -1, -10))
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+
+
+def encode(value):
+    """Encode a 90-bit integer as 18 base32 characters"""
+    return ''.join([_PAIRS[(value >> shift) & 1023] for shift in _SHIFTS])
+
+
+def decode(text):
+    value = 0
+    for char in text:
+        value = (value << 5) | _DECODE[char]
+    return value
+
+
+class BookingIdGenerator:
+    """Thread-safe generator of fixed-width, time-ordered booking IDs"""
+
+    def __init__(self, prefix=PREFIX, node=None, clock=time.time_ns):
+        self.prefix = prefix
+        self.clock = clock
+        self._configured_node = node
+        self._node = None
+        self._lock = threading.Lock()
+        self._millis = 0
+        self._sequence = 0
+
+    @property
+    def node(self):
+        if self._node is None:
+            node = self._configured_node
+            if node is None:
+                node = getattr(settings, 'BOOKING_ID_NODE', None)
+            if node is None:
+                node = random.getrandbits(NODE_BITS)
+            if not 0 <= node < 1 << NODE_BITS:
+                raise ImproperlyConfigured(f'BOOKING_ID_NODE must be between 0 and {(1 << NODE_BITS) - 1}.')
+            self._node = node
+        return self._node
+
+    def reseed(self):
+        """Forget the node and sequence; forked workers must not reuse their parent's"""
+        self._lock = threading.Lock()
+        self._node = None
+        self._millis = 0
+        self._sequence = 0
+
+    def generate(self):
+        node = self.node
+        with self._lock:
+            millis = self.clock() // 1_000_000
+            if millis > self._millis:
+                self._millis = millis
+                self._sequence = random.getrandbits(SEQUENCE_BITS - 1)
+            else:
+                self._sequence += 1
+                if self._sequence >> SEQUENCE_BITS:
+                    self._millis += 1
+                    self._sequence = random.getrandbits(SEQUENCE_BITS - 1)
+            value = (self._millis << (NODE_BITS + SEQUENCE_BITS)) | (node << SEQUENCE_BITS) | self._sequence
+        return self.prefix + encode(value)
+
+    __call__ = generate
+
+
+booking_ids = BookingIdGenerator()
+group_ids = BookingIdGenerator(prefix='GB')
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=booking_ids.reseed)
+    os.register_at_fork(after_in_child=group_ids.reseed)
+
+
+def new_booking_id():
+    """Return a new booking ID from the process-wide generator"""
+    return booking_ids.generate()
+
+
+def new_group_id():
+    """Return a new ID shared by the bookings of one group booking"""
+    return group_ids.generate()
+
+
+def booking_id_time(booking_id, prefix=PREFIX):
+    """Return the UTC datetime a booking ID was generated at"""
+    value = decode(booking_id[len(prefix):])
+    millis = value >> (NODE_BITS + SEQUENCE_BITS)
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
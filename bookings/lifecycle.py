@@ -0,0 +1,85 @@
+"""
+TravelOption lifecycle: completing departed services and operator cancellations.
+
+Both transitions are set-based UPDATEs over batches of primary keys, each
+batch in its own short transaction, so a sweep over a large table never
+holds locks on more than batch_size rows at a time. They are idempotent: a
+sweep that stops halfway can simply be run again.
+"""
+from django.db import transaction
+from django.utils import timezone
+from .connections import connection_graph
+from .fares import refresh_fare_cells_for_options
+from .models import Booking, TravelOption
+from .search_cache import invalidate_travel_options
+
+
+def _status_changed(pks):
+    invalidate_travel_options(pks)
+    refresh_fare_cells_for_options(pks)
+    transaction.on_commit(lambda: _drop_from_graph(pks))
+
+
+def _drop_from_graph(pks):
+    for pk in pks:
+        connection_graph.remove(pk)
+
+
+def complete_departed(now=None, batch_size=1000, pks=None):
+    """Mark active travel options that departed before `now` as completed.
+
+    Candidates are found through the (status, departure_at) index; pass pks
+    to limit the sweep to some travel options. Returns the number completed.
+    """
+    if now is None:
+        now = timezone.now()
+
+    departed = TravelOption.objects.filter(status='active', departure_at__lt=now)
+    if pks is not None:
+        departed = departed.filter(pk__in=list(pks))
+
+    completed = 0
+    while True:
+        batch = list(departed.order_by('departure_at').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            count = TravelOption.objects.filter(pk__in=batch, status='active').update(
+                status='completed', updated_at=timezone.now())
+            _status_changed(batch)
+        completed += count
+    return completed
+
+
+def cancel_travel_options(pks, batch_size=500):
+    """Cancel travel options and every confirmed or held booking on them.
+
+    Options are flipped first so no new bookings are taken, then their
+    bookings are cancelled batch by batch. Seats are not given back to a
+    cancelled option. Returns (options cancelled, bookings cancelled).
+    """
+    pks = sorted(set(pks))
+    options = bookings = 0
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start:start + batch_size]
+        with transaction.atomic():
+            options += TravelOption.objects.filter(pk__in=batch, status='active').update(
+                status='cancelled', updated_at=timezone.now())
+            _status_changed(batch)
+
+        # Also picks up bookings left behind by an interrupted earlier run
+        affected = Booking.objects.filter(
+            travel_option__in=batch,
+            travel_option__status='cancelled',
+            status__in=['confirmed', 'pending'],
+        )
+        while True:
+            booking_ids = list(affected.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not booking_ids:
+                break
+            with transaction.atomic():
+                bookings += Booking.objects.filter(
+                    pk__in=booking_ids,
+                    status__in=['confirmed', 'pending'],
+                ).update(status='cancelled', hold_expires_at=None, updated_at=timezone.now())
+    return options, bookings
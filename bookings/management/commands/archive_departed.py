@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+import time
+from bookings.archive import archive_departed
+
+
+class Command(BaseCommand):
+    help = 'Move long-departed travel options and their bookings to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive options that departed more than N days ago '
+                                 '(default: ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Travel options moved per transaction')
+
+    def handle(self, *args, **options):
+        days = settings.ARCHIVE_AFTER_DAYS if options['days'] is None else options['days']
+        if days < 0 or options['batch_size'] < 1:
+            raise CommandError('--days cannot be negative and --batch-size must be positive.')
+
+        started = time.perf_counter()
+        archived, bookings = archive_departed(
+            before=timezone.now() - timedelta(days=days),
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'Elapsed: {elapsed:.2f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} travel option{"s" if archived != 1 else ""} '
+            f'and {bookings} booking{"s" if bookings != 1 else ""}'))
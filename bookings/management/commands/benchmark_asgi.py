@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+import json
+from bookings import benchmarks
+
+ASYNC_SCENARIOS = ('search_results', 'travel_option_detail', 'api_travel_options')
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput of the async views under ASGI with the sync views under WSGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=32, help='Concurrent connections per server')
+        parser.add_argument('--wsgi-threads', type=int,
+                            help='Worker threads serving WSGI (default: one per connection); '
+                                 'connections beyond this wait for a free thread')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument('--scenarios', nargs='+', choices=ASYNC_SCENARIOS,
+                            default=list(ASYNC_SCENARIOS), help='Scenarios to run')
+        parser.add_argument('--samples', type=int, default=50, help='Distinct routes/options sampled per scenario')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for sampling requests')
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Simulated network latency added to every SQL statement')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if min(options['connections'], options['requests'], options['samples']) < 1 or options['warmup'] < 0:
+            raise CommandError('--connections, --requests and --samples must be positive.')
+        wsgi_threads = options['wsgi_threads'] or options['connections']
+        if wsgi_threads < 1:
+            raise CommandError('--wsgi-threads must be positive.')
+        if options['db_latency_ms'] < 0:
+            raise CommandError('--db-latency-ms cannot be negative.')
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING('DEBUG is on; results include debug overhead.'))
+
+        from travel_booking.asgi import application as asgi_application
+        from travel_booking.wsgi import application as wsgi_application
+        drivers = [
+            benchmarks.WSGIAppDriver(wsgi_application, options['connections'], wsgi_threads),
+            benchmarks.ASGIAppDriver(asgi_application, options['connections']),
+        ]
+
+        workload = benchmarks.Workload(options['seed'], options['samples'])
+        workload.prepare(capacity=1)
+        remove_latency = None
+        if options['db_latency_ms']:
+            remove_latency = benchmarks.simulate_db_latency(options['db_latency_ms'] / 1000)
+        results = {}
+        try:
+            for driver in drivers:
+                # Each path starts from a cold search cache
+                cache.clear()
+                results[driver.name] = benchmarks.run(
+                    driver, workload, options['scenarios'], options['requests'], options['warmup'],
+                )
+        finally:
+            if remove_latency:
+                remove_latency()
+            workload.cleanup()
+
+        self.stdout.write(
+            f"{'scenario':<22}{'WSGI p95':>10}{'ASGI p95':>10}{'WSGI r/s':>10}{'ASGI r/s':>10}{'ratio':>8}"
+        )
+        for name in options['scenarios']:
+            wsgi, asgi = results['wsgi'][name], results['asgi'][name]
+            ratio = asgi['throughput_rps'] / wsgi['throughput_rps'] if wsgi['throughput_rps'] else 0
+            self.stdout.write(
+                f"{name:<22}{wsgi['p95_ms']:>10.2f}{asgi['p95_ms']:>10.2f}"
+                f"{wsgi['throughput_rps']:>10.1f}{asgi['throughput_rps']:>10.1f}{ratio:>7.2f}x"
+            )
+            for path, result in (('WSGI', wsgi), ('ASGI', asgi)):
+                if result['errors']:
+                    self.stdout.write(self.style.WARNING(f"{path} {name}: {result['errors']} failed requests"))
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'timestamp': timezone.now().isoformat(),
+                    'connections': options['connections'],
+                    'wsgi_threads': min(wsgi_threads, options['connections']),
+                    'requests': options['requests'],
+                    'warmup': options['warmup'],
+                    'db_latency_ms': options['db_latency_ms'],
+                    'database': connection.vendor,
+                    'debug': settings.DEBUG,
+                },
+                **results,
+            }
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+import threading
+import time
+import uuid
+from bookings.ids import BookingIdGenerator, booking_ids
+
+
+class Command(BaseCommand):
+    help = 'Measure booking ID generation throughput and check IDs are unique and ordered'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=2_000_000, help='IDs to generate in total')
+        parser.add_argument('--threads', type=int, default=8, help='Threads sharing the generator')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Simulated worker processes, each with its own generator and node')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        threads = options['threads']
+        processes = options['processes']
+        if min(count, threads, processes) < 1:
+            raise CommandError('--count, --threads and --processes must be positive.')
+
+        generators = [booking_ids] + [BookingIdGenerator() for _ in range(processes - 1)]
+        per_thread = count // threads
+        batches = [None] * threads
+
+        def worker(index):
+            generate = generators[index % processes].generate
+            batches[index] = [generate() for _ in range(per_thread)]
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        generated = per_thread * threads
+        unique = len({booking_id for batch in batches for booking_id in batch})
+        unordered = sum(
+            1 for batch in batches for previous, current in zip(batch, batch[1:]) if current <= previous
+        )
+
+        started = time.perf_counter()
+        for _ in range(per_thread):
+            f"BK{str(uuid.uuid4())[:8].upper()}"
+        uuid_elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'Generated:         {generated} IDs on {threads} threads, {processes} node(s)')
+        self.stdout.write(f'Elapsed:           {elapsed:.3f}s')
+        self.stdout.write(f'Throughput:        {generated / elapsed:,.0f} IDs/sec')
+        self.stdout.write(f'uuid4 baseline:    {per_thread / uuid_elapsed:,.0f} IDs/sec (one thread)')
+        self.stdout.write(f'Sample:            {batches[0][0]}')
+        self.stdout.write(f'Duplicates:        {generated - unique}')
+        self.stdout.write(f'Out of order:      {unordered}')
+
+        if unique != generated or unordered:
+            raise CommandError('Booking IDs were duplicated or out of order.')
+        self.stdout.write(self.style.SUCCESS('All booking IDs unique and ordered'))
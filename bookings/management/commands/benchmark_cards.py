@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import AnonymousUser
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+from datetime import timedelta
+import time as clock
+from bookings import synthetic
+from bookings.benchmarks import percentile
+from bookings.forms import TravelSearchForm
+from bookings.pagination import KeysetPage
+
+MODES = (
+    # name, card cache timeout, new updated_at on every render
+    ('uncached', 0, False),
+    ('cold cache', 3600, True),
+    ('warm cache', 3600, False),
+)
+
+
+class Command(BaseCommand):
+    help = 'Time rendering a search results page of travel option cards with and without the card cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=50, help='Travel option cards on the page')
+        parser.add_argument('--repeat', type=int, default=200, help='Timed renders per mode')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed renders per mode')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic travel options')
+
+    def handle(self, *args, **options):
+        if min(options['cards'], options['repeat']) < 1 or options['warmup'] < 0:
+            raise CommandError('--cards and --repeat must be positive.')
+
+        # Unsaved options: the page is rendered without touching the database
+        today = timezone.now().date()
+        travel_options, _ = synthetic.build_options(
+            options['seed'], 0, 0, options['cards'], synthetic.Network(options['seed']), today, 0, 30)
+        for pk, option in enumerate(travel_options, start=1):
+            option.pk = pk
+            option.updated_at = timezone.now()
+
+        request = RequestFactory().get('/search/')
+        request.user = AnonymousUser()
+        page = KeysetPage(travel_options)
+        context = {
+            'form': TravelSearchForm(),
+            'page_obj': page,
+            'travel_options': page,
+            'result_count': len(travel_options),
+        }
+
+        self.stdout.write(f"Cards per page:    {options['cards']}")
+        results = {}
+        for name, timeout, bump in MODES:
+            timings = []
+            with override_settings(CARD_CACHE_TIMEOUT=timeout):
+                for n in range(options['warmup'] + options['repeat']):
+                    if bump:
+                        stamp = timezone.now() + timedelta(microseconds=n)
+                        for option in travel_options:
+                            option.updated_at = stamp
+                    started = clock.perf_counter()
+                    render_to_string('bookings/search_results.html', context, request=request)
+                    if n >= options['warmup']:
+                        timings.append((clock.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = sum(timings) / len(timings)
+
+            self.stdout.write('')
+            self.stdout.write(f'Mode:              {name}')
+            self.stdout.write(f'Mean:              {results[name]:.3f} ms')
+            for p in (50, 95):
+                label = f'p{p}:'
+                self.stdout.write(f'{label:<19}{percentile(timings, p):.3f} ms')
+
+        baseline = results[MODES[0][0]]
+        self.stdout.write('')
+        for name, mean in results.items():
+            self.stdout.write(f'{name:<12} {mean:8.3f} ms/page  ({baseline / mean:.2f}x)')
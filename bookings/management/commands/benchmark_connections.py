@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import timedelta
+import json
+import random
+import time
+from bookings.benchmarks import PERCENTILES, percentile
+from bookings.connections import DEFAULT_MAX_LEGS, OBJECTIVES, connection_graph, day_start
+
+
+class Command(BaseCommand):
+    help = 'Build the connection graph and time connection searches between random city pairs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='Searches per objective')
+        parser.add_argument('--days', type=int, default=30, help='Departure days to sample from, starting today')
+        parser.add_argument('--max-legs', type=int, default=DEFAULT_MAX_LEGS, help='Legs per itinerary')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the sampled queries')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if min(options['queries'], options['days'], options['max_legs']) < 1:
+            raise CommandError('--queries, --days and --max-legs must be positive.')
+
+        connection_graph.load()
+        stats = connection_graph.stats()
+        self.stdout.write(f"Legs:           {stats['legs']}")
+        self.stdout.write(f"Cities:         {stats['cities']}")
+        self.stdout.write(f"Build time:     {stats['build_seconds'] * 1000:.1f}ms")
+        self.stdout.write(f"Memory:         {stats['memory_bytes'] / 1024 / 1024:.2f} MiB")
+
+        cities = connection_graph.city_names()
+        if len(cities) < 2:
+            raise CommandError('The graph needs at least two cities; generate data first.')
+        rng = random.Random(options['seed'])
+        today = timezone.now().date()
+        queries = []
+        for _ in range(options['queries']):
+            source, destination = rng.sample(cities, 2)
+            day = today + timedelta(days=rng.randrange(options['days']))
+            queries.append((source, destination, day_start(day), day_start(day + timedelta(days=1))))
+
+        results = {'graph': stats, 'objectives': {}}
+        for objective in OBJECTIVES:
+            latencies = []
+            found = 0
+            for source, destination, start, end in queries:
+                begin = time.perf_counter()
+                itineraries = connection_graph.search(source, destination, start, end, objective,
+                                                      options['max_legs'])
+                latencies.append((time.perf_counter() - begin) * 1000)
+                found += bool(itineraries)
+            latencies.sort()
+            summary = {
+                'queries': len(latencies),
+                'found': found,
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+            }
+            for p in PERCENTILES:
+                summary[f'p{p}_ms'] = round(percentile(latencies, p), 3)
+            summary['max_ms'] = round(latencies[-1], 3)
+            results['objectives'][objective] = summary
+            self.stdout.write(
+                f"{objective:<10} found {found}/{len(latencies)}  mean {summary['mean_ms']:.2f}ms  "
+                f"p50 {summary['p50_ms']:.2f}ms  p95 {summary['p95_ms']:.2f}ms  max {summary['max_ms']:.2f}ms"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
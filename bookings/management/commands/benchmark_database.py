@@ -0,0 +1,163 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection, connections, transaction, OperationalError
+from django.utils import timezone
+from datetime import timedelta, time
+from decimal import Decimal
+import random
+import threading
+import time as clock
+import uuid
+from bookings.benchmarks import PERCENTILES, percentile
+from bookings.models import TravelOption, Booking
+from bookings.search import filter_route
+from bookings import reservations
+from travel_booking.db_profile import PROFILES, tune_database
+
+SOURCE = 'Benchmark City'
+DESTINATION = 'Benchmark Town'
+
+
+class Command(BaseCommand):
+    help = 'Measure search latency while bookings are written, under each database profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES),
+                            help='Database profiles to compare')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent searching threads')
+        parser.add_argument('--writers', type=int, default=2, help='Concurrent booking threads')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+        parser.add_argument('--departures', type=int, default=30, help='Benchmark departures on the searched route')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark rows afterwards')
+
+    def handle(self, *args, **options):
+        if min(options['readers'], options['writers'], options['departures']) < 1 or options['seconds'] <= 0:
+            raise CommandError('All numeric options must be positive.')
+
+        user, _ = User.objects.get_or_create(username='benchmark_user')
+        travel_options = self.create_departures(options['departures'])
+        # Every thread opens its own connection from this entry; swap it per run
+        original = connections.settings['default']
+        self.stdout.write(f"Database:          {connections['default'].vendor}")
+        self.stdout.write(f"Readers/writers:   {options['readers']}/{options['writers']}")
+
+        results = {}
+        try:
+            for profile in options['profiles']:
+                connections['default'].close()
+                connections['default'].settings_dict = connections.settings['default'] = \
+                    tune_database(original, profile)
+                if profile == 'development' and connection.vendor == 'sqlite':
+                    # WAL is stored in the file, so undo an earlier production run
+                    with connection.cursor() as cursor:
+                        cursor.execute('PRAGMA journal_mode = DELETE')
+                results[profile] = self.run_profile(profile, user, travel_options, options)
+        finally:
+            connections['default'].close()
+            connections['default'].settings_dict = connections.settings['default'] = original
+            if not options['keep']:
+                TravelOption.objects.filter(pk__in=[option.pk for option in travel_options]).delete()
+
+        if len(results) > 1:
+            baseline = results[options['profiles'][0]]
+            self.stdout.write('')
+            for profile, result in results.items():
+                speedup = baseline['p95'] / result['p95'] if result['p95'] else 0
+                self.stdout.write(f"{profile:<12} search p95 {result['p95']:8.2f} ms  "
+                                  f"{result['bookings']:6d} bookings  ({speedup:.2f}x)")
+
+    def create_departures(self, count):
+        today = timezone.now().date()
+        travel_options = []
+        for day in range(count):
+            departure = today + timedelta(days=day + 1)
+            travel_options.append(TravelOption.objects.create(
+                travel_id=f"BENCH{uuid.uuid4().hex[:8].upper()}",
+                travel_type='flight',
+                source=SOURCE,
+                destination=DESTINATION,
+                departure_date=departure,
+                departure_time=time(9, 0),
+                arrival_date=departure,
+                arrival_time=time(11, 0),
+                price=Decimal('100.00'),
+                available_seats=1_000_000,
+                total_seats=1_000_000,
+                status='active',
+            ))
+        return travel_options
+
+    def run_profile(self, profile, user, travel_options, options):
+        deadline = clock.perf_counter() + options['seconds']
+        latencies = []
+        stats = {'bookings': 0, 'lock_errors': 0, 'search_errors': 0}
+        lock = threading.Lock()
+
+        def reader():
+            timings = []
+            errors = 0
+            try:
+                while clock.perf_counter() < deadline:
+                    started = clock.perf_counter()
+                    try:
+                        list(filter_route(
+                            TravelOption.objects.filter(status='active', departure_date__gte=timezone.now().date()),
+                            source=SOURCE, destination=DESTINATION,
+                        ).order_by('departure_date', 'departure_time', 'pk')[:20])
+                    except OperationalError:
+                        errors += 1
+                    else:
+                        timings.append((clock.perf_counter() - started) * 1000)
+                    # What Django does at the end of every request
+                    close_old_connections()
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(timings)
+                stats['search_errors'] += errors
+
+        def writer(seed):
+            rng = random.Random(seed)
+            booked = errors = 0
+            try:
+                while clock.perf_counter() < deadline:
+                    booking = Booking(
+                        user=user,
+                        number_of_seats=1,
+                        passenger_name='Benchmark Passenger',
+                        passenger_email='benchmark@example.com',
+                        passenger_phone='0000000000',
+                    )
+                    try:
+                        with transaction.atomic():
+                            reservations.create_booking(booking, rng.choice(travel_options))
+                        booked += 1
+                    except OperationalError:
+                        # SQLite reports writer contention as "database is locked"
+                        errors += 1
+                    close_old_connections()
+            finally:
+                connection.close()
+            with lock:
+                stats['bookings'] += booked
+                stats['lock_errors'] += errors
+
+        workers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        workers += [threading.Thread(target=writer, args=(seed,)) for seed in range(options['writers'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        latencies.sort()
+        self.stdout.write('')
+        self.stdout.write(f'Profile:           {profile}')
+        self.stdout.write(f'Searches:          {len(latencies)}')
+        for p in PERCENTILES:
+            value = percentile(latencies, p)
+            label = f'Search p{p}:'
+            self.stdout.write(f'{label:<19}{value:.2f} ms' if value is not None else f'{label:<19}-')
+        self.stdout.write(f"Search errors:     {stats['search_errors']}")
+        self.stdout.write(f"Bookings:          {stats['bookings']}")
+        self.stdout.write(f"Lock errors:       {stats['lock_errors']}")
+        return {'p95': percentile(latencies, 95) or 0, **stats}
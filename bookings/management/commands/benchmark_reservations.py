@@ -0,0 +1,147 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction, OperationalError
+from django.db.models import Sum
+from django.utils import timezone
+from datetime import timedelta, time
+from decimal import Decimal
+import copy
+import threading
+import time as clock
+import uuid
+from bookings.models import TravelOption, Booking
+from bookings import reservations
+
+
+class Command(BaseCommand):
+    help = 'Stress test the seat reservation engine with concurrent buyers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Number of concurrent buyers')
+        parser.add_argument('--attempts', type=int, default=50, help='Booking attempts per buyer')
+        parser.add_argument('--capacity', type=int, default=200, help='Seats on the benchmark departure')
+        parser.add_argument('--seats', type=int, default=1, help='Seats requested per booking')
+        parser.add_argument('--shards', type=int, nargs='+', default=[0],
+                            help='Inventory modes to run: 0 for the single-row counter, N for N seat shards')
+        parser.add_argument('--think-ms', type=float, default=0,
+                            help='Extra work inside each booking transaction, holding its row locks')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark rows afterwards')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        attempts = options['attempts']
+        capacity = options['capacity']
+        seats = options['seats']
+        if min(threads, attempts, capacity, seats) < 1:
+            raise CommandError('All numeric options must be positive.')
+        if min(options['shards']) < 0 or options['think_ms'] < 0:
+            raise CommandError('--shards and --think-ms cannot be negative.')
+
+        user, _ = User.objects.get_or_create(username='benchmark_user')
+        self.stdout.write(f"Database:          {connections['default'].vendor}")
+        self.stdout.write(f'Buyers x attempts: {threads} x {attempts}')
+
+        results = {}
+        for shards in options['shards']:
+            results[shards] = self.run_mode(user, shards, options)
+
+        if len(results) > 1:
+            baseline = results[options['shards'][0]]
+            self.stdout.write('')
+            for shards, result in results.items():
+                speedup = result['throughput'] / baseline['throughput'] if baseline['throughput'] else 0
+                self.stdout.write(f"{self.label(shards):<20} {result['throughput']:8.1f} bookings/sec "
+                                  f"({speedup:.2f}x)")
+
+        if any(result['oversold'] for result in results.values()):
+            raise CommandError('Inventory mismatch: seats were oversold or lost.')
+        self.stdout.write(self.style.SUCCESS('No overselling detected'))
+
+    def label(self, shards):
+        return f'{shards} seat shards' if shards else 'single row'
+
+    def run_mode(self, user, shards, options):
+        capacity = options['capacity']
+        seats = options['seats']
+        think = options['think_ms'] / 1000
+        departure = timezone.now().date() + timedelta(days=30)
+        travel_option = TravelOption.objects.create(
+            travel_id=f"BENCH{uuid.uuid4().hex[:8].upper()}",
+            travel_type='flight',
+            source='Benchmark City',
+            destination='Benchmark Town',
+            departure_date=departure,
+            departure_time=time(9, 0),
+            arrival_date=departure,
+            arrival_time=time(11, 0),
+            price=Decimal('100.00'),
+            available_seats=capacity,
+            total_seats=capacity,
+            status='active',
+        )
+        if shards:
+            reservations.stripe_seats(travel_option, shards)
+
+        stats = {'booked': 0, 'sold_out': 0, 'lock_errors': 0}
+        lock = threading.Lock()
+
+        def buyer():
+            option = copy.copy(travel_option)
+            try:
+                for _ in range(options['attempts']):
+                    booking = Booking(
+                        user=user,
+                        number_of_seats=seats,
+                        passenger_name='Benchmark Passenger',
+                        passenger_email='benchmark@example.com',
+                        passenger_phone='0000000000',
+                    )
+                    try:
+                        with transaction.atomic():
+                            reservations.create_booking(booking, option)
+                            if think:
+                                clock.sleep(think)
+                        outcome = 'booked'
+                    except reservations.SeatsUnavailable:
+                        outcome = 'sold_out'
+                    except OperationalError:
+                        # SQLite reports writer contention as "database is locked"
+                        outcome = 'lock_errors'
+                    with lock:
+                        stats[outcome] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buyer) for _ in range(options['threads'])]
+        started = clock.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = clock.perf_counter() - started
+
+        if shards:
+            # Post-commit syncs are best effort and may have lost a lock race
+            reservations.sync_striped_seats(travel_option.pk)
+        travel_option.refresh_from_db()
+        booked_seats = Booking.objects.filter(
+            travel_option=travel_option, status='confirmed'
+        ).aggregate(total=Sum('number_of_seats'))['total'] or 0
+        shard_seats = travel_option.seat_shard_set.aggregate(total=Sum('available_seats'))['total']
+        oversold = (booked_seats + travel_option.available_seats != capacity or booked_seats > capacity or
+                    (shards and shard_seats != travel_option.available_seats))
+        throughput = stats['booked'] / elapsed
+
+        self.stdout.write('')
+        self.stdout.write(f'Mode:              {self.label(shards)}')
+        self.stdout.write(f'Bookings:          {stats["booked"]}')
+        self.stdout.write(f'Sold out:          {stats["sold_out"]}')
+        self.stdout.write(f'Lock errors:       {stats["lock_errors"]}')
+        self.stdout.write(f'Seats booked:      {booked_seats}/{capacity}')
+        self.stdout.write(f'Seats remaining:   {travel_option.available_seats}')
+        self.stdout.write(f'Elapsed:           {elapsed:.3f}s')
+        self.stdout.write(f'Throughput:        {throughput:.1f} bookings/sec')
+
+        if not options['keep']:
+            travel_option.delete()
+        return {'throughput': throughput, 'oversold': oversold}
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+import django
+import json
+import platform
+from bookings import benchmarks
+from bookings.models import TravelOption, Booking
+
+
+class Command(BaseCommand):
+    help = 'Benchmark latency, queries per request and throughput of the bookings views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', choices=['client', 'wsgi'], default='client',
+                            help='Test client (in-process) or threaded WSGI server over HTTP')
+        parser.add_argument('--threads', type=int, default=8, help='Client threads for the wsgi driver')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario')
+        parser.add_argument('--scenarios', nargs='+', choices=benchmarks.SCENARIOS,
+                            default=list(benchmarks.SCENARIOS), help='Scenarios to run')
+        parser.add_argument('--samples', type=int, default=50, help='Distinct routes/options sampled per scenario')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for sampling requests')
+        parser.add_argument('--user', help='Username for logged-in scenarios (default: busiest customer)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against results previously written with --output')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency/throughput drift before flagging a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error when a regression is found')
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['requests'], options['samples']) < 1 or options['warmup'] < 0:
+            raise CommandError('--threads, --requests and --samples must be positive.')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+                baseline_meta, baseline = baseline['meta'], baseline['scenarios']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {exc}")
+            threads = options['threads'] if options['driver'] == 'wsgi' else 1
+            if (baseline_meta.get('driver'), baseline_meta.get('threads')) != (options['driver'], threads):
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was recorded with the {baseline_meta.get('driver')} driver and "
+                    f"{baseline_meta.get('threads')} thread(s); latencies are not comparable."
+                ))
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING('DEBUG is on; results include debug overhead.'))
+
+        workload = benchmarks.Workload(options['seed'], options['samples'], options['user'])
+        bookings = options['requests'] + options['warmup']
+        workload.prepare(capacity=bookings + 10)
+        try:
+            if options['driver'] == 'wsgi':
+                driver = benchmarks.WSGIDriver(workload.user, options['threads'])
+            else:
+                driver = benchmarks.ClientDriver(workload.user)
+            try:
+                results = benchmarks.run(driver, workload, options['scenarios'],
+                                         options['requests'], options['warmup'])
+            finally:
+                driver.close()
+        finally:
+            workload.cleanup()
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'driver': options['driver'],
+                'threads': options['threads'] if options['driver'] == 'wsgi' else 1,
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'seed': options['seed'],
+                'user': workload.user.username,
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'travel_options': TravelOption.objects.count(),
+                'bookings': Booking.objects.count(),
+            },
+            'scenarios': results,
+        }
+
+        self.stdout.write(
+            f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'req/s':>9}{'errors':>8}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['queries_max'] if result['queries_max'] is not None else '-':>9}"
+                f"{result['throughput_rps']:>9.1f}{result['errors']:>8}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmarks.compare(results, baseline, options['tolerance'])
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f'Regression: {regression}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s) against the baseline')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookings.lifecycle import cancel_travel_options
+from bookings.models import TravelOption
+
+
+class Command(BaseCommand):
+    help = 'Cancel travel options and all confirmed or held bookings on them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('travel_ids', nargs='+', help='Travel options to cancel')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows updated per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        found = dict(TravelOption.objects.filter(travel_id__in=options['travel_ids'])
+                     .values_list('travel_id', 'pk'))
+        missing = sorted(set(options['travel_ids']) - set(found))
+        if missing:
+            raise CommandError(f"Unknown travel options: {', '.join(missing)}")
+
+        cancelled, bookings = cancel_travel_options(found.values(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Cancelled {cancelled} travel option{"s" if cancelled != 1 else ""} '
+            f'and {bookings} booking{"s" if bookings != 1 else ""}'))
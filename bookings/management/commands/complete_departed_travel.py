@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+from bookings.lifecycle import complete_departed
+
+
+class Command(BaseCommand):
+    help = 'Mark active travel options that have already departed as completed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Travel options updated per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and sweep every N seconds instead of once')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        while True:
+            completed = complete_departed(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Completed {completed} departed travel option{"s" if completed != 1 else ""}'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
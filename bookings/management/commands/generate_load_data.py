@@ -0,0 +1,164 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.utils import timezone
+from datetime import date
+import multiprocessing
+import os
+import time
+import django
+from bookings import synthetic
+from bookings.bulk import delete_rows
+from bookings.models import TravelOption, Booking, SeatShard
+from bookings.cities import city_index
+from bookings.connections import connection_graph
+from bookings.fares import CELL_FIELDS, rebuild_fare_calendar, refresh_fare_cells
+from bookings.search_cache import invalidate_routes
+
+
+def _init_worker():
+    # Needed when the platform spawns rather than forks worker processes
+    django.setup()
+
+
+def _run_shard(task):
+    kind, config, shard, start, stop = task
+    if kind == 'users':
+        return kind, synthetic.write_users(config, shard, start, stop), 0
+    options, bookings = synthetic.write_options(config, shard, start, stop)
+    return kind, options, bookings
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, deterministic synthetic dataset of users, travel options and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--options', type=int, default=100000, help='Travel options to create')
+        parser.add_argument('--users', type=int, default=10000, help='Users to create')
+        parser.add_argument('--seed', default='42', help='Seed; the same seed and sizes give the same data')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes generating and inserting shards')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk_create statement')
+        parser.add_argument('--cities', type=int, default=len(synthetic.CITIES), help='Number of cities')
+        parser.add_argument('--past-days', type=int, default=30, help='Days of departures before --today')
+        parser.add_argument('--future-days', type=int, default=90, help='Days of departures after --today')
+        parser.add_argument('--booking-rate', type=float, default=0.1,
+                            help='Share of sold seats written as Booking rows')
+        parser.add_argument('--today', help='Anchor date (YYYY-MM-DD); defaults to the current date')
+        parser.add_argument('--password', default='loadtest123', help='Password shared by generated users')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated rows first')
+
+    def handle(self, *args, **options):
+        for name in ('options', 'users', 'past_days', 'future_days'):
+            if options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        if min(options['workers'], options['batch_size'], options['cities']) < 1:
+            raise CommandError('--workers, --batch-size and --cities must be positive.')
+        if options['cities'] < 2:
+            raise CommandError('At least two cities are needed to form a route.')
+        if not 0 <= options['booking_rate'] <= 1:
+            raise CommandError('--booking-rate must be between 0 and 1.')
+        try:
+            today = date.fromisoformat(options['today']) if options['today'] else timezone.now().date()
+        except ValueError:
+            raise CommandError('--today must be a date in YYYY-MM-DD format.')
+
+        if options['flush']:
+            self.flush()
+        elif (TravelOption.objects.filter(travel_id__startswith=synthetic.TRAVEL_ID_PREFIX).exists() or
+              User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX).exists()):
+            raise CommandError('Generated data already exists; pass --flush to replace it.')
+
+        config = {
+            'seed': options['seed'],
+            'users': options['users'],
+            'cities': options['cities'],
+            'today': today.isoformat(),
+            'past_days': options['past_days'],
+            'future_days': options['future_days'],
+            'booking_rate': options['booking_rate'],
+            'batch_size': options['batch_size'],
+            # Hashing is deliberately slow, so every user shares one hash
+            'password': make_password(options['password']),
+        }
+        # Users must exist before the option shards book seats for them
+        phases = [
+            [('users', config) + shard for shard in synthetic.shards(options['users'])],
+            [('options', config) + shard for shard in synthetic.shards(options['options'])],
+        ]
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            # Concurrent writers would only queue on SQLite's database lock
+            # until they time out
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer; ignoring --workers.'))
+            workers = 1
+
+        totals = {'users': 0, 'options': 0, 'bookings': 0}
+        started = time.perf_counter()
+        # Built before forking so every worker inherits it instead of
+        # rebuilding the route table for each shard
+        synthetic.network(config['seed'], config['cities'])
+        if workers > 1:
+            # Forked workers must not share the parent's database connection
+            connections.close_all()
+            with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+                for tasks in phases:
+                    for result in pool.imap_unordered(_run_shard, tasks):
+                        self.record(totals, result, options['verbosity'])
+        else:
+            for tasks in phases:
+                for task in tasks:
+                    self.record(totals, _run_shard(task), options['verbosity'])
+        elapsed = time.perf_counter() - started
+
+        # bulk_create bypasses the signals that keep these up to date
+        city_index.invalidate()
+        connection_graph.invalidate()
+        rebuild_fare_calendar()
+        invalidate_routes(
+            TravelOption.objects.filter(travel_id__startswith=synthetic.TRAVEL_ID_PREFIX)
+            .order_by().values_list('source_key', 'destination_key').distinct()
+        )
+
+        rows = sum(totals.values())
+        self.stdout.write(f"Users:          {totals['users']}")
+        self.stdout.write(f"Travel options: {totals['options']}")
+        self.stdout.write(f"Bookings:       {totals['bookings']}")
+        self.stdout.write(f'Elapsed:        {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/sec)')
+        self.stdout.write(self.style.SUCCESS(f"Generated dataset for seed {options['seed']}"))
+
+    def record(self, totals, result, verbosity):
+        kind, rows, bookings = result
+        totals[kind] += rows
+        totals['bookings'] += bookings
+        if verbosity > 1:
+            self.stdout.write(f'{kind}: +{rows} rows')
+
+    def flush(self):
+        """Delete generated rows, including bookings made on generated options"""
+        options = TravelOption.objects.filter(travel_id__startswith=synthetic.TRAVEL_ID_PREFIX)
+        cells = list(options.order_by().values_list(*CELL_FIELDS).distinct())
+        # Rows pointing at the options go first, since delete_rows() does not
+        # cascade; deleting bookings also deletes their passengers
+        Booking.objects.filter(travel_option__in=options).delete()
+        SeatShard.objects.filter(travel_option__in=options).delete()
+        # A plain DELETE per batch loads no rows and sends no per-row delete
+        # signals; the caches and fare calendar are refreshed below
+        while True:
+            batch = list(options.order_by('pk').values_list('pk', flat=True)[:5000])
+            if not batch:
+                break
+            delete_rows(TravelOption, batch)
+
+        users = User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX).order_by('pk')
+        while True:
+            batch = list(users.values_list('pk', flat=True)[:5000])
+            if not batch:
+                break
+            User.objects.filter(pk__in=batch).delete()
+
+        city_index.invalidate()
+        connection_graph.invalidate()
+        refresh_fare_cells(cells)
+        invalidate_routes({cell[:2] for cell in cells})
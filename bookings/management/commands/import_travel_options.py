@@ -0,0 +1,171 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+import csv
+import itertools
+import json
+import sys
+import time
+from bookings.models import TravelOption
+from bookings.reservations import rebalance_seat_shards, sync_striped_seats
+from bookings.cities import city_index
+from bookings.connections import connection_graph
+from bookings.fares import CELL_FIELDS, fare_cell, refresh_fare_cells
+from bookings.search_cache import invalidate_routes
+
+REQUIRED_FIELDS = [
+    'travel_id', 'travel_type', 'source', 'destination',
+    'departure_date', 'departure_time', 'arrival_date', 'arrival_time',
+    'price', 'total_seats',
+]
+OPTIONAL_FIELDS = ['available_seats', 'status']
+# Computed by TravelOption.sync_derived_fields()
+DERIVED_FIELDS = [
+    'source_key', 'destination_key', 'departure_at', 'arrival_at', 'duration_minutes',
+]
+
+# Columns overwritten when a travel_id already exists. Seat availability is
+# left alone by default because it reflects bookings made since the last
+# import; it is only lowered where it would exceed a reduced total_seats.
+UPDATE_FIELDS = [
+    'travel_type', 'source', 'destination',
+    'departure_date', 'departure_time', 'arrival_date', 'arrival_time',
+    'price', 'total_seats', 'status', 'updated_at',
+] + DERIVED_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Stream travel options from a CSV or JSONL file and upsert them on travel_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per upsert batch')
+        parser.add_argument('--update-seats', action='store_true',
+                            help='Also overwrite available_seats on existing travel options')
+        parser.add_argument('--strict', action='store_true', help='Abort on the first invalid row')
+        parser.add_argument('--max-errors', type=int, default=20, help='Invalid rows to report in detail')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        update_fields = UPDATE_FIELDS + (['available_seats'] if options['update_seats'] else [])
+        upsert = {'update_conflicts': True, 'update_fields': update_fields}
+        if connection.features.supports_update_conflicts_with_target:
+            upsert['unique_fields'] = ['travel_id']
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        stats = {'read': 0, 'imported': 0, 'invalid': 0}
+        started = time.perf_counter()
+        try:
+            rows = self.read_rows(stream, fmt)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                options_by_id = {}
+                for line, row in chunk:
+                    stats['read'] += 1
+                    try:
+                        option = self.build_option(row)
+                    except (ValidationError, ValueError, TypeError) as exc:
+                        stats['invalid'] += 1
+                        message = f'Line {line}: {self.describe(exc)}'
+                        if options['strict']:
+                            raise CommandError(message)
+                        if stats['invalid'] <= options['max_errors']:
+                            self.stderr.write(message)
+                        continue
+                    # The last occurrence of a travel_id within a chunk wins
+                    options_by_id[option.travel_id] = option
+
+                if options_by_id:
+                    batch = list(options_by_id.values())
+                    with transaction.atomic():
+                        # Updated rows may move out of their old routes and calendar cells
+                        cells = set(TravelOption.objects.filter(travel_id__in=options_by_id)
+                                    .values_list(*CELL_FIELDS))
+                        TravelOption.objects.bulk_create(batch, **upsert)
+                        self.cap_available_seats(options_by_id)
+                        invalidate_routes({(o.source_key, o.destination_key) for o in batch} |
+                                          {cell[:2] for cell in cells})
+                        refresh_fare_cells(cells | {fare_cell(o) for o in batch})
+                    stats['imported'] += len(batch)
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{stats['read']} rows read...")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            city_index.invalidate()
+            connection_graph.invalidate()
+
+        elapsed = time.perf_counter() - started
+        rate = stats['read'] / elapsed if elapsed else 0
+        self.stdout.write(f"Rows read:     {stats['read']}")
+        self.stdout.write(f"Rows invalid:  {stats['invalid']}")
+        self.stdout.write(f'Elapsed:       {elapsed:.2f}s ({rate:,.0f} rows/sec)')
+        self.stdout.write(self.style.SUCCESS(f"Upserted {stats['imported']} travel options"))
+
+    def cap_available_seats(self, travel_ids):
+        """Lower free seats that exceed a reduced total_seats"""
+        over = TravelOption.objects.filter(travel_id__in=travel_ids, available_seats__gt=F('total_seats'))
+        striped = list(over.filter(seat_shards__gt=0).values_list('pk', 'total_seats'))
+        over.filter(seat_shards=0).update(available_seats=F('total_seats'), updated_at=timezone.now())
+        for pk, total_seats in striped:
+            rebalance_seat_shards(pk, capacity=total_seats)
+            transaction.on_commit(lambda pk=pk: sync_striped_seats(pk), robust=True)
+
+    def read_rows(self, stream, fmt):
+        """Yield (line number, dict) pairs without loading the whole file"""
+        if fmt == 'jsonl':
+            for line, text in enumerate(stream, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except json.JSONDecodeError as exc:
+                        yield line, exc
+        else:
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+
+    def build_option(self, row):
+        """Validate one input row and return an unsaved TravelOption"""
+        if isinstance(row, Exception):
+            raise ValueError(f'invalid JSON ({row})')
+        if not isinstance(row, dict):
+            raise ValueError('expected an object per line')
+        missing = [field for field in REQUIRED_FIELDS if row.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+
+        values = {field: row[field] for field in REQUIRED_FIELDS}
+        for field in OPTIONAL_FIELDS:
+            if row.get(field) not in (None, ''):
+                values[field] = row[field]
+
+        option = TravelOption(**values)
+        # Coerce strings to Python values, then validate without per-row queries
+        for field in option._meta.concrete_fields:
+            if field.attname in values:
+                setattr(option, field.attname, field.to_python(getattr(option, field.attname)))
+        if option.available_seats is None:
+            option.available_seats = option.total_seats
+        option.full_clean(exclude=DERIVED_FIELDS, validate_unique=False, validate_constraints=False)
+        if option.available_seats > option.total_seats:
+            raise ValueError('available_seats exceeds total_seats')
+        option.sync_derived_fields()
+        return option
+
+    def describe(self, exc):
+        if isinstance(exc, ValidationError) and hasattr(exc, 'message_dict'):
+            return '; '.join(f"{field}: {' '.join(errors)}" for field, errors in exc.message_dict.items())
+        return str(exc)
@@ -4,6 +4,9 @@ from datetime import datetime, timedelta, time
 from decimal import Decimal
 import random
 from bookings.models import TravelOption
+from bookings.cities import city_index
+from bookings.connections import connection_graph
+from bookings.fares import rebuild_fare_calendar
 
 class Command(BaseCommand):
     help = 'Populate the database with sample travel options'
@@ -28,6 +31,7 @@ class Command(BaseCommand):
         start_date = timezone.now().date()
         
         travel_options = []
+        used_ids = set()
         for i in range(200):  # Create 200 travel options
             # Random source and destination (different cities)
             source = random.choice(cities)
@@ -78,8 +82,9 @@ class Command(BaseCommand):
             
             # Generate unique travel ID
             travel_id = f"{travel_type.upper()[:2]}{random.randint(1000, 9999)}"
-            while TravelOption.objects.filter(travel_id=travel_id).exists():
+            while travel_id in used_ids:
                 travel_id = f"{travel_type.upper()[:2]}{random.randint(1000, 9999)}"
+            used_ids.add(travel_id)
             
             travel_option = TravelOption(
                 travel_id=travel_id,
@@ -95,11 +100,15 @@ class Command(BaseCommand):
                 total_seats=total_seats,
                 status='active'
             )
+            travel_option.sync_derived_fields()
             
             travel_options.append(travel_option)
         
         # Bulk create all travel options
         TravelOption.objects.bulk_create(travel_options)
+        city_index.invalidate()
+        connection_graph.invalidate()
+        rebuild_fare_calendar()
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully created {len(travel_options)} travel options')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+from bookings.fares import rebuild_fare_calendar
+from bookings.models import FareCalendarDay
+from bookings.search_cache import invalidate_routes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the fare calendar rollup from the current travel options'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Calendar rows per bulk insert')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        started = time.perf_counter()
+        written = rebuild_fare_calendar(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        # Cached calendar responses may have been built from drifted rows
+        invalidate_routes(FareCalendarDay.objects.order_by()
+                          .values_list('source_key', 'destination_key').distinct())
+
+        self.stdout.write(f'Elapsed: {elapsed:.2f}s')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} fare calendar day{"s" if written != 1 else ""}'))
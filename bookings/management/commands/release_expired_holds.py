@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+import time
+from bookings.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release expired seat holds and return their seats to inventory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Holds released per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and sweep every N seconds instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Released {released} expired hold{"s" if released != 1 else ""}'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
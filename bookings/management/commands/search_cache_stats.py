@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from bookings.search_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show search result cache hit-rate statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        self.stdout.write(f'Hits:     {stats["hits"]}')
+        self.stdout.write(f'Misses:   {stats["misses"]}')
+        self.stdout.write(f'Hit rate: {stats["hit_rate"]:.1%}')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookings.models import TravelOption
+from bookings.reservations import stripe_seats
+
+
+class Command(BaseCommand):
+    help = 'Split a hot departure\'s seat inventory across several counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('travel_id', help='Travel option to stripe')
+        parser.add_argument('--shards', type=int, default=8,
+                            help='Number of seat counters; 0 folds them back into the travel option')
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if not 0 <= shards <= 256:
+            raise CommandError('--shards must be between 0 and 256.')
+        try:
+            travel_option = TravelOption.objects.get(travel_id=options['travel_id'])
+        except TravelOption.DoesNotExist:
+            raise CommandError(f"Travel option {options['travel_id']} does not exist.")
+
+        stripe_seats(travel_option, shards)
+        if shards:
+            self.stdout.write(self.style.SUCCESS(
+                f'Split {travel_option.available_seats} seats of {travel_option.travel_id} across {shards} shards'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Stored {travel_option.available_seats} seats of {travel_option.travel_id} on the travel option'))
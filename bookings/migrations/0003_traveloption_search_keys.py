@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:51
+
+from django.db import migrations, models
+
+
+def backfill_search_keys(apps, schema_editor):
+    TravelOption = apps.get_model('bookings', 'TravelOption')
+    batch = []
+    for option in TravelOption.objects.only('source', 'destination').iterator(chunk_size=2000):
+        option.source_key = ' '.join(option.source.split()).casefold()
+        option.destination_key = ' '.join(option.destination.split()).casefold()
+        batch.append(option)
+        if len(batch) >= 2000:
+            TravelOption.objects.bulk_update(batch, ['source_key', 'destination_key'])
+            batch = []
+    if batch:
+        TravelOption.objects.bulk_update(batch, ['source_key', 'destination_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='traveloption',
+            name='bookings_tr_source_3ae3c2_idx',
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='destination_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='source_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['source_key', 'destination_key', 'departure_date'], name='travel_route_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['destination_key', 'departure_date'], name='travel_dest_key_idx'),
+        ),
+    ]
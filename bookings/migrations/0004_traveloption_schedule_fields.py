@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:12
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_schedule_fields(apps, schema_editor):
+    TravelOption = apps.get_model('bookings', 'TravelOption')
+    fields = ['departure_at', 'arrival_at', 'duration_minutes']
+    options = TravelOption.objects.only(
+        'departure_date', 'departure_time', 'arrival_date', 'arrival_time',
+    )
+    batch = []
+    for option in options.iterator(chunk_size=2000):
+        departure = datetime.combine(option.departure_date, option.departure_time)
+        arrival = datetime.combine(option.arrival_date, option.arrival_time)
+        option.duration_minutes = int((arrival - departure).total_seconds() // 60)
+        if settings.USE_TZ:
+            departure = timezone.make_aware(departure, timezone.get_default_timezone())
+            arrival = timezone.make_aware(arrival, timezone.get_default_timezone())
+        option.departure_at = departure
+        option.arrival_at = arrival
+        batch.append(option)
+        if len(batch) >= 2000:
+            TravelOption.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        TravelOption.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_traveloption_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traveloption',
+            name='arrival_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='departure_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='traveloption',
+            name='duration_minutes',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_schedule_fields, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='traveloption',
+            name='arrival_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='traveloption',
+            name='departure_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='traveloption',
+            name='duration_minutes',
+            field=models.IntegerField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['duration_minutes'], name='bookings_tr_duratio_5ab5aa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['departure_at'], name='bookings_tr_departu_b64f97_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:29
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q, Sum
+
+
+def backfill_fare_calendar(apps, schema_editor):
+    TravelOption = apps.get_model('bookings', 'TravelOption')
+    FareCalendarDay = apps.get_model('bookings', 'FareCalendarDay')
+    rows = (TravelOption.objects.filter(status='active')
+            .order_by()
+            .values('source_key', 'destination_key', 'departure_date', 'travel_type')
+            .annotate(
+                cheapest=Min('price', filter=Q(available_seats__gt=0)),
+                seats=Sum('available_seats'),
+                count=Count('id'),
+            ))
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(FareCalendarDay(
+            source_key=row['source_key'],
+            destination_key=row['destination_key'],
+            departure_date=row['departure_date'],
+            travel_type=row['travel_type'],
+            min_price=row['cheapest'],
+            available_seats=row['seats'],
+            options=row['count'],
+        ))
+        if len(batch) >= 2000:
+            FareCalendarDay.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        FareCalendarDay.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_traveloption_schedule_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FareCalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_key', models.CharField(max_length=100)),
+                ('destination_key', models.CharField(max_length=100)),
+                ('departure_date', models.DateField()),
+                ('travel_type', models.CharField(choices=[('flight', 'Flight'), ('train', 'Train'), ('bus', 'Bus')], max_length=10)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('available_seats', models.PositiveIntegerField()),
+                ('options', models.PositiveIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source_key', 'destination_key', 'departure_date', 'travel_type'), name='fare_calendar_cell_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_fare_calendar, migrations.RunPython.noop),
+    ]
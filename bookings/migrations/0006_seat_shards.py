@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_fare_calendar_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traveloption',
+            name='seat_shards',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SeatShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('available_seats', models.PositiveIntegerField()),
+                ('travel_option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_shard_set', to='bookings.traveloption')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('travel_option', 'shard'), name='seat_shard_uniq')],
+            },
+        ),
+    ]
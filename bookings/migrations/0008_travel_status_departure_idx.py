@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_group_booking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='traveloption',
+            index=models.Index(fields=['status', 'departure_at'], name='travel_status_departure_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_travel_status_departure_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTravelOption',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('travel_id', models.CharField(max_length=20, unique=True)),
+                ('travel_type', models.CharField(choices=[('flight', 'Flight'), ('train', 'Train'), ('bus', 'Bus')], max_length=10)),
+                ('source', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('departure_date', models.DateField()),
+                ('departure_time', models.TimeField()),
+                ('arrival_date', models.DateField()),
+                ('arrival_time', models.TimeField()),
+                ('departure_at', models.DateTimeField()),
+                ('arrival_at', models.DateTimeField()),
+                ('duration_minutes', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('available_seats', models.PositiveIntegerField()),
+                ('total_seats', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('active', 'Active'), ('cancelled', 'Cancelled'), ('completed', 'Completed')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['departure_date', 'departure_time'],
+                'indexes': [models.Index(fields=['departure_at'], name='bookings_ar_departu_60c768_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('booking_id', models.CharField(max_length=20, unique=True)),
+                ('group_id', models.CharField(blank=True, max_length=20)),
+                ('number_of_seats', models.PositiveIntegerField()),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('pending', 'Pending')], max_length=10)),
+                ('booking_date', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('hold_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('passenger_name', models.CharField(max_length=100)),
+                ('passenger_email', models.EmailField(max_length=254)),
+                ('passenger_phone', models.CharField(max_length=15)),
+                ('passengers', models.JSONField(blank=True, default=list)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+                ('travel_option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='bookings.archivedtraveloption')),
+            ],
+            options={
+                'ordering': ['-booking_date'],
+                'indexes': [models.Index(fields=['user', 'booking_date'], name='bookings_ar_user_id_7ff085_idx')],
+            },
+        ),
+    ]
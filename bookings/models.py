@@ -1,7 +1,36 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from datetime import datetime, timedelta
+from .ids import new_booking_id
+
+class TravelOptionQuerySet(models.QuerySet):
+    # Stored fields recomputed by TravelOption.sync_derived_fields(), by the
+    # field they are derived from
+    DERIVED_FIELDS = {
+        'source': ['source_key'],
+        'destination': ['destination_key'],
+        'departure_date': ['departure_at', 'duration_minutes'],
+        'departure_time': ['departure_at', 'duration_minutes'],
+        'arrival_date': ['arrival_at', 'duration_minutes'],
+        'arrival_time': ['arrival_at', 'duration_minutes'],
+    }
+    
+    def update(self, **kwargs):
+        """Refuse updates that would leave the stored search keys or schedule stale.
+        
+        update() and bulk_update() skip save(), so changing a route or schedule
+        field must also write the values sync_derived_fields() computes for it.
+        """
+        changed = sorted(self.DERIVED_FIELDS.keys() & kwargs.keys())
+        stale = sorted({derived for field in changed for derived in self.DERIVED_FIELDS[field]} - kwargs.keys())
+        if stale:
+            raise ValueError(f"Updating {', '.join(changed)} also requires {', '.join(stale)}; "
+                             "save() the travel options or call sync_derived_fields() first.")
+        return super().update(**kwargs)
+
 
 class TravelOption(models.Model):
     TRAVEL_TYPES = [
@@ -16,39 +45,152 @@ class TravelOption(models.Model):
         ('completed', 'Completed'),
     ]
     
+    # Fields whose stored values bookings.signals compares on save: the
+    # route (city index, search cache) and the fare calendar cell
+    TRACKED_FIELDS = ('source', 'destination', 'source_key', 'destination_key', 'departure_date', 'travel_type')
+    
     travel_id = models.CharField(max_length=20, unique=True)
     travel_type = models.CharField(max_length=10, choices=TRAVEL_TYPES)
     source = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    # Normalized city names used by the indexed search (see bookings.search)
+    source_key = models.CharField(max_length=100, editable=False, default='')
+    destination_key = models.CharField(max_length=100, editable=False, default='')
     departure_date = models.DateField()
     departure_time = models.TimeField()
     arrival_date = models.DateField()
     arrival_time = models.TimeField()
+    # Stored copies of the date/time fields so trips can be filtered and
+    # sorted by time and duration in SQL
+    departure_at = models.DateTimeField(editable=False)
+    arrival_at = models.DateTimeField(editable=False)
+    duration_minutes = models.IntegerField(editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     available_seats = models.PositiveIntegerField()
     total_seats = models.PositiveIntegerField()
+    # Number of SeatShard counters holding the inventory; 0 keeps it in
+    # available_seats (see bookings.reservations)
+    seat_shards = models.PositiveSmallIntegerField(default=0, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TravelOptionQuerySet.as_manager()
+    
     class Meta:
         ordering = ['departure_date', 'departure_time']
         indexes = [
-            models.Index(fields=['source', 'destination', 'departure_date']),
+            models.Index(fields=['source_key', 'destination_key', 'departure_date'], name='travel_route_key_idx'),
+            models.Index(fields=['destination_key', 'departure_date'], name='travel_dest_key_idx'),
             models.Index(fields=['travel_type']),
+            models.Index(fields=['duration_minutes']),
+            models.Index(fields=['departure_at']),
+            models.Index(fields=['status', 'departure_at'], name='travel_status_departure_idx'),
         ]
     
     def __str__(self):
         return f"{self.travel_id} - {self.source} to {self.destination}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+    
+    def save(self, *args, **kwargs):
+        self.sync_derived_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Write the recomputed values along with the fields they derive from
+            derived = TravelOptionQuerySet.DERIVED_FIELDS
+            extra = {name for field in update_fields for name in derived.get(field, [])}
+            kwargs['update_fields'] = [*update_fields, *sorted(extra.difference(update_fields))]
+        super().save(*args, **kwargs)
+    
+    def sync_derived_fields(self):
+        """Recompute stored values derived from other fields.
+        
+        save() calls this automatically; call it yourself before bulk_create()
+        or bulk_update(). QuerySet.update() refuses to change the fields these
+        are derived from on their own.
+        """
+        from .search import normalize_city
+        self.source_key = normalize_city(self.source)
+        self.destination_key = normalize_city(self.destination)
+        
+        departure = self._combine('departure_date', 'departure_time')
+        arrival = self._combine('arrival_date', 'arrival_time')
+        self.duration_minutes = int((arrival - departure).total_seconds() // 60)
+        if settings.USE_TZ:
+            departure = timezone.make_aware(departure, timezone.get_default_timezone())
+            arrival = timezone.make_aware(arrival, timezone.get_default_timezone())
+        self.departure_at = departure
+        self.arrival_at = arrival
+    
+    def _combine(self, date_field, time_field):
+        # Values may still be strings when assigned directly before save()
+        day = self._meta.get_field(date_field).to_python(getattr(self, date_field))
+        moment = self._meta.get_field(time_field).to_python(getattr(self, time_field))
+        return datetime.combine(day, moment)
+    
     def is_available(self):
         return self.available_seats > 0 and self.status == 'active'
     
     def get_duration(self):
-        departure_datetime = timezone.datetime.combine(self.departure_date, self.departure_time)
-        arrival_datetime = timezone.datetime.combine(self.arrival_date, self.arrival_time)
-        duration = arrival_datetime - departure_datetime
-        return duration
+        if self.duration_minutes is None:
+            # Not saved yet, so sync_derived_fields() has not run
+            return self._combine('arrival_date', 'arrival_time') - self._combine('departure_date', 'departure_time')
+        return timedelta(minutes=self.duration_minutes)
+
+
+class SeatShard(models.Model):
+    """One of the counters a striped travel option's free seats are split across.
+    
+    Concurrent bookings update different shard rows instead of all queuing
+    for the travel option's row; available_seats on the travel option is the
+    sum of its shards, refreshed after each change.
+    """
+    travel_option = models.ForeignKey(TravelOption, on_delete=models.CASCADE, related_name='seat_shard_set')
+    shard = models.PositiveSmallIntegerField()
+    available_seats = models.PositiveIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['travel_option', 'shard'], name='seat_shard_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.travel_option_id} shard {self.shard}: {self.available_seats} seats"
+
+
+class FareCalendarDay(models.Model):
+    """Rollup of the active travel options on one route, day and travel type.
+    
+    Maintained by bookings.fares whenever a travel option's price, status,
+    seats or schedule change, so the fare calendar reads one row per day
+    instead of aggregating every option on the route.
+    """
+    source_key = models.CharField(max_length=100)
+    destination_key = models.CharField(max_length=100)
+    departure_date = models.DateField()
+    travel_type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    # Cheapest option that still has seats; null when the day is sold out
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    available_seats = models.PositiveIntegerField()
+    options = models.PositiveIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source_key', 'destination_key', 'departure_date', 'travel_type'],
+                name='fare_calendar_cell_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.source_key} to {self.destination_key} on {self.departure_date} ({self.travel_type})"
 
 
 class Booking(models.Model):
@@ -66,6 +208,10 @@ class Booking(models.Model):
     status = models.CharField(max_length=10, choices=BOOKING_STATUS, default='confirmed')
     booking_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    # Shared by the per-leg bookings of a group booking (see
+    # reservations.create_group_booking); blank for single bookings
+    group_id = models.CharField(max_length=20, blank=True, db_index=True)
     
     # Passenger details
     passenger_name = models.CharField(max_length=100)
@@ -77,6 +223,7 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['booking_date']),
+            models.Index(fields=['status', 'hold_expires_at']),
         ]
     
     def __str__(self):
@@ -84,9 +231,7 @@ class Booking(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.booking_id:
-            # Generate unique booking ID
-            import uuid
-            self.booking_id = f"BK{str(uuid.uuid4())[:8].upper()}"
+            self.booking_id = new_booking_id()
         
         if not self.total_price:
             self.total_price = self.travel_option.price * self.number_of_seats
@@ -94,9 +239,102 @@ class Booking(models.Model):
         super().save(*args, **kwargs)
     
     def can_cancel(self):
-        # Can cancel if booking is confirmed and travel date is in future
-        return (self.status == 'confirmed' and 
+        # Can cancel if booking is confirmed or held and travel date is in future
+        return (self.status in ('confirmed', 'pending') and 
                 self.travel_option.departure_date > timezone.now().date())
+    
+    def is_hold_active(self):
+        return (self.status == 'pending' and self.hold_expires_at is not None and
+                self.hold_expires_at > timezone.now())
+
+
+class Passenger(models.Model):
+    """One traveller on a group booking; passenger_name on the booking is the lead"""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='passengers')
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+    phone = models.CharField(max_length=15)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.name} on {self.booking_id}"
+
+
+class ArchivedTravelOption(models.Model):
+    """Departed TravelOption moved out of the hot table by bookings.archive.
+    
+    Keeps the primary key and columns of the original row, minus the search
+    and inventory bookkeeping, so archived bookings render like live ones.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    travel_id = models.CharField(max_length=20, unique=True)
+    travel_type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    source = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    departure_date = models.DateField()
+    departure_time = models.TimeField()
+    arrival_date = models.DateField()
+    arrival_time = models.TimeField()
+    departure_at = models.DateTimeField()
+    arrival_at = models.DateTimeField()
+    duration_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_seats = models.PositiveIntegerField()
+    total_seats = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=TravelOption.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['departure_date', 'departure_time']
+        indexes = [
+            models.Index(fields=['departure_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.travel_id} - {self.source} to {self.destination} (archived)"
+    
+    def get_duration(self):
+        return timedelta(minutes=self.duration_minutes)
+
+
+class ArchivedBooking(models.Model):
+    """Booking on an archived travel option; read-only history"""
+    id = models.BigIntegerField(primary_key=True)
+    booking_id = models.CharField(max_length=20, unique=True)
+    group_id = models.CharField(max_length=20, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    travel_option = models.ForeignKey(ArchivedTravelOption, on_delete=models.CASCADE, related_name='bookings')
+    number_of_seats = models.PositiveIntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=10, choices=Booking.BOOKING_STATUS)
+    booking_date = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    passenger_name = models.CharField(max_length=100)
+    passenger_email = models.EmailField()
+    passenger_phone = models.CharField(max_length=15)
+    # Passenger rows of a group booking, as {name, email, phone} objects
+    passengers = models.JSONField(default=list, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-booking_date']
+        indexes = [
+            models.Index(fields=['user', 'booking_date']),
+        ]
+    
+    def __str__(self):
+        return f"Booking {self.booking_id} - {self.user_id} (archived)"
+    
+    def can_cancel(self):
+        return False
+    
+    def is_hold_active(self):
+        return False
 
 
 class UserProfile(models.Model):
@@ -0,0 +1,224 @@
+import base64
+import hashlib
+import json
+from datetime import date, time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Seek keys, each ending in id as the tie-breaker. KEYSET_ORDERING matches
+# TravelOption.Meta.ordering; DURATION_ORDERING lists the shortest trips first.
+KEYSET_ORDERING = ('departure_date', 'departure_time', 'id')
+DURATION_ORDERING = ('duration_minutes', 'departure_date', 'departure_time', 'id')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination token cannot be decoded"""
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _field(name):
+    from .models import TravelOption
+    return TravelOption._meta.get_field(name)
+
+
+def encode_cursor(option, direction, ordering=KEYSET_ORDERING):
+    """Build an opaque token pointing after ('n') or before ('p') an option"""
+    payload = [direction]
+    for name in ordering:
+        value = getattr(option, name)
+        payload.append(value.isoformat() if isinstance(value, (date, time)) else value)
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, ordering=KEYSET_ORDERING):
+    """Return (direction, *values of the ordering fields) for a token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, *values = json.loads(raw)
+        if direction not in ('n', 'p') or len(values) != len(ordering):
+            raise ValueError(direction)
+        return (direction, *(
+            _field(name).to_python(value) for name, value in zip(ordering, values)
+        ))
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise InvalidCursor(token) from exc
+
+
+def _seek(queryset, ordering, key, forward):
+    """Filter to rows strictly after (or before) key in ordering"""
+    op = 'gt' if forward else 'lt'
+    condition = Q()
+    for i, name in enumerate(ordering):
+        equal = dict(zip(ordering[:i], key[:i]))
+        condition |= Q(**equal, **{f'{name}__{op}': key[i]})
+    # The redundant bound on the leading column lets the database use an index range scan
+    return queryset.filter(**{f'{ordering[0]}__{op}e': key[0]}).filter(condition)
+
+
+def paginate(queryset, cursor=None, per_page=10, ordering=KEYSET_ORDERING):
+    """Return a KeysetPage of travel options after or before the cursor.
+
+    Each page is a single indexed range query that fetches one extra row to
+    detect whether another page exists, so there is no COUNT(*) and no OFFSET
+    and deep pages cost the same as the first one. An invalid cursor yields
+    the first page.
+    """
+    queryset, direction = _page_query(queryset, cursor, per_page, ordering)
+    return _build_page(list(queryset), direction, per_page, ordering)
+
+
+async def apaginate(queryset, cursor=None, per_page=10, ordering=KEYSET_ORDERING):
+    """Async version of paginate()"""
+    queryset, direction = _page_query(queryset, cursor, per_page, ordering)
+    return _build_page([row async for row in queryset], direction, per_page, ordering)
+
+
+def _page_query(queryset, cursor, per_page, ordering):
+    try:
+        direction, *key = decode_cursor(cursor, ordering) if cursor else (None,)
+    except InvalidCursor:
+        direction, key = None, None
+
+    order_by = ordering
+    if direction == 'p':
+        order_by = tuple(f'-{field}' for field in ordering)
+        queryset = _seek(queryset, ordering, key, forward=False)
+    elif direction == 'n':
+        queryset = _seek(queryset, ordering, key, forward=True)
+    return queryset.order_by(*order_by)[:per_page + 1], direction
+
+
+def _build_page(rows, direction, per_page, ordering):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'p':
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, direction == 'n'
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], 'n', ordering) if rows and has_next else None,
+        previous_cursor=encode_cursor(rows[0], 'p', ordering) if rows and has_previous else None,
+    )
+
+
+def approximate_count(queryset):
+    """Return a cached row count for a queryset.
+
+    The count is shared by every request running the same query and
+    recomputed at most once per KEYSET_COUNT_CACHE_SECONDS, so it may lag
+    recent writes slightly.
+    """
+    key = _count_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, getattr(settings, 'KEYSET_COUNT_CACHE_SECONDS', 60))
+    return count
+
+
+async def aapproximate_count(queryset):
+    """Async version of approximate_count()"""
+    # Compiling SQL may consult the connection, which is sync-only
+    key = await sync_to_async(_count_key)(queryset)
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.order_by().acount()
+        await cache.aset(key, count, getattr(settings, 'KEYSET_COUNT_CACHE_SECONDS', 60))
+    return count
+
+
+def _count_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params!r}'.encode(), usedforsecurity=False).hexdigest()
+    return f'keyset-count:{digest}'
+
+
+# Below this many rows an exact count is cheap and table statistics are the
+# most likely to be stale, so EstimatedCountPaginator counts instead
+ESTIMATE_MIN_ROWS = 10_000
+
+ROW_ESTIMATE_SQL = {
+    # First number of the stat column: rows in the table (or index)
+    'sqlite': "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s ORDER BY idx IS NOT NULL LIMIT 1",
+    'mysql': ("SELECT table_rows FROM information_schema.tables "
+              "WHERE table_schema = DATABASE() AND table_name = %s"),
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+}
+
+
+def estimated_row_count(model, using='default'):
+    """Row count of a model's table from the planner's statistics, or None.
+
+    SQLite only has statistics after ANALYZE; the numbers lag writes until
+    the next ANALYZE (or autovacuum/auto-statistics on the other backends).
+    """
+    connection = connections[using]
+    sql = ROW_ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # No sqlite_stat1 before the first ANALYZE
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists over tables too big to COUNT(*).
+
+    An unfiltered list takes its size from the table statistics; a filtered
+    or searched list shares a cached count through approximate_count(). The
+    admin then shows page links for an approximate total. Pair it with
+    show_full_result_count = False, which skips the admin's own exact count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_MIN_ROWS:
+                return estimate
+        return approximate_count(queryset)
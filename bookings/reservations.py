@@ -0,0 +1,429 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+from datetime import timedelta
+import random
+from .models import TravelOption, Booking, Passenger, SeatShard
+from .connections import connection_graph
+from .fares import fare_cell, fare_cells_for_options, refresh_fare_cells, refresh_fare_cells_on_commit
+from .ids import new_booking_id, new_group_id
+from .search_cache import invalidate_routes, invalidate_travel_options
+
+
+class SeatsUnavailable(Exception):
+    """Raised when a travel option cannot cover the requested seats"""
+
+
+def reserve_seats(travel_option, seats):
+    """Atomically take seats from a travel option.
+
+    The capacity check and the decrement happen in a single conditional
+    UPDATE, so concurrent buyers can never drive available_seats below zero.
+    Striped travel options take the seats from one of their shards instead.
+    """
+    if travel_option.seat_shards:
+        return _reserve_striped(travel_option, seats)
+
+    updated = TravelOption.objects.filter(
+        pk=travel_option.pk,
+        status='active',
+        available_seats__gte=seats,
+        seat_shards=0,
+    ).update(
+        available_seats=F('available_seats') - seats,
+        updated_at=timezone.now(),
+    )
+
+    if not updated:
+        if _restriped(travel_option):
+            return _reserve_striped(travel_option, seats)
+        raise SeatsUnavailable('Not enough seats available.')
+
+    invalidate_routes([(travel_option.source_key, travel_option.destination_key)])
+    refresh_fare_cells_on_commit([fare_cell(travel_option)])
+    travel_option.refresh_from_db(fields=['available_seats', 'updated_at'])
+    connection_graph.set_seats(travel_option.pk, travel_option.available_seats)
+    return travel_option
+
+
+def release_seats(travel_option, seats):
+    """Atomically give seats back to a travel option.
+
+    Free seats never exceed total_seats, so a release repeated by a retried
+    cancel, or racing the hold sweeper, cannot create seats.
+    """
+    if travel_option.seat_shards:
+        return _release_striped(travel_option, seats)
+
+    updated = TravelOption.objects.filter(pk=travel_option.pk, seat_shards=0).update(
+        available_seats=Least(F('available_seats') + seats, F('total_seats')),
+        updated_at=timezone.now(),
+    )
+    if not updated and _restriped(travel_option):
+        return _release_striped(travel_option, seats)
+    invalidate_routes([(travel_option.source_key, travel_option.destination_key)])
+    refresh_fare_cells_on_commit([fare_cell(travel_option)])
+    travel_option.refresh_from_db(fields=['available_seats', 'updated_at'])
+    connection_graph.set_seats(travel_option.pk, travel_option.available_seats)
+    return travel_option
+
+
+def _restriped(travel_option):
+    """Re-read seat_shards for an instance loaded before stripe_seats() ran;
+    returns True if the travel option is striped now"""
+    travel_option.seat_shards = (TravelOption.objects.filter(pk=travel_option.pk)
+                                 .values_list('seat_shards', flat=True).first() or 0)
+    return travel_option.seat_shards > 0
+
+
+def _reserve_striped(travel_option, seats):
+    # Unlike the single-row UPDATE this does not re-check the status, which
+    # the caller has read from the travel option; cancelling a departure is
+    # rare enough that the race is accepted to keep the option row out of
+    # the booking transaction
+    if travel_option.status != 'active':
+        raise SeatsUnavailable('Not enough seats available.')
+
+    shards = SeatShard.objects.filter(travel_option_id=travel_option.pk)
+    # Buyers start on a random shard so they do not queue on the same row.
+    # Writing before reading also keeps SQLite from having to upgrade a read
+    # lock, which fails instead of waiting when another writer is active.
+    first = random.randrange(travel_option.seat_shards)
+    taken = shards.filter(shard=first, available_seats__gte=seats).update(
+        available_seats=F('available_seats') - seats)
+    if not taken:
+        candidates = list(shards.filter(available_seats__gte=seats).exclude(shard=first)
+                          .values_list('shard', flat=True))
+        random.shuffle(candidates)
+        for shard in candidates:
+            if shards.filter(shard=shard, available_seats__gte=seats).update(
+                    available_seats=F('available_seats') - seats):
+                break
+        else:
+            # No single shard can cover the request, or others took the
+            # seats first: pool the remaining seats and take them from the total
+            _rebalance(travel_option.pk, take=seats)
+
+    _after_striped_change(travel_option)
+    return travel_option
+
+
+def _release_striped(travel_option, seats):
+    SeatShard.objects.filter(
+        travel_option_id=travel_option.pk,
+        shard=random.randrange(travel_option.seat_shards),
+    ).update(available_seats=F('available_seats') + seats)
+    _cap_shards(travel_option.pk, travel_option.total_seats)
+    _after_striped_change(travel_option)
+    return travel_option
+
+
+def _cap_shards(pk, capacity):
+    # Each shard may stay under the capacity while their sum exceeds it
+    total = SeatShard.objects.filter(travel_option_id=pk).aggregate(total=Sum('available_seats'))['total']
+    if total is not None and total > capacity:
+        _rebalance(pk, capacity=capacity)
+
+
+def _after_striped_change(travel_option):
+    counts = list(SeatShard.objects.filter(travel_option_id=travel_option.pk)
+                  .values_list('available_seats', flat=True))
+    travel_option.available_seats = sum(counts)
+    # Updating the travel option's row inside the booking transaction would
+    # hold its lock until commit and serialize buyers again. Both follow-ups
+    # are best effort: the next change to the departure repeats them.
+    transaction.on_commit(lambda: sync_striped_seats(travel_option.pk), robust=True)
+    if 0 in counts and sum(counts) >= len(counts):
+        # A shard ran dry while others have seats; spread them out again
+        # before buyers starting on the empty shard have to search
+        transaction.on_commit(lambda: rebalance_seat_shards(travel_option.pk), robust=True)
+
+
+def _rebalance(pk, take=0, capacity=None):
+    """Lock every shard of a travel option, take `take` seats from their total
+    (and any above `capacity`) and spread the rest evenly. Raises
+    SeatsUnavailable if the total is short.
+    """
+    with transaction.atomic():
+        rows = list(SeatShard.objects.select_for_update().filter(travel_option_id=pk).order_by('shard'))
+        remaining = sum(row.available_seats for row in rows) - take
+        if remaining < 0:
+            raise SeatsUnavailable('Not enough seats available.')
+        if capacity is not None:
+            remaining = min(remaining, capacity)
+        for row in rows:
+            row.available_seats = remaining // len(rows) + (1 if row.shard < remaining % len(rows) else 0)
+        SeatShard.objects.bulk_update(rows, ['available_seats'])
+
+
+def rebalance_seat_shards(pk, capacity=None):
+    """Spread a striped travel option's free seats evenly across its shards,
+    first dropping any above `capacity`"""
+    _rebalance(pk, capacity=capacity)
+
+
+def sync_striped_seats(pk):
+    """Store the sum of a striped travel option's shards in available_seats"""
+    total = SeatShard.objects.filter(travel_option_id=OuterRef('pk')).values('travel_option_id').annotate(
+        total=Sum('available_seats')).values('total')
+    TravelOption.objects.filter(pk=pk, seat_shards__gt=0).update(
+        available_seats=Coalesce(Subquery(total), 0),
+        updated_at=timezone.now(),
+    )
+    travel_option = TravelOption.objects.only(
+        'source_key', 'destination_key', 'departure_date', 'travel_type', 'available_seats',
+    ).get(pk=pk)
+    invalidate_routes([(travel_option.source_key, travel_option.destination_key)])
+    refresh_fare_cells([fare_cell(travel_option)])
+    connection_graph.set_seats(pk, travel_option.available_seats)
+
+
+def stripe_seats(travel_option, shards):
+    """Split a travel option's free seats across `shards` counters.
+
+    Use for departures that sell fast enough for buyers to queue on the
+    travel option's row. Passing 0 folds the shards back into available_seats.
+    """
+    with transaction.atomic():
+        locked = TravelOption.objects.select_for_update().get(pk=travel_option.pk)
+        existing = SeatShard.objects.filter(travel_option=locked)
+        seats = existing.aggregate(total=Sum('available_seats'))['total'] if locked.seat_shards else None
+        if seats is None:
+            seats = locked.available_seats
+        existing.delete()
+        SeatShard.objects.bulk_create([
+            SeatShard(travel_option=locked, shard=shard,
+                      available_seats=seats // shards + (1 if shard < seats % shards else 0))
+            for shard in range(shards)
+        ])
+        TravelOption.objects.filter(pk=locked.pk).update(
+            seat_shards=shards, available_seats=seats, updated_at=timezone.now(),
+        )
+    travel_option.seat_shards = shards
+    travel_option.available_seats = seats
+    return travel_option
+
+
+def create_booking(booking, travel_option):
+    """Reserve seats and save the booking in one transaction"""
+    with transaction.atomic():
+        reserve_seats(travel_option, booking.number_of_seats)
+        booking.travel_option = travel_option
+        booking.total_price = booking.number_of_seats * travel_option.price
+        booking.save()
+    return booking
+
+
+def create_group_booking(user, travel_options, passengers, hold_minutes=None):
+    """Book every passenger on every travel option, all or nothing.
+
+    travel_options are the legs of the trip and passengers a list of unsaved
+    Passenger instances, the first being the lead. Each leg gets one Booking
+    for all passengers, sharing a group_id. Seats on all non-striped legs are
+    taken in a single conditional UPDATE, and bookings and passengers are
+    bulk inserted, so the cost does not grow with the number of passengers.
+    Raises SeatsUnavailable, rolling everything back, if any leg is short.
+    Pass hold_minutes to place pending holds instead of confirmed bookings.
+    """
+    seats = len(passengers)
+    if not seats or not travel_options:
+        raise ValueError('A group booking needs at least one passenger and one travel option.')
+    if len({option.pk for option in travel_options}) != len(travel_options):
+        raise ValueError('Each travel option can only appear once in a group booking.')
+
+    lead = passengers[0]
+    group_id = new_group_id()
+    now = timezone.now()
+
+    with transaction.atomic():
+        # The legs may have been loaded before stripe_seats() ran on them
+        shards = dict(TravelOption.objects.filter(pk__in=[option.pk for option in travel_options])
+                      .values_list('pk', 'seat_shards'))
+        for option in travel_options:
+            option.seat_shards = shards.get(option.pk, 0)
+        plain = [option for option in travel_options if not option.seat_shards]
+        if plain:
+            # One statement locks all legs in index order, so two groups
+            # sharing legs cannot deadlock on each other
+            updated = TravelOption.objects.filter(
+                pk__in=[option.pk for option in plain],
+                status='active',
+                available_seats__gte=seats,
+                seat_shards=0,
+            ).update(
+                available_seats=F('available_seats') - seats,
+                updated_at=now,
+            )
+            if updated != len(plain):
+                raise SeatsUnavailable('Not enough seats available on every leg.')
+
+            invalidate_routes([(option.source_key, option.destination_key) for option in plain])
+            refresh_fare_cells_on_commit([fare_cell(option) for option in plain])
+            remaining = dict(TravelOption.objects.filter(pk__in=[option.pk for option in plain])
+                             .values_list('pk', 'available_seats'))
+            for option in plain:
+                option.available_seats = remaining[option.pk]
+                connection_graph.set_seats(option.pk, option.available_seats)
+        for option in travel_options:
+            if option.seat_shards:
+                _reserve_striped(option, seats)
+
+        bookings = [
+            Booking(
+                booking_id=new_booking_id(),
+                group_id=group_id,
+                user=user,
+                travel_option=option,
+                number_of_seats=seats,
+                total_price=option.price * seats,
+                status='pending' if hold_minutes is not None else 'confirmed',
+                hold_expires_at=now + timedelta(minutes=hold_minutes) if hold_minutes is not None else None,
+                passenger_name=lead.name,
+                passenger_email=lead.email,
+                passenger_phone=lead.phone,
+            )
+            for option in travel_options
+        ]
+        Booking.objects.bulk_create(bookings)
+        if bookings[0].pk is None:
+            # Backends that cannot return ids from a bulk insert (MySQL)
+            pks = dict(Booking.objects.filter(group_id=group_id).values_list('booking_id', 'pk'))
+            for booking in bookings:
+                booking.pk = pks[booking.booking_id]
+
+        Passenger.objects.bulk_create([
+            Passenger(booking=booking, name=passenger.name, email=passenger.email, phone=passenger.phone)
+            for booking in bookings
+            for passenger in passengers
+        ])
+    return bookings
+
+
+def cancel_booking(booking):
+    """Cancel a confirmed or held booking and restore its seats in one transaction.
+
+    Returns False if the booking was already cancelled by a concurrent request
+    or released by the hold sweeper, in which case no seats are restored.
+    """
+    with transaction.atomic():
+        updated = Booking.objects.filter(
+            pk=booking.pk,
+            status__in=['confirmed', 'pending'],
+        ).update(status='cancelled', hold_expires_at=None, updated_at=timezone.now())
+        if not updated:
+            return False
+        release_seats(booking.travel_option, booking.number_of_seats)
+
+    booking.refresh_from_db(fields=['status', 'hold_expires_at', 'updated_at'])
+    return True
+
+
+def hold_seats(booking, travel_option, minutes=None):
+    """Reserve seats for a pending booking that expires unless confirmed"""
+    if minutes is None:
+        minutes = settings.BOOKING_HOLD_MINUTES
+
+    with transaction.atomic():
+        reserve_seats(travel_option, booking.number_of_seats)
+        booking.travel_option = travel_option
+        booking.total_price = booking.number_of_seats * travel_option.price
+        booking.status = 'pending'
+        booking.hold_expires_at = timezone.now() + timedelta(minutes=minutes)
+        booking.save()
+    return booking
+
+
+def confirm_hold(booking):
+    """Turn an unexpired hold into a confirmed booking.
+
+    The seats were taken when the hold was placed, so confirming is a single
+    conditional UPDATE on the booking row. Returns False if the hold expired
+    or its travel option is no longer active.
+    """
+    updated = Booking.objects.filter(
+        pk=booking.pk,
+        status='pending',
+        hold_expires_at__gt=timezone.now(),
+        travel_option__status='active',
+    ).update(status='confirmed', hold_expires_at=None, updated_at=timezone.now())
+
+    booking.refresh_from_db(fields=['status', 'hold_expires_at', 'updated_at'])
+    return bool(updated)
+
+
+def release_expired_holds(now=None, batch_size=500):
+    """Cancel expired holds in bulk and return their seats to inventory.
+
+    Candidates are found through the (status, hold_expires_at) index. Each
+    batch locks the holds that are still expired, then cancels and returns
+    the seats of exactly those rows, so a hold confirmed or cancelled in the
+    meantime is never released twice. Returns the number of holds released.
+    """
+    if now is None:
+        now = timezone.now()
+
+    released = 0
+    while True:
+        expired_ids = list(
+            Booking.objects.filter(
+                status='pending',
+                hold_expires_at__lte=now,
+            ).order_by('hold_expires_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not expired_ids:
+            break
+
+        with transaction.atomic():
+            locked = lock_bookings(expired_ids, status='pending', hold_expires_at__lte=now)
+            released += cancel_locked(locked)
+
+    return released
+
+
+def lock_bookings(pks, **conditions):
+    """Lock the bookings among `pks` that still match `conditions` and
+    return their primary keys. Call inside a transaction.
+    """
+    return list(Booking.objects.select_for_update().filter(pk__in=pks, **conditions)
+                .order_by('pk').values_list('pk', flat=True))
+
+
+def cancel_locked(pks):
+    """Cancel bookings locked by lock_bookings() and return their seats.
+    Returns the number cancelled.
+    """
+    if not pks:
+        return 0
+    stamp = timezone.now()
+    count = Booking.objects.filter(pk__in=pks).update(
+        status='cancelled', hold_expires_at=None, updated_at=stamp)
+    return_seats(Booking.objects.filter(pk__in=pks), stamp)
+    return count
+
+
+def return_seats(bookings, stamp):
+    """Give the seats of just-cancelled bookings back to their travel options,
+    with one UPDATE per travel option. Call inside the cancelling transaction,
+    with exactly the bookings it cancelled.
+    """
+    seats_by_option = list(bookings.values(
+        'travel_option', 'travel_option__seat_shards', 'travel_option__total_seats',
+    ).annotate(seats=Sum('number_of_seats')).order_by())
+
+    for row in seats_by_option:
+        if row['travel_option__seat_shards']:
+            SeatShard.objects.filter(
+                travel_option_id=row['travel_option'],
+                shard=random.randrange(row['travel_option__seat_shards']),
+            ).update(available_seats=F('available_seats') + row['seats'])
+            _cap_shards(row['travel_option'], row['travel_option__total_seats'])
+            transaction.on_commit(lambda pk=row['travel_option']: sync_striped_seats(pk), robust=True)
+            continue
+        TravelOption.objects.filter(pk=row['travel_option']).update(
+            available_seats=Least(F('available_seats') + row['seats'], F('total_seats')),
+            updated_at=stamp,
+        )
+    invalidate_travel_options(row['travel_option'] for row in seats_by_option)
+    refresh_fare_cells_on_commit(fare_cells_for_options(row['travel_option'] for row in seats_by_option))
@@ -0,0 +1,68 @@
+from django.db.models import Q
+from .models import TravelOption
+
+# Typed text matching more city keys than this (one or two letters, usually)
+# is filtered with the substring match itself rather than an IN list
+MAX_CITY_KEYS = 50
+
+
+def normalize_city(value):
+    """Normalize a city name to its search key: case-folded, single-spaced"""
+    return ' '.join((value or '').split()).casefold()
+
+
+def city_filter(text, field='source_key'):
+    """Q restricting `field` to the city keys that contain typed text.
+
+    A key matches if it contains the text anywhere, as icontains did, so "an"
+    finds both "anchorage" and "los angeles". The match runs over the distinct
+    keys, a scan of the small covering index rather than of the table, and up
+    to MAX_CITY_KEYS matches become an IN list; text matching more filters on
+    the key column directly so the query never grows an unbounded IN list.
+    Returns None for blank input.
+    """
+    key = normalize_city(text)
+    if not key:
+        return None
+    return _city_q(key, field, list(_city_key_query(key, field)[:MAX_CITY_KEYS + 1]))
+
+
+async def acity_filter(text, field='source_key'):
+    """Async version of city_filter()"""
+    key = normalize_city(text)
+    if not key:
+        return None
+    return _city_q(key, field, [match async for match in _city_key_query(key, field)[:MAX_CITY_KEYS + 1]])
+
+
+def _city_key_query(key, field):
+    keys = TravelOption.objects.order_by().values_list(field, flat=True).distinct()
+    return keys.filter(**{f'{field}__contains': key})
+
+
+def _city_q(key, field, keys):
+    if len(keys) > MAX_CITY_KEYS:
+        return Q(**{f'{field}__contains': key})
+    return Q(**{f'{field}__in': keys})
+
+
+def filter_route(queryset, source=None, destination=None):
+    """Restrict a TravelOption queryset to the cities matching typed text.
+
+    The text is resolved to city keys first, so the final query is usually an
+    IN list over the (source_key, destination_key, departure_date) index.
+    """
+    for text, field in ((source, 'source_key'), (destination, 'destination_key')):
+        match = city_filter(text, field)
+        if match is not None:
+            queryset = queryset.filter(match)
+    return queryset
+
+
+async def afilter_route(queryset, source=None, destination=None):
+    """Async version of filter_route()"""
+    for text, field in ((source, 'source_key'), (destination, 'destination_key')):
+        match = await acity_filter(text, field)
+        if match is not None:
+            queryset = queryset.filter(match)
+    return queryset
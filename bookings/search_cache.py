@@ -0,0 +1,209 @@
+import hashlib
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from travel_booking.db_router import replica_reads_active
+from .cities import city_index
+from .search import normalize_city
+
+VERSION_PREFIX = 'search-version'
+# Bumped whenever a write introduces a city key no process had cached before
+CITIES_KEY = f'{VERSION_PREFIX}:cities'
+STATS_KEYS = ('search-cache:hits', 'search-cache:misses')
+
+
+def _cache():
+    return caches[getattr(settings, 'SEARCH_CACHE_ALIAS', 'default')]
+
+
+def _version_key(kind, city_key):
+    # City names contain spaces and arbitrary unicode, which memcached rejects
+    digest = hashlib.md5(city_key.encode(), usedforsecurity=False).hexdigest()
+    return f'{VERSION_PREFIX}:{kind}:{digest}'
+
+
+def _fresh_version():
+    # Seed missing counters from the clock so a counter that was evicted can
+    # never come back at a value an older cached result was stored under
+    return int(time.time() * 1000)
+
+
+def _version_keys(source, destination):
+    """Version counters a search depends on.
+
+    A search filtered by source can only return options departing from the
+    cities its text matches, so those cities' counters cover it; likewise for
+    destination, and a search filtered by both depends on both sides.
+
+    The matches come from this process's city index, which may not have seen
+    a city another process just added: "san" could match an indexed "san
+    diego" but not a new "santa fe". Every new city bumps CITIES_KEY, and the
+    index reloads when that counter moved since it was loaded, so the new
+    city's counter joins the key set before its rows can be cached without
+    it. Text still matching no city and unfiltered searches depend on the
+    global counter, which every write bumps.
+    """
+    keys = []
+    for kind, text in (('src', source), ('dst', destination)):
+        if not normalize_city(text):
+            continue
+        city_index.sync(_get_versions([CITIES_KEY])[0])
+        matches = city_index.matching_keys(text)
+        if not matches:
+            return [f'{VERSION_PREFIX}:all']
+        keys += [_version_key(kind, key) for key in matches]
+    return keys or [f'{VERSION_PREFIX}:all']
+
+
+def _get_versions(keys):
+    cache = _cache()
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    cache = _cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def _bump_new_cities(city_keys):
+    # cache.add() only succeeds for the first writer of a city key, in any
+    # process; an evicted marker merely costs one extra reload everywhere
+    cache = _cache()
+    if [key for key in city_keys if cache.add(_version_key('city', key), True, None)]:
+        _bump([CITIES_KEY])
+
+
+def invalidate_routes(routes):
+    """Bump the version counters for (source_key, destination_key) routes.
+
+    The bump runs after the surrounding transaction commits so a concurrent
+    search cannot re-cache the pre-commit rows under the new version.
+    """
+    keys = {f'{VERSION_PREFIX}:all'}
+    cities = set()
+    for source_key, destination_key in routes:
+        keys.add(_version_key('src', source_key))
+        keys.add(_version_key('dst', destination_key))
+        cities.update((source_key, destination_key))
+
+    def bump():
+        _bump_new_cities(sorted(cities))
+        _bump(sorted(keys))
+
+    transaction.on_commit(bump)
+
+
+def invalidate_travel_options(pks):
+    """Bump the version counters for the routes of the given travel options"""
+    from .models import TravelOption
+    routes = (TravelOption.objects.filter(pk__in=list(pks))
+              .order_by().values_list('source_key', 'destination_key').distinct())
+    invalidate_routes(list(routes))
+
+
+def cached_search(namespace, params, build):
+    """Return build() for a search, cached per route version.
+
+    params is the normalized search input (typically TravelSearchForm cleaned
+    data plus the pagination cursor). The cache key combines it with today's
+    date and the current version of every route the search can touch, so a
+    change to one route only invalidates searches that could include it.
+    """
+    cache = _cache()
+    versions = _get_versions(_version_keys(params.get('source'), params.get('destination')))
+    key = _search_key(namespace, params, versions)
+
+    result = cache.get(key)
+    if result is None:
+        _count(STATS_KEYS[1])
+        result = build()
+        cache.set(key, result, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 120))
+    else:
+        _count(STATS_KEYS[0])
+    return result
+
+
+async def acached_search(namespace, params, build):
+    """Async version of cached_search(); build is a coroutine function"""
+    cache = _cache()
+    # The city index may need to load itself from the database
+    keys = await sync_to_async(_version_keys)(params.get('source'), params.get('destination'))
+    versions = await cache.aget_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    key = _search_key(namespace, params, [versions[key] for key in keys])
+
+    result = await cache.aget(key)
+    if result is None:
+        await _acount(STATS_KEYS[1])
+        result = await build()
+        await cache.aset(key, result, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 120))
+    else:
+        await _acount(STATS_KEYS[0])
+    return result
+
+
+def _search_key(namespace, params, versions):
+    normalized = {
+        name: normalize_city(value) if name in ('source', 'destination') else value
+        for name, value in params.items()
+        if value not in (None, '')
+    }
+    # A replica that has not caught up with a write yet would store its stale
+    # rows under the version the write bumped to; keep those apart from
+    # results read from the primary
+    payload = json.dumps(
+        [namespace, timezone.now().date(), normalized, versions, replica_reads_active()],
+        sort_keys=True, default=str,
+    )
+    return 'search:' + hashlib.md5(payload.encode(), usedforsecurity=False).hexdigest()
+
+
+def _count(key):
+    cache = _cache()
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def _acount(key):
+    cache = _cache()
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def get_stats():
+    """Return hit/miss counters and the hit rate for the search cache"""
+    values = _cache().get_many(STATS_KEYS)
+    hits = values.get(STATS_KEYS[0], 0)
+    misses = values.get(STATS_KEYS[1], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    _cache().delete_many(STATS_KEYS)
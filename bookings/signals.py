@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import TravelOption
+from .cities import city_index
+from .connections import connection_graph
+from .fares import CELL_FIELDS, fare_cell, refresh_fare_cells
+from .search import normalize_city
+from .search_cache import invalidate_routes
+
+
+def _stored(instance):
+    # Tracked values as last loaded or saved (see TravelOption.from_db);
+    # empty for instances that were never read from the database
+    return getattr(instance, '_stored_values', {})
+
+
+def _saved(instance, update_fields):
+    """Tracked values the save just wrote, merged over the stored ones"""
+    values = dict(_stored(instance))
+    for name in TravelOption.TRACKED_FIELDS:
+        # Read from __dict__ so deferred fields are never fetched
+        if name in instance.__dict__ and (update_fields is None or name in update_fields):
+            field = TravelOption._meta.get_field(name)
+            values[name] = field.to_python(instance.__dict__[name])
+    return values
+
+
+def _route(values):
+    return values.get('source'), values.get('destination')
+
+
+def _cell(values):
+    cell = tuple(values.get(field) for field in CELL_FIELDS)
+    return None if None in cell else cell
+
+
+def _move_cities(old_route, new_route):
+    """Adjust the city index once the transaction commits"""
+    deltas = [(name, -1) for name in old_route if name] + [(name, 1) for name in new_route if name]
+
+    def apply():
+        for name, delta in deltas:
+            city_index.add(name, delta)
+
+    if deltas:
+        transaction.on_commit(apply, robust=True)
+
+
+@receiver(post_save, sender=TravelOption)
+def travel_option_saved(sender, instance, created, update_fields=None, **kwargs):
+    old = {} if created else _stored(instance)
+    new = _saved(instance, update_fields)
+    instance._stored_values = new
+    old_route, new_route = _route(old), _route(new)
+
+    # Search results for both the old and the new route may change
+    routes = {(instance.source_key, instance.destination_key)}
+    if old_route[0] is not None:
+        routes.add(tuple(normalize_city(name) for name in old_route))
+    invalidate_routes(routes)
+
+    if None in old_route and not created:
+        # Saved without having been loaded: the old route is unknown
+        transaction.on_commit(city_index.invalidate)
+    elif old_route != new_route:
+        moved = [(old, new) for old, new in zip(old_route, new_route) if old != new]
+        _move_cities([old for old, _ in moved], [new for _, new in moved])
+
+    # Price, seats and status changes stay in the same cell; a new route,
+    # date or travel type moves the option out of its old one
+    refresh_fare_cells({_cell(old), _cell(new) or fare_cell(instance)})
+    connection_graph.update(instance)
+
+
+@receiver(post_delete, sender=TravelOption)
+def travel_option_deleted(sender, instance, **kwargs):
+    # The stored values, or the instance's own where it was never loaded
+    stored = {**_saved(instance, None), **_stored(instance)}
+    invalidate_routes([(instance.source_key, instance.destination_key)])
+    _move_cities(_route(stored), [])
+    refresh_fare_cells({_cell(stored)})
+    connection_graph.remove(instance.pk)
@@ -0,0 +1,56 @@
+import logging
+import threading
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+class HoldSweeper(threading.Thread):
+    """Daemon thread that periodically releases expired seat holds"""
+
+    def __init__(self, interval, batch_size=500):
+        super().__init__(name='hold-sweeper', daemon=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+
+    def run(self):
+        from .reservations import release_expired_holds
+
+        while not self.stopped.wait(self.interval):
+            try:
+                released = release_expired_holds(batch_size=self.batch_size)
+                if released:
+                    logger.info('Released %d expired seat holds', released)
+            except Exception:
+                logger.exception('Hold sweep failed')
+            finally:
+                connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_hold_sweeper(interval, batch_size=500):
+    """Start the process-wide hold sweeper once and return it"""
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = HoldSweeper(interval, batch_size)
+            _sweeper.start()
+        return _sweeper
+
+
+def start_configured_hold_sweeper():
+    """Start the sweeper if BOOKING_HOLD_SWEEP_INTERVAL is set.
+
+    Called from the WSGI and ASGI entry points only, so management commands
+    (migrate, shell, test...) and the autoreloader's parent process never run
+    a sweeper against a database that may be mid-migration.
+    """
+    interval = getattr(settings, 'BOOKING_HOLD_SWEEP_INTERVAL', None)
+    return start_hold_sweeper(interval) if interval else None
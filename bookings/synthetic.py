@@ -0,0 +1,274 @@
+"""
+Deterministic synthetic data for load testing.
+
+Rows are generated in shards of SHARD_SIZE. Every shard draws from its own
+random.Random seeded with (seed, kind, shard number), so the data produced for
+a given seed and size is identical no matter how many worker processes share
+the work or in which order the shards run.
+
+The shape of the data is meant to resemble production traffic rather than be
+uniform:
+
+* City popularity follows a Zipf distribution, so a handful of hub routes
+  carry most departures and the long tail of city pairs is sparse.
+* Load factors are drawn from a beta distribution whose mean rises with route
+  popularity and falls with days until departure.
+* A small share of customers account for most bookings.
+
+Only a sample of the sold seats is written as Booking rows (see
+`booking_rate`); the remainder stand for seats sold through other channels.
+Either way sold seats are subtracted from available_seats, so
+available_seats + booked seats never exceeds total_seats.
+"""
+import bisect
+import functools
+import itertools
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import transaction
+from .models import TravelOption, Booking
+
+TRAVEL_ID_PREFIX = 'LT'
+BOOKING_ID_PREFIX = 'LB'
+USERNAME_PREFIX = 'loadtest'
+
+# Part of the seed: changing it changes the generated data
+SHARD_SIZE = 2000
+
+CITIES = [
+    'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
+    'Philadelphia', 'San Antonio', 'San Diego', 'Dallas', 'San Jose',
+    'Austin', 'Jacksonville', 'Fort Worth', 'Columbus', 'Charlotte',
+    'San Francisco', 'Indianapolis', 'Seattle', 'Denver', 'Washington DC',
+    'Boston', 'El Paso', 'Nashville', 'Detroit', 'Oklahoma City',
+    'Portland', 'Las Vegas', 'Memphis', 'Louisville', 'Baltimore',
+    'Milwaukee', 'Albuquerque', 'Tucson', 'Fresno', 'Sacramento',
+    'Kansas City', 'Mesa', 'Atlanta', 'Omaha', 'Colorado Springs',
+    'Raleigh', 'Long Beach', 'Virginia Beach', 'Miami', 'Oakland',
+    'Minneapolis', 'Tulsa', 'Bakersfield', 'Wichita', 'Arlington',
+    'Aurora', 'Tampa', 'New Orleans', 'Cleveland', 'Honolulu',
+    'Anaheim', 'Lexington', 'Stockton', 'Henderson', 'Saint Paul',
+]
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael',
+    'Linda', 'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan',
+    'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Priya', 'Wei', 'Carlos', 'Aisha',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller',
+    'Davis', 'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Wilson',
+    'Anderson', 'Taylor', 'Moore', 'Patel', 'Chen', 'Kim', 'Nguyen',
+]
+
+# travel_type: (share of departures, duration hours, base fare, seat layouts)
+TRAVEL_TYPES = {
+    'flight': (0.45, (1, 6), (150, 800), (120, 150, 180, 220, 300)),
+    'train': (0.30, (3, 12), (50, 300), (200, 300, 400, 500)),
+    'bus': (0.25, (4, 15), (25, 150), (30, 40, 50, 55)),
+}
+
+# Departures cluster around the morning and evening peaks
+DEPARTURE_HOURS = list(range(5, 24))
+DEPARTURE_HOUR_WEIGHTS = [1, 3, 6, 8, 7, 5, 4, 4, 4, 4, 4, 5, 6, 7, 7, 5, 3, 2, 1]
+
+
+class Network:
+    """Cities and routes with popularity weights, derived from the seed"""
+
+    def __init__(self, seed, cities=len(CITIES), zipf=1.1):
+        names = list(CITIES)
+        for n in itertools.count(2):
+            if len(names) >= cities:
+                break
+            names.extend(f'{name} {n}' for name in CITIES)
+        names = names[:cities]
+        random.Random(f'{seed}:cities').shuffle(names)
+
+        self.cities = names
+        city_weights = [1 / rank ** zipf for rank in range(1, len(names) + 1)]
+        self.routes = []
+        weights = []
+        for i, source in enumerate(names):
+            for j, destination in enumerate(names):
+                if i != j:
+                    self.routes.append((source, destination))
+                    weights.append(city_weights[i] * city_weights[j])
+        total, busiest = sum(weights), max(weights)
+        self.popularity = [w / busiest for w in weights]
+        self.cum_weights = list(itertools.accumulate(w / total for w in weights))
+
+    def pick_route(self, rng):
+        """Return (route index, source, destination) weighted by popularity"""
+        index = min(bisect.bisect_left(self.cum_weights, rng.random()), len(self.routes) - 1)
+        return (index,) + self.routes[index]
+
+
+@functools.lru_cache(maxsize=1)
+def network(seed, cities=len(CITIES)):
+    """The Network for a seed, built once per process and shared by its shards"""
+    return Network(seed, cities)
+
+
+def shard_rng(seed, kind, shard):
+    return random.Random(f'{seed}:{kind}:{shard}')
+
+
+def shards(total):
+    """Split range(total) into (shard number, start, stop) tuples"""
+    return [(n, start, min(start + SHARD_SIZE, total))
+            for n, start in enumerate(range(0, total, SHARD_SIZE))]
+
+
+def travel_id(index):
+    return f'{TRAVEL_ID_PREFIX}{index:010d}'
+
+
+def username(index):
+    return f'{USERNAME_PREFIX}{index:08d}'
+
+
+def build_users(seed, shard, start, stop, password):
+    """Return unsaved Users for indices [start, stop)"""
+    rng = shard_rng(seed, 'users', shard)
+    joined = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    users = []
+    for index in range(start, stop):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        name = username(index)
+        users.append(User(
+            username=name,
+            first_name=first,
+            last_name=last,
+            email=f'{name}@example.com',
+            password=password,
+            date_joined=joined + timedelta(minutes=rng.randint(0, 60 * 24 * 900)),
+        ))
+    return users
+
+
+def load_factor(rng, popularity, days_out, horizon):
+    """Share of seats sold for a departure, in [0, 1]"""
+    # Popular routes and imminent departures sell out; the tail stays sparse
+    booked_so_far = 1 - max(days_out, 0) / (horizon + 1)
+    mean = 0.15 + 0.55 * popularity ** 0.25 * (0.4 + 0.6 * booked_so_far)
+    concentration = 8
+    return rng.betavariate(mean * concentration, (1 - mean) * concentration)
+
+
+def build_options(seed, shard, start, stop, network, today, past_days, future_days):
+    """Return (options, sold seats) for option indices [start, stop)"""
+    rng = shard_rng(seed, 'options', shard)
+    types = list(TRAVEL_TYPES)
+    type_weights = [TRAVEL_TYPES[t][0] for t in types]
+    options, sold = [], []
+    for index in range(start, stop):
+        route, source, destination = network.pick_route(rng)
+        travel_type = rng.choices(types, type_weights)[0]
+        _, hours, fare, layouts = TRAVEL_TYPES[travel_type]
+
+        days_out = rng.randint(-past_days, future_days)
+        departure = datetime.combine(
+            today + timedelta(days=days_out),
+            time(rng.choices(DEPARTURE_HOURS, DEPARTURE_HOUR_WEIGHTS)[0], rng.choice((0, 15, 30, 45))),
+        )
+        arrival = departure + timedelta(hours=rng.randint(*hours), minutes=rng.randint(0, 59))
+
+        total_seats = rng.choice(layouts)
+        seats_sold = round(total_seats * load_factor(rng, network.popularity[route], days_out, future_days))
+        # Busy routes price higher
+        price = rng.randint(*fare) * (1 + 0.5 * network.popularity[route])
+
+        option = TravelOption(
+            travel_id=travel_id(index),
+            travel_type=travel_type,
+            source=source,
+            destination=destination,
+            departure_date=departure.date(),
+            departure_time=departure.time(),
+            arrival_date=arrival.date(),
+            arrival_time=arrival.time(),
+            price=Decimal(price).quantize(Decimal('0.01')),
+            available_seats=total_seats - seats_sold,
+            total_seats=total_seats,
+            status='completed' if days_out < 0 else 'active',
+        )
+        option.sync_derived_fields()
+        options.append(option)
+        sold.append(seats_sold)
+    return options, sold
+
+
+def _booking(rng, option, number, seats, status):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return Booking(
+        booking_id=f'{BOOKING_ID_PREFIX}{option.travel_id[len(TRAVEL_ID_PREFIX):]}{number:04d}',
+        travel_option_id=option.pk,
+        number_of_seats=seats,
+        total_price=option.price * seats,
+        status=status,
+        passenger_name=f'{first} {last}',
+        passenger_email=f'{first}.{last}{rng.randint(1, 999)}@example.com'.lower(),
+        passenger_phone=f'555{rng.randint(0, 9999999):07d}',
+    )
+
+
+def build_bookings(seed, shard, options, sold, users, booking_rate):
+    """Return (user index, unsaved Booking) pairs sampling each option's sold seats"""
+    rng = shard_rng(seed, 'bookings', shard)
+    bookings = []
+    for option, seats_sold in zip(options, sold):
+        remaining = seats_sold
+        number = 0
+        while remaining > 0:
+            seats = min(remaining, rng.choices((1, 2, 3, 4), (55, 25, 12, 8))[0])
+            remaining -= seats
+            if rng.random() < booking_rate:
+                # Squaring the draw skews bookings toward frequent travellers
+                user = int(users * rng.random() ** 2)
+                bookings.append((user, _booking(rng, option, number, seats, 'confirmed')))
+                number += 1
+        # Cancelled bookings gave their seats back, so they add history
+        # without affecting availability
+        for _ in range(sum(rng.random() < 0.08 for _ in range(number))):
+            user = int(users * rng.random() ** 2)
+            bookings.append((user, _booking(rng, option, number, 1, 'cancelled')))
+            number += 1
+    return bookings
+
+
+def write_users(config, shard, start, stop):
+    """Generate and insert one shard of users; returns rows written"""
+    users = build_users(config['seed'], shard, start, stop, config['password'])
+    User.objects.bulk_create(users, batch_size=config['batch_size'])
+    return len(users)
+
+
+def write_options(config, shard, start, stop):
+    """Generate and insert one shard of travel options and their bookings.
+
+    Returns (options written, bookings written).
+    """
+    options, sold = build_options(
+        config['seed'], shard, start, stop, network(config['seed'], config['cities']),
+        date.fromisoformat(config['today']), config['past_days'], config['future_days'],
+    )
+    with transaction.atomic():
+        TravelOption.objects.bulk_create(options, batch_size=config['batch_size'])
+        if any(option.pk is None for option in options):
+            # Backends that cannot return ids from a bulk insert (MySQL)
+            pks = TravelOption.objects.in_bulk([o.travel_id for o in options], field_name='travel_id')
+            for option in options:
+                option.pk = pks[option.travel_id].pk
+
+        bookings = []
+        if config['users']:
+            pairs = build_bookings(config['seed'], shard, options, sold, config['users'], config['booking_rate'])
+            users = User.objects.in_bulk({username(user) for user, _ in pairs}, field_name='username')
+            for user, booking in pairs:
+                booking.user_id = users[username(user)].pk
+                bookings.append(booking)
+            Booking.objects.bulk_create(bookings, batch_size=config['batch_size'])
+    return len(options), len(bookings)
@@ -0,0 +1,58 @@
+"""
+Cached travel option cards.
+
+{% travel_card option 'search' %} renders bookings/cards/search.html for one
+travel option. A card's markup depends only on its travel option, so the
+rendered HTML is cached under the variant, a hash of the travel_id and the
+updated_at. Every save, reservation, release or status change moves
+updated_at forward, so a change to one option only retires that option's
+cards. Retired entries are never read again and expire after
+CARD_CACHE_TIMEOUT seconds.
+
+Cards are rendered without the request context; anything that depends on the
+user (prices paid, seats booked, actions) stays in the page around them.
+"""
+import hashlib
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_VARIANTS = ('search', 'featured', 'booking', 'history')
+
+
+def card_cache_key(option, variant):
+    """Cache key of a rendered card, or None if the option has no updated_at"""
+    if option.updated_at is None:
+        return None
+    stamp = int(option.updated_at.timestamp() * 1_000_000)
+    # Travel IDs are free text, and spaces or control characters are rejected by memcached
+    digest = hashlib.md5(option.travel_id.encode(), usedforsecurity=False).hexdigest()
+    return f'travel-card:{variant}:{digest}:{stamp}'
+
+
+def render_card(option, variant):
+    return get_template(f'bookings/cards/{variant}.html').render({'option': option})
+
+
+@register.simple_tag
+def travel_card(option, variant):
+    """Render a travel option card, reusing the cached HTML while the option is unchanged"""
+    if variant not in CARD_VARIANTS:
+        raise template.TemplateSyntaxError(
+            f"travel_card variant must be one of {', '.join(CARD_VARIANTS)}, not {variant!r}.")
+
+    timeout = getattr(settings, 'CARD_CACHE_TIMEOUT', 3600)
+    key = card_cache_key(option, variant) if timeout else None
+    if key is None:
+        return render_card(option, variant)
+
+    cache = caches[getattr(settings, 'CARD_CACHE_ALIAS', 'default')]
+    html = cache.get(key)
+    if html is None:
+        html = str(render_card(option, variant))
+        cache.set(key, html, timeout)
+    return mark_safe(html)
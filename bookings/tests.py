@@ -1,10 +1,38 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.core.cache.backends.base import memcache_key_warnings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.template import Template, Context, TemplateSyntaxError
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import date, time, timedelta
 from decimal import Decimal
-from bookings.models import TravelOption, Booking, UserProfile
+from io import StringIO
+import os
+import tempfile
+import json
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync, sync_to_async
+from bookings.models import ArchivedBooking, ArchivedTravelOption, FareCalendarDay, Passenger, SeatShard, TravelOption, Booking, UserProfile
+from bookings import archive, benchmarks, bulk, fares, ids, lifecycle, pagination, reservations, search_cache, sweeper, synthetic, views
+from bookings.connections import connection_graph, day_start, find_connections
+from bookings.search import filter_route
+from bookings.cities import city_index
+from bookings.templatetags import travel_cards
+from bookings.pagination import paginate, approximate_count
+from bookings.search_cache import get_stats
+from travel_booking import db_profile, db_router
+from travel_booking.query_budget import (
+    QueryBudgetExceeded, QueryBudgetTestMixin, QueryLog, query_shape
+)
 
 class TravelBookingTestCase(TestCase):
     def setUp(self):
@@ -241,3 +269,2338 @@ class BookingModelTest(TestCase):
         
         expected_str = f"Booking {booking.booking_id} - {self.user.username}"
         self.assertEqual(str(booking), expected_str)
+
+class BookingIdTest(TestCase):
+    def test_ids_are_fixed_width_and_time_ordered(self):
+        """Test IDs have one width, sort by time and decode to their timestamp"""
+        now = [1_700_000_000_000 * 1_000_000]
+        generator = ids.BookingIdGenerator(node=5, clock=lambda: now[0])
+        
+        first = generator.generate()
+        now[0] += 1_000_000
+        second = generator.generate()
+        
+        self.assertEqual(len(first), 20)
+        self.assertEqual(len(second), 20)
+        self.assertLess(first, second)
+        self.assertEqual(ids.booking_id_time(first).timestamp(), 1_700_000_000)
+
+    def test_clock_step_back_stays_monotonic(self):
+        """Test a clock moving backwards or a full sequence never repeats an ID"""
+        now = [1_700_000_000_000 * 1_000_000]
+        generator = ids.BookingIdGenerator(node=5, clock=lambda: now[0])
+        generated = [generator.generate()]
+        
+        now[0] -= 5_000_000_000
+        generated.append(generator.generate())
+        generator._sequence = (1 << ids.SEQUENCE_BITS) - 1
+        generated.append(generator.generate())
+        
+        self.assertEqual(generated, sorted(set(generated)))
+
+    def test_node_out_of_range_is_rejected(self):
+        """Test an invalid BOOKING_ID_NODE fails loudly"""
+        with self.settings(BOOKING_ID_NODE=1 << ids.NODE_BITS):
+            with self.assertRaises(ImproperlyConfigured):
+                ids.BookingIdGenerator().generate()
+
+    def test_millions_of_ids_across_threads_are_unique(self):
+        """Test two million IDs from threads on two nodes contain no duplicates"""
+        out = StringIO()
+        call_command('benchmark_booking_ids', count=2_000_000, threads=8, processes=2, stdout=out)
+        
+        self.assertIn('Duplicates:        0', out.getvalue())
+        self.assertIn('All booking IDs unique and ordered', out.getvalue())
+
+    def test_views_use_the_shared_generator(self):
+        """Test bookings made through the view get a generated ID that fits the column"""
+        user = User.objects.create_user(username='iduser', password='pass123')
+        travel_option = TravelOption.objects.create(
+            travel_id='TR4242',
+            travel_type='train',
+            source='Austin',
+            destination='Dallas',
+            departure_date=date.today() + timedelta(days=3),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=3),
+            arrival_time=time(13, 0),
+            price=Decimal('30.00'),
+            available_seats=5,
+            total_seats=5,
+            status='active'
+        )
+        self.client.login(username='iduser', password='pass123')
+        self.client.post(reverse('bookings:book_travel', args=[travel_option.travel_id]), {
+            'number_of_seats': 1,
+            'passenger_name': 'Id Passenger',
+            'passenger_email': 'id@example.com',
+            'passenger_phone': '5555555555'
+        })
+        
+        booking = Booking.objects.get(user=user)
+        self.assertRegex(booking.booking_id, r'^BK[0-9A-HJKMNP-TV-Z]{18}$')
+
+class ReservationServiceTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reserveuser',
+            email='reserve@example.com',
+            password='pass123'
+        )
+        
+        self.travel_option = TravelOption.objects.create(
+            travel_id='TR7777',
+            travel_type='train',
+            source='Boston',
+            destination='Washington DC',
+            departure_date=date.today() + timedelta(days=5),
+            departure_time=time(7, 0),
+            arrival_date=date.today() + timedelta(days=5),
+            arrival_time=time(14, 0),
+            price=Decimal('89.00'),
+            available_seats=3,
+            total_seats=3,
+            status='active'
+        )
+
+    def make_booking(self, seats):
+        return Booking(
+            user=self.user,
+            number_of_seats=seats,
+            passenger_name='Reserve Passenger',
+            passenger_email='reserve@example.com',
+            passenger_phone='5555555555'
+        )
+
+    def test_reserve_refuses_to_oversell(self):
+        """Test the conditional update refuses bookings beyond capacity"""
+        reservations.create_booking(self.make_booking(2), self.travel_option)
+        self.assertEqual(self.travel_option.available_seats, 1)
+        
+        with self.assertRaises(reservations.SeatsUnavailable):
+            reservations.create_booking(self.make_booking(2), self.travel_option)
+        
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_reserve_uses_current_row_not_stale_instance(self):
+        """Test a stale in-memory seat count cannot cause overselling"""
+        stale = TravelOption.objects.get(pk=self.travel_option.pk)
+        reservations.reserve_seats(self.travel_option, 3)
+        
+        with self.assertRaises(reservations.SeatsUnavailable):
+            reservations.reserve_seats(stale, 1)
+
+    def test_cancel_restores_seats_once(self):
+        """Test cancelling twice only restores seats once"""
+        booking = reservations.create_booking(self.make_booking(2), self.travel_option)
+        
+        self.assertTrue(reservations.cancel_booking(booking))
+        self.assertFalse(reservations.cancel_booking(booking))
+        
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 3)
+        self.assertEqual(booking.status, 'cancelled')
+
+    def test_double_release_never_exceeds_capacity(self):
+        """Test releasing the same seats twice cannot push free seats past the total"""
+        reservations.reserve_seats(self.travel_option, 2)
+        reservations.release_seats(self.travel_option, 2)
+        reservations.release_seats(self.travel_option, 2)
+        
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 3)
+        
+        booking = reservations.create_booking(self.make_booking(2), self.travel_option)
+        reservations.release_seats(self.travel_option, 2)
+        reservations.return_seats(Booking.objects.filter(pk=booking.pk), timezone.now())
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 3)
+
+    def test_hold_and_confirm(self):
+        """Test a hold reserves seats and can be confirmed before expiry"""
+        booking = reservations.hold_seats(self.make_booking(2), self.travel_option, minutes=10)
+        
+        self.assertEqual(booking.status, 'pending')
+        self.assertTrue(booking.is_hold_active())
+        self.assertEqual(self.travel_option.available_seats, 1)
+        
+        self.assertTrue(reservations.confirm_hold(booking))
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertIsNone(booking.hold_expires_at)
+
+    def test_expired_hold_cannot_be_confirmed(self):
+        """Test an expired hold is refused at confirmation"""
+        booking = reservations.hold_seats(self.make_booking(1), self.travel_option, minutes=0)
+        
+        self.assertFalse(reservations.confirm_hold(booking))
+        self.assertEqual(booking.status, 'pending')
+
+    def test_release_expired_holds(self):
+        """Test the sweeper releases only expired holds and restores their seats"""
+        expired = reservations.hold_seats(self.make_booking(2), self.travel_option, minutes=0)
+        active = reservations.hold_seats(self.make_booking(1), self.travel_option, minutes=10)
+        self.assertEqual(self.travel_option.available_seats, 0)
+        
+        released = reservations.release_expired_holds(batch_size=1)
+        
+        self.assertEqual(released, 1)
+        expired.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual(expired.status, 'cancelled')
+        self.assertEqual(active.status, 'pending')
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 2)
+        self.assertEqual(reservations.release_expired_holds(), 0)
+
+    def test_sweeper_skips_hold_cancelled_after_listing(self):
+        """Test a hold cancelled between listing and sweeping gets its seats back once"""
+        hold = reservations.hold_seats(self.make_booking(2), self.travel_option, minutes=0)
+        real_atomic = transaction.atomic
+        cancelled = []
+        
+        def cancel_first(*args, **kwargs):
+            # The user cancels just after the sweeper listed the hold, at the
+            # same timestamp as the sweep
+            if not cancelled:
+                cancelled.append(True)
+                self.assertTrue(reservations.cancel_booking(hold))
+            return real_atomic(*args, **kwargs)
+        
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now()), \
+                mock.patch.object(transaction, 'atomic', cancel_first):
+            self.assertEqual(reservations.release_expired_holds(), 0)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 3)
+
+    def test_sweeper_starts_only_from_server_entry_points(self):
+        """Test loading the app never starts the hold sweeper; the WSGI and ASGI entry points do"""
+        with self.settings(BOOKING_HOLD_SWEEP_INTERVAL=60), mock.patch.object(sweeper, 'start_hold_sweeper') as start:
+            apps.get_app_config('bookings').ready()
+            start.assert_not_called()
+            sweeper.start_configured_hold_sweeper()
+            start.assert_called_once_with(60)
+        
+        with mock.patch.object(sweeper, 'start_hold_sweeper') as start:
+            self.assertIsNone(sweeper.start_configured_hold_sweeper())
+            start.assert_not_called()
+
+    def test_hold_on_cancelled_option_cannot_be_confirmed(self):
+        """Test a hold is refused at confirmation once its travel option is cancelled"""
+        booking = reservations.hold_seats(self.make_booking(1), self.travel_option, minutes=10)
+        TravelOption.objects.filter(pk=self.travel_option.pk).update(status='cancelled')
+        
+        self.assertFalse(reservations.confirm_hold(booking))
+        self.assertEqual(booking.status, 'pending')
+
+    def test_hold_and_confirm_views(self):
+        """Test holding seats and confirming through the views"""
+        self.client.login(username='reserveuser', password='pass123')
+        response = self.client.post(
+            reverse('bookings:hold_travel', args=[self.travel_option.travel_id]),
+            {
+                'number_of_seats': 2,
+                'passenger_name': 'Reserve Passenger',
+                'passenger_email': 'reserve@example.com',
+                'passenger_phone': '5555555555'
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        booking = Booking.objects.get(user=self.user)
+        self.assertEqual(booking.status, 'pending')
+        
+        response = self.client.post(reverse('bookings:confirm_booking', args=[booking.booking_id]))
+        self.assertEqual(response.status_code, 302)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+
+class ReservationConcurrencyTest(TransactionTestCase):
+    def test_benchmark_does_not_oversell(self):
+        """Test concurrent buyers never oversell a departure"""
+        out = StringIO()
+        call_command(
+            'benchmark_reservations',
+            threads=4, attempts=10, capacity=15, shards=[0, 4], stdout=out
+        )
+        self.assertIn('4 seat shards', out.getvalue())
+        self.assertIn('No overselling detected', out.getvalue())
+        self.assertFalse(TravelOption.objects.filter(travel_id__startswith='BENCH').exists())
+
+class SeatShardTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sharduser', password='pass123')
+        self.travel_option = TravelOption.objects.create(
+            travel_id='FL9100',
+            travel_type='flight',
+            source='Chicago',
+            destination='Denver',
+            departure_date=date.today() + timedelta(days=9),
+            departure_time=time(9, 0),
+            arrival_date=date.today() + timedelta(days=9),
+            arrival_time=time(11, 30),
+            price=Decimal('140.00'),
+            available_seats=10,
+            total_seats=10,
+            status='active'
+        )
+        reservations.stripe_seats(self.travel_option, 4)
+
+    def make_booking(self, seats):
+        return Booking(
+            user=self.user,
+            number_of_seats=seats,
+            passenger_name='Shard Passenger',
+            passenger_email='shard@example.com',
+            passenger_phone='5555555555'
+        )
+
+    def shard_seats(self):
+        return list(SeatShard.objects.filter(travel_option=self.travel_option)
+                    .order_by('shard').values_list('available_seats', flat=True))
+
+    def test_stripe_splits_seats_evenly(self):
+        """Test striping spreads the free seats over the shards"""
+        self.assertEqual(self.shard_seats(), [3, 3, 2, 2])
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.seat_shards, 4)
+        self.assertEqual(self.travel_option.available_seats, 10)
+
+    def test_double_release_never_exceeds_capacity(self):
+        """Test releasing striped seats twice cannot push the shards past the total"""
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = reservations.create_booking(self.make_booking(2), self.travel_option)
+            reservations.release_seats(self.travel_option, 2)
+            reservations.release_seats(self.travel_option, 2)
+            reservations.return_seats(Booking.objects.filter(pk=booking.pk), timezone.now())
+        
+        self.assertEqual(sum(self.shard_seats()), 10)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 10)
+
+    def test_booking_syncs_available_seats_after_commit(self):
+        """Test a striped booking takes seats from a shard and syncs the total on commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.create_booking(self.make_booking(2), self.travel_option)
+        
+        self.assertEqual(sum(self.shard_seats()), 8)
+        self.assertEqual(self.travel_option.available_seats, 8)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 8)
+        self.assertEqual(FareCalendarDay.objects.get().available_seats, 8)
+
+    def test_large_booking_pools_shards(self):
+        """Test a booking no single shard can cover takes seats from the total"""
+        booking = reservations.create_booking(self.make_booking(7), self.travel_option)
+        
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertEqual(sum(self.shard_seats()), 3)
+        self.assertLessEqual(max(self.shard_seats()) - min(self.shard_seats()), 1)
+        
+        with self.assertRaises(reservations.SeatsUnavailable):
+            reservations.create_booking(self.make_booking(4), self.travel_option)
+        self.assertEqual(sum(self.shard_seats()), 3)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_cannot_oversell_striped_departure(self):
+        """Test single-seat bookings stop exactly at capacity"""
+        for _ in range(10):
+            reservations.create_booking(self.make_booking(1), self.travel_option)
+        
+        with self.assertRaises(reservations.SeatsUnavailable):
+            reservations.create_booking(self.make_booking(1), self.travel_option)
+        self.assertEqual(self.shard_seats(), [0, 0, 0, 0])
+
+    def test_instance_loaded_before_striping_uses_shards(self):
+        """Test an instance read before stripe_seats() ran books and releases through the shards"""
+        reservations.stripe_seats(self.travel_option, 0)
+        stale = TravelOption.objects.get(pk=self.travel_option.pk)
+        other = TravelOption.objects.get(pk=self.travel_option.pk)
+        reservations.stripe_seats(self.travel_option, 4)
+        self.assertEqual((stale.seat_shards, other.seat_shards), (0, 0))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.reserve_seats(stale, 2)
+        self.assertEqual(stale.seat_shards, 4)
+        self.assertEqual(sum(self.shard_seats()), 8)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 8)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.release_seats(other, 1)
+        self.assertEqual(sum(self.shard_seats()), 9)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 9)
+        
+        stale.seat_shards = 0
+        reservations.create_group_booking(self.user, [stale], [
+            Passenger(name='Shard Passenger', email='shard@example.com', phone='5555555555')])
+        self.assertEqual(sum(self.shard_seats()), 8)
+
+    def test_cancel_and_expired_hold_return_seats(self):
+        """Test cancellations and expired holds give seats back to the shards"""
+        booking = reservations.create_booking(self.make_booking(3), self.travel_option)
+        reservations.hold_seats(self.make_booking(2), self.travel_option, minutes=0)
+        self.assertEqual(sum(self.shard_seats()), 5)
+        
+        reservations.cancel_booking(booking)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reservations.release_expired_holds(), 1)
+        
+        self.assertEqual(sum(self.shard_seats()), 10)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 10)
+
+    def test_stripe_seats_command_folds_shards_back(self):
+        """Test the command with --shards 0 stores the shard total on the travel option"""
+        reservations.create_booking(self.make_booking(4), self.travel_option)
+        out = StringIO()
+        call_command('stripe_seats', 'FL9100', shards=0, stdout=out)
+        
+        self.assertIn('Stored 6 seats', out.getvalue())
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.seat_shards, 0)
+        self.assertEqual(self.travel_option.available_seats, 6)
+        self.assertFalse(SeatShard.objects.exists())
+        
+        with self.assertRaises(CommandError):
+            call_command('stripe_seats', 'NOPE', stdout=StringIO())
+
+class GroupBookingTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='groupuser', password='pass123')
+        day = date.today() + timedelta(days=12)
+        self.outbound = TravelOption.objects.create(
+            travel_id='FL5100', travel_type='flight', source='Seattle', destination='Boise',
+            departure_date=day, departure_time=time(8, 0), arrival_date=day, arrival_time=time(9, 30),
+            price=Decimal('120.00'), available_seats=12, total_seats=12, status='active'
+        )
+        self.onward = TravelOption.objects.create(
+            travel_id='BU5101', travel_type='bus', source='Boise', destination='Twin Falls',
+            departure_date=day, departure_time=time(11, 0), arrival_date=day, arrival_time=time(13, 15),
+            price=Decimal('25.50'), available_seats=10, total_seats=10, status='active'
+        )
+
+    def make_passengers(self, count):
+        return [
+            Passenger(name=f'Passenger {n}', email=f'p{n}@example.com', phone='5555555555')
+            for n in range(count)
+        ]
+
+    def payload(self, travel_ids, passengers, **extra):
+        return json.dumps({
+            'travel_ids': travel_ids,
+            'passengers': [{'name': p.name, 'email': p.email, 'phone': p.phone} for p in passengers],
+            **extra,
+        })
+
+    def test_group_booking_books_every_passenger_on_every_leg(self):
+        """Test one call books all passengers on all legs under a shared group id"""
+        bookings = reservations.create_group_booking(
+            self.user, [self.outbound, self.onward], self.make_passengers(10))
+        
+        self.assertEqual(len(bookings), 2)
+        self.assertEqual(len({booking.group_id for booking in bookings}), 1)
+        self.assertTrue(bookings[0].group_id.startswith('GB'))
+        self.assertEqual([booking.total_price for booking in bookings], [Decimal('1200.00'), Decimal('255.00')])
+        self.assertEqual(Passenger.objects.count(), 20)
+        self.assertEqual(bookings[1].passengers.first().name, 'Passenger 0')
+        self.assertEqual(bookings[0].passenger_name, 'Passenger 0')
+        self.outbound.refresh_from_db()
+        self.onward.refresh_from_db()
+        self.assertEqual((self.outbound.available_seats, self.onward.available_seats), (2, 0))
+
+    def test_query_count_does_not_grow_with_passengers(self):
+        """Test ten passengers cost the same number of queries as one"""
+        with CaptureQueriesContext(connection) as single:
+            reservations.create_group_booking(self.user, [self.outbound, self.onward], self.make_passengers(1))
+        with CaptureQueriesContext(connection) as group:
+            reservations.create_group_booking(self.user, [self.outbound, self.onward], self.make_passengers(9))
+        
+        self.assertEqual(len(group), len(single))
+        self.assertLessEqual(len(group), 10)
+
+    def test_short_leg_rolls_back_whole_group(self):
+        """Test a leg without enough seats leaves every leg and table untouched"""
+        with self.assertRaises(reservations.SeatsUnavailable):
+            reservations.create_group_booking(self.user, [self.outbound, self.onward], self.make_passengers(11))
+        
+        self.outbound.refresh_from_db()
+        self.onward.refresh_from_db()
+        self.assertEqual((self.outbound.available_seats, self.onward.available_seats), (12, 10))
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Passenger.objects.exists())
+
+    def test_striped_leg_and_group_hold(self):
+        """Test a group hold across a striped leg expires and returns its seats"""
+        reservations.stripe_seats(self.outbound, 3)
+        bookings = reservations.create_group_booking(
+            self.user, [self.outbound, self.onward], self.make_passengers(4), hold_minutes=0)
+        
+        self.assertEqual({booking.status for booking in bookings}, {'pending'})
+        self.assertEqual(self.outbound.available_seats, 8)
+        self.assertEqual(reservations.release_expired_holds(), 2)
+        self.onward.refresh_from_db()
+        self.assertEqual(self.onward.available_seats, 10)
+        self.assertEqual(sum(SeatShard.objects.filter(travel_option=self.outbound)
+                             .values_list('available_seats', flat=True)), 12)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_group_booking_api(self):
+        """Test the group booking API books, refuses short legs and validates input"""
+        self.client.login(username='groupuser', password='pass123')
+        url = reverse('bookings:api_group_booking')
+        
+        response = self.client.post(url, self.payload(['FL5100', 'BU5101'], self.make_passengers(4)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual(data['status'], 'confirmed')
+        self.assertEqual(data['total_price'], '582.00')
+        self.assertEqual([b['travel_id'] for b in data['bookings']], ['FL5100', 'BU5101'])
+        self.assertEqual(Booking.objects.filter(group_id=data['group_id']).count(), 2)
+        
+        response = self.client.post(url, self.payload(['FL5100', 'BU5101'], self.make_passengers(7)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        
+        response = self.client.post(url, self.payload(['FL5100', 'NOPE'], self.make_passengers(1)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        
+        bad = [{'name': 'No Email', 'email': 'not-an-email', 'phone': '1'}]
+        response = self.client.post(url, json.dumps({'travel_ids': ['FL5100'], 'passengers': bad}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json()['fields'])
+        self.assertEqual(Booking.objects.count(), 2)
+
+class LifecycleTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lifecycleuser', password='pass123')
+        today = date.today()
+        self.options = {}
+        for travel_id, day in [('TR6001', today - timedelta(days=2)), ('TR6002', today - timedelta(days=1)),
+                               ('TR6003', today + timedelta(days=4)), ('TR6004', today + timedelta(days=5))]:
+            self.options[travel_id] = TravelOption.objects.create(
+                travel_id=travel_id, travel_type='train', source='Portland', destination='Eugene',
+                departure_date=day, departure_time=time(6, 0), arrival_date=day, arrival_time=time(8, 0),
+                price=Decimal('40.00'), available_seats=20, total_seats=20, status='active'
+            )
+
+    def make_booking(self, seats=1):
+        return Booking(
+            user=self.user,
+            number_of_seats=seats,
+            passenger_name='Lifecycle Passenger',
+            passenger_email='lifecycle@example.com',
+            passenger_phone='5555555555'
+        )
+
+    def statuses(self):
+        return dict(TravelOption.objects.values_list('travel_id', 'status'))
+
+    def test_complete_departed_in_batches(self):
+        """Test departed options are completed in batches and future ones stay active"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(lifecycle.complete_departed(batch_size=1), 2)
+        
+        self.assertEqual(self.statuses(), {
+            'TR6001': 'completed', 'TR6002': 'completed', 'TR6003': 'active', 'TR6004': 'active',
+        })
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "bookings_traveloption"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(lifecycle.complete_departed(), 0)
+        
+        out = StringIO()
+        call_command('complete_departed_travel', stdout=out)
+        self.assertIn('Completed 0 departed travel options', out.getvalue())
+
+    def test_cancel_cascades_to_bookings(self):
+        """Test cancelling an option cancels its confirmed and held bookings with set-based updates"""
+        option = self.options['TR6003']
+        confirmed = [reservations.create_booking(self.make_booking(), option) for _ in range(3)]
+        held = reservations.hold_seats(self.make_booking(2), option)
+        already = reservations.create_booking(self.make_booking(), option)
+        reservations.cancel_booking(already)
+        other = reservations.create_booking(self.make_booking(), self.options['TR6004'])
+        
+        with CaptureQueriesContext(connection) as queries:
+            result = lifecycle.cancel_travel_options([option.pk], batch_size=2)
+        
+        self.assertEqual(result, (1, 4))
+        self.assertFalse([q for q in queries if q['sql'].startswith('INSERT')])
+        self.assertEqual(self.statuses()['TR6003'], 'cancelled')
+        for booking in confirmed + [held]:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, 'cancelled')
+            self.assertIsNone(booking.hold_expires_at)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'confirmed')
+        self.assertFalse(FareCalendarDay.objects.filter(departure_date=option.departure_date).exists())
+        
+        with self.assertRaises(reservations.SeatsUnavailable):
+            reservations.create_booking(self.make_booking(), TravelOption.objects.get(pk=option.pk))
+        self.assertEqual(lifecycle.cancel_travel_options([option.pk]), (0, 0))
+
+    def test_cancel_command_and_admin_actions(self):
+        """Test the cancel command and the admin actions drive the same transitions"""
+        reservations.create_booking(self.make_booking(), self.options['TR6004'])
+        out = StringIO()
+        call_command('cancel_travel_options', 'TR6004', stdout=out)
+        self.assertIn('Cancelled 1 travel option and 1 booking', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('cancel_travel_options', 'NOPE', stdout=StringIO())
+        
+        User.objects.create_superuser(username='opsadmin', email='ops@example.com', password='pass123')
+        self.client.login(username='opsadmin', password='pass123')
+        url = reverse('admin:bookings_traveloption_changelist')
+        selected = [self.options[travel_id].pk for travel_id in ('TR6001', 'TR6003')]
+        self.client.post(url, {'action': 'complete_departed_options', '_selected_action': selected})
+        self.client.post(url, {'action': 'cancel_options', '_selected_action': [self.options['TR6003'].pk]})
+        
+        self.assertEqual(self.statuses(), {
+            'TR6001': 'completed', 'TR6002': 'active', 'TR6003': 'cancelled', 'TR6004': 'cancelled',
+        })
+
+class AdminScaleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='adminscaleuser', password='pass123')
+        User.objects.create_superuser(username='scaleadmin', email='scale@example.com', password='pass123')
+        self.client.login(username='scaleadmin', password='pass123')
+        day = date.today() + timedelta(days=8)
+        self.options = [
+            TravelOption.objects.create(
+                travel_id=f'BS{number}', travel_type='bus', source=source, destination='Sacramento',
+                departure_date=day, departure_time=time(7 + number, 0), arrival_date=day,
+                arrival_time=time(8 + number, 0), price=Decimal('25.00'), available_seats=30,
+                total_seats=30, status='active'
+            )
+            for number, source in enumerate(['Fresno', 'Fresno', 'Stockton'])
+        ]
+
+    def book(self, option, seats=2):
+        return reservations.create_booking(Booking(
+            user=self.user,
+            number_of_seats=seats,
+            passenger_name='Scale Passenger',
+            passenger_email='scale@example.com',
+            passenger_phone='5555555555'
+        ), option)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_booking_changelist_joins_and_skips_counts(self):
+        """Test the booking changelist joins related rows and reuses a cached count"""
+        url = reverse('admin:bookings_booking_changelist')
+        self.book(self.options[0])
+        few = self.changelist_queries(url)
+        for option in self.options:
+            self.book(option)
+        cache.clear()
+        many = self.changelist_queries(url)
+        self.assertEqual(len(many), len(few))
+        
+        cached = self.changelist_queries(url)
+        self.assertEqual(len([sql for sql in cached if 'COUNT(' in sql]), 0)
+        self.assertEqual(len(cached), len(many) - 1)
+
+    def test_estimated_count_uses_table_statistics(self):
+        """Test unfiltered changelists are sized from table statistics, not COUNT(*)"""
+        paginator = pagination.EstimatedCountPaginator(TravelOption.objects.all(), 10)
+        self.assertEqual(pagination.estimated_row_count(TravelOption), None)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(pagination.estimated_row_count(TravelOption), 3)
+        
+        with mock.patch.object(pagination, 'ESTIMATE_MIN_ROWS', 1), \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 3)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        filtered = pagination.EstimatedCountPaginator(TravelOption.objects.filter(source='Fresno'), 10)
+        self.assertEqual(filtered.count, 2)
+
+    def test_change_form_uses_autocomplete(self):
+        """Test the booking form looks up users and travel options instead of listing them"""
+        booking = self.book(self.options[0])
+        response = self.client.get(reverse('admin:bookings_booking_change', args=[booking.pk]))
+        self.assertContains(response, 'class="admin-autocomplete"', count=2)
+        self.assertNotContains(response, str(self.options[2]))
+        
+        response = self.client.get(reverse('admin:bookings_traveloption_changelist'), {'q': 'fres'})
+        self.assertContains(response, 'BS0')
+        self.assertContains(response, 'BS1')
+        self.assertNotContains(response, 'BS2')
+        response = self.client.get(reverse('admin:bookings_traveloption_changelist'), {'q': 'bs2'})
+        self.assertContains(response, 'BS2')
+
+    def test_booking_search_uses_exact_and_prefix_lookups(self):
+        """Test booking search matches IDs exactly and customers by username prefix or email"""
+        booking = self.book(self.options[0])
+        other = User.objects.create_user(username='otherscaleuser', email='other@example.com', password='pass123')
+        reservations.create_booking(Booking(
+            user=other, number_of_seats=1, passenger_name='Adminscale Lookalike',
+            passenger_email='adminscale@example.com', passenger_phone='5555555555'
+        ), self.options[1])
+        url = reverse('admin:bookings_booking_changelist')
+        
+        def found(term):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'q': term})
+            self.assertFalse([q['sql'] for q in queries if "LIKE '%" in q['sql'] or 'LIKE %' in q['sql']])
+            return sorted(b.user.username for b in response.context['cl'].result_list)
+        
+        self.assertEqual(found(booking.booking_id), ['adminscaleuser'])
+        self.assertEqual(found(booking.booking_id.lower()), ['adminscaleuser'])
+        self.assertEqual(found(booking.booking_id[:-1]), [])
+        self.assertEqual(found('adminscale'), ['adminscaleuser'])
+        self.assertEqual(found('other@example.com'), ['otherscaleuser'])
+        self.assertEqual(found('scaleuser'), [])
+
+    def test_bulk_actions_are_set_based(self):
+        """Test reprice, add seats and cancel run one UPDATE per batch, not per row"""
+        url = reverse('admin:bookings_traveloption_changelist')
+        selected = [option.pk for option in self.options]
+        reservations.stripe_seats(self.options[2], 3)
+        bookings = [self.book(option) for option in self.options]
+        
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'action': 'reprice_options', '_selected_action': selected, 'percent': '-10'})
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "bookings_traveloption"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(TravelOption.objects.values_list('price', flat=True)), {Decimal('22.50')})
+        self.assertEqual(Booking.objects.get(pk=bookings[0].pk).total_price, Decimal('50.00'))
+        
+        self.client.post(url, {'action': 'add_seats_to_options', '_selected_action': selected, 'seats': '5'})
+        self.assertEqual(
+            list(TravelOption.objects.order_by('pk').values_list('total_seats', 'available_seats')),
+            [(35, 33)] * 3
+        )
+        self.assertEqual(SeatShard.objects.filter(travel_option=self.options[2])
+                         .aggregate(total=Sum('available_seats'))['total'], 33)
+        
+        response = self.client.post(url, {'action': 'reprice_options', '_selected_action': selected}, follow=True)
+        self.assertContains(response, 'Enter a value for percent.')
+        self.assertEqual(set(TravelOption.objects.values_list('price', flat=True)), {Decimal('22.50')})
+        with self.assertRaises(ValueError):
+            bulk.reprice_travel_options(selected, -100)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:bookings_booking_changelist'), {
+                'action': 'cancel_selected_bookings', '_selected_action': [booking.pk for booking in bookings],
+            })
+        self.assertFalse(Booking.objects.exclude(status='cancelled').exists())
+        self.assertEqual(list(TravelOption.objects.values_list('available_seats', flat=True)), [35] * 3)
+        self.assertEqual(bulk.cancel_bookings([booking.pk for booking in bookings]), 0)
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='archiveuser', password='pass123')
+        today = date.today()
+        self.old = self.make_option('FL7001', today - timedelta(days=60))
+        self.older = self.make_option('FL7002', today - timedelta(days=90))
+        self.recent = self.make_option('FL7003', today - timedelta(days=3))
+        self.group = reservations.create_group_booking(self.user, [self.old, self.older], [
+            Passenger(name='Ann Archive', email='ann@example.com', phone='5555555555'),
+            Passenger(name='Bob Archive', email='bob@example.com', phone='5555555555'),
+        ])
+        self.recent_booking = reservations.create_booking(Booking(
+            user=self.user,
+            number_of_seats=1,
+            passenger_name='Ann Archive',
+            passenger_email='ann@example.com',
+            passenger_phone='5555555555'
+        ), self.recent)
+
+    def make_option(self, travel_id, day):
+        return TravelOption.objects.create(
+            travel_id=travel_id, travel_type='flight', source='Tucson', destination='El Paso',
+            departure_date=day, departure_time=time(7, 0), arrival_date=day, arrival_time=time(8, 15),
+            price=Decimal('99.00'), available_seats=50, total_seats=50, status='active'
+        )
+
+    def test_archive_moves_departed_options_and_bookings(self):
+        """Test old options, bookings and passengers move to the archive in batches"""
+        self.assertEqual(archive.archive_departed(batch_size=1), (2, 2))
+        
+        self.assertEqual(list(TravelOption.objects.values_list('travel_id', flat=True)), ['FL7003'])
+        self.assertEqual(list(Booking.objects.all()), [self.recent_booking])
+        self.assertFalse(Passenger.objects.exists())
+        self.assertEqual(FareCalendarDay.objects.count(), 1)
+        
+        archived = ArchivedBooking.objects.get(booking_id=self.group[0].booking_id)
+        self.assertEqual(archived.pk, self.group[0].pk)
+        self.assertEqual(archived.group_id, self.group[0].group_id)
+        self.assertEqual([p['name'] for p in archived.passengers], ['Ann Archive', 'Bob Archive'])
+        self.assertEqual(archived.travel_option.travel_id, 'FL7001')
+        self.assertEqual(archived.travel_option.status, 'completed')
+        self.assertEqual(archive.archive_departed(), (0, 0))
+
+    def test_history_reads_across_hot_and_archive(self):
+        """Test the dashboard and booking detail include archived bookings"""
+        archive.archive_departed()
+        self.client.login(username='archiveuser', password='pass123')
+        
+        response = self.client.get(reverse('bookings:dashboard'))
+        self.assertEqual(response.context['total_bookings'], 3)
+        self.assertEqual(response.context['past_count'], 3)
+        self.assertEqual(response.context['past_bookings'][0], self.recent_booking)
+        self.assertEqual(len(response.context['past_bookings']), 3)
+        
+        response = self.client.get(reverse('bookings:booking_detail', args=[self.group[1].booking_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'FL7002')
+        self.assertNotContains(response, 'onclick="confirmCancel()"')
+        
+        User.objects.create_user(username='stranger', password='pass123')
+        self.client.login(username='stranger', password='pass123')
+        response = self.client.get(reverse('bookings:booking_detail', args=[self.group[1].booking_id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_command_and_read_only_admin(self):
+        """Test the archive command and the archive admin pages"""
+        out = StringIO()
+        call_command('archive_departed', days=45, stdout=out)
+        self.assertIn('Archived 2 travel options and 2 bookings', out.getvalue())
+        self.assertEqual(ArchivedTravelOption.objects.count(), 2)
+        
+        User.objects.create_superuser(username='archiveadmin', email='a@example.com', password='pass123')
+        self.client.login(username='archiveadmin', password='pass123')
+        response = self.client.get(reverse('admin:bookings_archivedbooking_changelist'),
+                                   {'q': self.group[0].booking_id})
+        self.assertContains(response, self.group[0].booking_id)
+        response = self.client.get(reverse('admin:bookings_archivedbooking_change', args=[self.group[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="_save"')
+
+class ReplicaRoutingTest(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A second SQLite database standing in for the replica. It is added
+        # here rather than in settings, after the runner set up test databases.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+        }
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replicauser', password='pass123')
+        # Replicated rows keep the primary's keys
+        self.shared = self.make_option('FL8001', 'default')
+        self.make_option('FL8001', 'replica', pk=self.shared.pk)
+        self.make_option('FL8002', 'replica', pk=self.shared.pk + 1)
+
+    def make_option(self, travel_id, using, pk=None):
+        day = date.today() + timedelta(days=6)
+        option = TravelOption(
+            pk=pk, travel_id=travel_id, travel_type='flight', source='Albany', destination='Buffalo',
+            departure_date=day, departure_time=time(9, 0), arrival_date=day, arrival_time=time(10, 0),
+            price=Decimal('75.00'), available_seats=5, total_seats=5, status='active'
+        )
+        option.sync_derived_fields()
+        TravelOption.objects.using(using).bulk_create([option])
+        return TravelOption.objects.using(using).get(travel_id=travel_id)
+
+    def detail_status(self, travel_id):
+        return self.client.get(reverse('bookings:travel_detail', args=[travel_id])).status_code
+
+    def book(self):
+        # Sticking to the primary must not cost the booking view a query
+        with self.settings(QUERY_BUDGET_MODE='log'), self.assertNoLogs('travel_booking.query_budget', 'WARNING'):
+            response = self.client.post(reverse('bookings:book_travel', args=['FL8001']), {
+                'number_of_seats': 2,
+                'passenger_name': 'Replica Passenger',
+                'passenger_email': 'replica@example.com',
+                'passenger_phone': '5555555555'
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(db_router.STICKY_COOKIE, response.cookies)
+
+    def test_read_views_use_replica_until_user_writes(self):
+        """Test read-only views read the replica, and a booking sticks the user to the primary"""
+        # FL8002 only exists on the replica
+        self.assertEqual(self.detail_status('FL8002'), 200)
+        self.client.force_login(self.user)
+        self.assertEqual(self.detail_status('FL8002'), 200)
+        
+        self.book()
+        self.assertEqual(Booking.objects.using('default').count(), 1)
+        self.assertFalse(Booking.objects.using('replica').exists())
+        
+        self.assertEqual(self.detail_status('FL8002'), 404)
+        response = self.client.get(reverse('bookings:travel_detail', args=['FL8001']))
+        self.assertEqual(response.context['travel_option'].available_seats, 3)
+        
+        with mock.patch.object(db_router.time, 'time', return_value=db_router.time.time() + 3600):
+            self.assertEqual(self.detail_status('FL8002'), 200)
+
+    def test_cached_replica_search_not_served_after_write(self):
+        """Test a search cached from a lagging replica is not shown to the user who just booked"""
+        self.client.force_login(self.user)
+        self.book()
+        
+        # Another visitor searches right away and reads the replica, which
+        # has not seen the booking yet
+        url = reverse('bookings:search_results')
+        response = Client().get(url, {'source': 'albany'})
+        self.assertEqual([(o.travel_id, o.available_seats) for o in response.context['travel_options']],
+                         [('FL8001', 5), ('FL8002', 5)])
+        
+        response = self.client.get(url, {'source': 'albany'})
+        self.assertEqual([(o.travel_id, o.available_seats) for o in response.context['travel_options']],
+                         [('FL8001', 3)])
+
+    def test_writes_and_locks_stay_on_primary(self):
+        """Test the router only sends plain reads outside transactions to the replica"""
+        token = db_router._replica_reads.set(True)
+        self.addCleanup(db_router._replica_reads.reset, token)
+        
+        self.assertEqual(TravelOption.objects.all().db, 'replica')
+        self.assertEqual(User.objects.all().db, 'default')
+        self.assertEqual(TravelOption.objects.select_for_update().db, 'default')
+        with transaction.atomic():
+            self.assertEqual(TravelOption.objects.all().db, 'default')
+        
+        replica_copy = TravelOption.objects.get(travel_id='FL8001')
+        self.assertEqual(replica_copy._state.db, 'replica')
+        replica_copy.price = Decimal('80.00')
+        replica_copy.save()
+        self.assertEqual(TravelOption.objects.using('default').get(travel_id='FL8001').price, Decimal('80.00'))
+        
+        with self.settings(REPLICA_DATABASE_ALIAS='missing'):
+            self.assertEqual(TravelOption.objects.all().db, 'default')
+
+class DatabaseProfileTest(TransactionTestCase):
+    sqlite = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'travel.sqlite3'}
+
+    def test_production_profile_keeps_connections(self):
+        """Test the production profile turns on persistent, health-checked connections"""
+        tuned = db_profile.tune_database(self.sqlite, 'production')
+        self.assertEqual(tuned['CONN_MAX_AGE'], 600)
+        self.assertTrue(tuned['CONN_HEALTH_CHECKS'])
+        self.assertEqual(tuned['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertNotIn('OPTIONS', self.sqlite)
+        
+        mysql = db_profile.tune_database({
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': 'travel_booking_db',
+            'OPTIONS': {'init_command': "SET sql_mode='TRADITIONAL'"},
+        }, 'production')
+        self.assertEqual(mysql['CONN_MAX_AGE'], 300)
+        self.assertTrue(mysql['CONN_HEALTH_CHECKS'])
+        self.assertEqual(mysql['OPTIONS']['init_command'], "SET sql_mode='TRADITIONAL'")
+        
+        development = db_profile.tune_database(tuned, 'development')
+        self.assertEqual(development['CONN_MAX_AGE'], 0)
+        self.assertFalse(development['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('transaction_mode', development['OPTIONS'])
+        with self.assertRaises(ImproperlyConfigured):
+            db_profile.tune_database(self.sqlite, 'staging')
+
+    def test_sqlite_pragmas_on_every_connection(self):
+        """Test each new production SQLite connection runs in WAL mode with the tuned pragmas"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        handler = ConnectionHandler({
+            alias: db_profile.tune_database(
+                {**self.sqlite, 'NAME': os.path.join(directory.name, f'{profile}.sqlite3')}, profile)
+            for alias, profile in [('default', 'production'), ('development', 'development')]
+        })
+        self.addCleanup(handler.close_all)
+        
+        with handler['default'].cursor() as cursor:
+            for name, expected in [('journal_mode', 'wal'), ('synchronous', 1), ('busy_timeout', 5000),
+                                   ('mmap_size', 256 * 1024 * 1024), ('cache_size', -64 * 1024)]:
+                cursor.execute(f'PRAGMA {name}')
+                self.assertEqual(cursor.fetchone()[0], expected)
+        with handler['development'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'delete')
+
+    def test_benchmark_compares_profiles(self):
+        """Test the benchmark times searches under both profiles and restores the settings"""
+        original = connections.settings['default']
+        out = StringIO()
+        call_command('benchmark_database', seconds=0.3, readers=2, writers=1, departures=3, stdout=out)
+        output = out.getvalue()
+        
+        for label in ('Profile:           development', 'Profile:           production',
+                      'Search p95:', 'Lock errors:'):
+            self.assertIn(label, output)
+        self.assertIs(connections.settings['default'], original)
+        self.assertIs(connections['default'].settings_dict, original)
+        self.assertFalse(TravelOption.objects.filter(travel_id__startswith='BENCH').exists())
+
+class CitySearchTest(TestCase):
+    def setUp(self):
+        for travel_id, source, destination in [
+            ('FL1001', 'New York', 'Los Angeles'),
+            ('FL1002', 'Newark', 'San Diego'),
+            ('FL1003', 'San Francisco', 'New York'),
+        ]:
+            TravelOption.objects.create(
+                travel_id=travel_id,
+                travel_type='flight',
+                source=source,
+                destination=destination,
+                departure_date=date.today() + timedelta(days=3),
+                departure_time=time(10, 0),
+                arrival_date=date.today() + timedelta(days=3),
+                arrival_time=time(13, 0),
+                price=Decimal('199.00'),
+                available_seats=10,
+                total_seats=10,
+                status='active'
+            )
+
+    def search(self, source=None, destination=None):
+        queryset = filter_route(TravelOption.objects.all(), source, destination)
+        return sorted(queryset.values_list('travel_id', flat=True))
+
+    def test_keys_are_normalized_on_save(self):
+        """Test search keys are case-folded and whitespace collapsed"""
+        option = TravelOption.objects.get(travel_id='FL1001')
+        option.source = '  NEW   york '
+        option.save()
+        self.assertEqual(option.source_key, 'new york')
+
+    def test_exact_and_prefix_matches(self):
+        """Test typed text resolves to exact and prefix city matches"""
+        self.assertEqual(self.search(source='new york'), ['FL1001'])
+        self.assertEqual(self.search(source='NEW'), ['FL1001', 'FL1002'])
+        self.assertEqual(self.search(source='new', destination='los'), ['FL1001'])
+        self.assertEqual(self.search(destination='San'), ['FL1002'])
+
+    def test_substring_matches(self):
+        """Test text also matches city names that contain it past the start"""
+        self.assertEqual(self.search(source='york'), ['FL1001'])
+        self.assertEqual(self.search(source='nowhere'), [])
+        
+    def test_prefix_and_substring_matches_are_combined(self):
+        """Test a prefix match does not hide cities that contain the text elsewhere"""
+        TravelOption.objects.create(
+            travel_id='FL1004',
+            travel_type='flight',
+            source='Chicago',
+            destination='Anchorage',
+            departure_date=date.today() + timedelta(days=3),
+            departure_time=time(10, 0),
+            arrival_date=date.today() + timedelta(days=3),
+            arrival_time=time(18, 0),
+            price=Decimal('299.00'),
+            available_seats=10,
+            total_seats=10,
+            status='active'
+        )
+        self.assertEqual(self.search(destination='an'), ['FL1001', 'FL1002', 'FL1004'])
+        
+    def test_many_matching_cities_are_not_truncated(self):
+        """Test text matching many cities returns all of them without an unbounded IN list"""
+        for n in range(60):
+            TravelOption.objects.create(
+                travel_id=f'TR{n:04d}',
+                travel_type='train',
+                source=f'Newtown {n}',
+                destination='Boston',
+                departure_date=date.today() + timedelta(days=3),
+                departure_time=time(10, 0),
+                arrival_date=date.today() + timedelta(days=3),
+                arrival_time=time(13, 0),
+                price=Decimal('49.00'),
+                available_seats=10,
+                total_seats=10,
+                status='active'
+            )
+        self.assertEqual(len(self.search(source='new', destination='boston')), 60)
+        self.assertEqual(len(self.search(source='new')), 62)
+        
+        # Over MAX_CITY_KEYS matches, the key column is filtered directly
+        sql = str(filter_route(TravelOption.objects.all(), 'new').query)
+        self.assertNotIn(' IN (', sql)
+        self.assertIn('LIKE', sql)
+        sql = str(filter_route(TravelOption.objects.all(), 'newtown 1').query)
+        self.assertIn(' IN (', sql)
+        self.assertEqual(len(self.search(source='newtown 1')), 11)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Asserts SQLite query plan text')
+    def test_route_query_uses_key_index(self):
+        """Test the final route query is served by a key index, not a table scan"""
+        for source, destination in [('new', 'los'), ('new', None), (None, 'los')]:
+            queryset = filter_route(
+                TravelOption.objects.filter(departure_date__gte=date.today()),
+                source, destination
+            )
+            plan = queryset.explain()
+            self.assertRegex(plan, r'USING (COVERING )?INDEX travel_(route|dest)_key_idx')
+            self.assertNotRegex(plan, r'(?m)SCAN bookings_traveloption$')
+
+    @skipUnless(connection.vendor == 'sqlite', 'Asserts SQLite query plan text')
+    def test_city_resolution_uses_key_index(self):
+        """Test resolving typed text to keys scans the key indexes, not the table"""
+        keys = TravelOption.objects.order_by().values_list('source_key', flat=True).distinct()
+        plan = keys.filter(source_key__contains='an').explain()
+        self.assertIn('travel_route_key_idx', plan)
+        
+        keys = TravelOption.objects.order_by().values_list('destination_key', flat=True).distinct()
+        plan = keys.filter(destination_key__contains='an').explain()
+        self.assertIn('travel_dest_key_idx', plan)
+
+class CityAutocompleteTest(TestCase):
+    def setUp(self):
+        city_index.invalidate()
+        for travel_id, source, destination in [
+            ('BU2001', 'San Diego', 'Los Angeles'),
+            ('BU2002', 'San Jose', 'San Diego'),
+            ('BU2003', 'San Diego', 'Phoenix'),
+            ('BU2004', 'Seattle', 'San Jose'),
+        ]:
+            TravelOption.objects.create(
+                travel_id=travel_id,
+                travel_type='bus',
+                source=source,
+                destination=destination,
+                departure_date=date.today() + timedelta(days=2),
+                departure_time=time(8, 0),
+                arrival_date=date.today() + timedelta(days=2),
+                arrival_time=time(12, 0),
+                price=Decimal('39.00'),
+                available_seats=20,
+                total_seats=20,
+                status='active'
+            )
+
+    def tearDown(self):
+        city_index.invalidate()
+
+    def test_suggestions_ranked_by_departures(self):
+        """Test prefix suggestions are ordered by departure volume"""
+        self.assertEqual(
+            city_index.suggest('san'),
+            [('San Diego', 3), ('San Jose', 2)]
+        )
+        self.assertEqual(city_index.suggest('SE'), [('Seattle', 1)])
+        self.assertEqual(city_index.suggest('x'), [])
+
+    def test_suggestions_do_not_query_database(self):
+        """Test lookups are answered from memory once the index is loaded"""
+        city_index.suggest('s')
+        with self.assertNumQueries(0):
+            city_index.suggest('san')
+            city_index.suggest('l')
+
+    def test_index_updates_incrementally(self):
+        """Test saves and deletes adjust the index without a reload"""
+        city_index.suggest('s')
+        with self.captureOnCommitCallbacks(execute=True):
+            option = TravelOption.objects.get(travel_id='BU2004')
+            option.source = 'Sacramento'
+            option.save()
+            TravelOption.objects.get(travel_id='BU2002').delete()
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                city_index.suggest('s'),
+                [('San Diego', 2), ('Sacramento', 1), ('San Jose', 1)]
+            )
+
+    def test_index_waits_for_commit(self):
+        """Test a rolled back save leaves the index untouched"""
+        city_index.suggest('s')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    option = TravelOption.objects.get(travel_id='BU2004')
+                    option.source = 'Sacramento'
+                    option.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        
+        self.assertEqual(callbacks, [])
+        self.assertEqual(city_index.suggest('sa'), [('San Diego', 3), ('San Jose', 2)])
+        
+    def test_route_is_tracked_without_post_init(self):
+        """Test only loaded rows remember their route, and update_fields is respected"""
+        self.assertFalse(hasattr(TravelOption(source='Reno'), '_stored_values'))
+        city_index.suggest('s')
+        option = TravelOption.objects.get(travel_id='BU2004')
+        self.assertEqual(option._stored_values['source'], 'Seattle')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            option.source = 'Sacramento'
+            option.price = Decimal('45.00')
+            option.save(update_fields=['price'])
+        self.assertEqual(city_index.suggest('se'), [('Seattle', 1)])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            option.save()
+        self.assertEqual(city_index.suggest('se'), [])
+        self.assertEqual(city_index.suggest('sac'), [('Sacramento', 1)])
+
+    def test_api_cities(self):
+        """Test the autocomplete endpoint"""
+        response = self.client.get(reverse('bookings:api_cities'), {'q': 'san', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'cities': [{'name': 'San Diego', 'departures': 3}]})
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Several departures share a date and time so the id tie-breaker matters
+        for i in range(25):
+            TravelOption.objects.create(
+                travel_id=f'TR{3000 + i}',
+                travel_type='train',
+                source='Chicago',
+                destination='Denver',
+                departure_date=date.today() + timedelta(days=1 + i % 3),
+                departure_time=time(9 + i % 2, 0),
+                arrival_date=date.today() + timedelta(days=1 + i % 3),
+                arrival_time=time(18, 0),
+                price=Decimal('120.00'),
+                available_seats=40,
+                total_seats=40,
+                status='active'
+            )
+        self.expected = list(
+            TravelOption.objects.order_by('departure_date', 'departure_time', 'id')
+            .values_list('travel_id', flat=True)
+        )
+
+    def test_walk_forward_and_back(self):
+        """Test cursors visit every row once in both directions"""
+        queryset = TravelOption.objects.all()
+        pages = [paginate(queryset, None, 10)]
+        while pages[-1].has_next():
+            pages.append(paginate(queryset, pages[-1].next_cursor, 10))
+        
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertFalse(pages[0].has_previous())
+        seen = [option.travel_id for page in pages for option in page]
+        self.assertEqual(seen, self.expected)
+        
+        back = paginate(queryset, pages[2].previous_cursor, 10)
+        self.assertEqual([o.travel_id for o in back], self.expected[10:20])
+        first = paginate(queryset, back.previous_cursor, 10)
+        self.assertEqual([o.travel_id for o in first], self.expected[:10])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Test a malformed token falls back to the first page"""
+        page = paginate(TravelOption.objects.all(), 'not-a-cursor', 10)
+        self.assertEqual([o.travel_id for o in page], self.expected[:10])
+
+    def test_page_cost_is_constant(self):
+        """Test a page is one query with no COUNT or OFFSET"""
+        queryset = TravelOption.objects.all()
+        cursor = paginate(queryset, None, 10).next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(paginate(queryset, cursor, 10))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_approximate_count_is_cached(self):
+        """Test the result count is computed once and then served from cache"""
+        queryset = TravelOption.objects.filter(source_key='chicago')
+        self.assertEqual(approximate_count(queryset), 25)
+        with self.assertNumQueries(0):
+            self.assertEqual(approximate_count(queryset), 25)
+
+    def test_search_results_and_api_cursors(self):
+        """Test both views hand out working next cursors"""
+        response = self.client.get(reverse('bookings:search_results'), {'source': 'chicago'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result_count'], 25)
+        self.assertIn('cursor=', response.context['next_query'])
+        
+        response = self.client.get(reverse('bookings:api_travel_options'), {'limit': 20, 'count': 1})
+        data = response.json()
+        self.assertEqual(len(data['travel_options']), 20)
+        self.assertEqual(data['approximate_count'], 25)
+        response = self.client.get(
+            reverse('bookings:api_travel_options'), {'limit': 20, 'cursor': data['next_cursor']}
+        )
+        data = response.json()
+        self.assertEqual([o['travel_id'] for o in data['travel_options']], self.expected[20:])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_search_results_count_only_first_page(self):
+        """Test later pages skip the result count unless ?count=1 asks for it"""
+        response = self.client.get(reverse('bookings:search_results'), {'source': 'chicago'})
+        next_url = reverse('bookings:search_results') + '?' + response.context['next_query']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(next_url)
+        self.assertIsNone(response.context['result_count'])
+        self.assertNotContains(response, 'found')
+        # Clearing the cache also reloads the city index, whose per-city
+        # counts are grouped; the result count is not
+        self.assertFalse(any('COUNT(' in query['sql'].upper() and 'GROUP BY' not in query['sql'].upper()
+                             for query in queries))
+        
+        response = self.client.get(next_url + '&count=1')
+        self.assertEqual(response.context['result_count'], 25)
+        self.assertContains(response, '25 results found')
+
+class SearchCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        city_index.invalidate()
+        self.routes = {}
+        for travel_id, source, destination in [
+            ('FL4001', 'Boston', 'Chicago'),
+            ('FL4002', 'Denver', 'Seattle'),
+        ]:
+            self.routes[travel_id] = TravelOption.objects.create(
+                travel_id=travel_id,
+                travel_type='flight',
+                source=source,
+                destination=destination,
+                departure_date=date.today() + timedelta(days=4),
+                departure_time=time(12, 0),
+                arrival_date=date.today() + timedelta(days=4),
+                arrival_time=time(15, 0),
+                price=Decimal('250.00'),
+                available_seats=10,
+                total_seats=10,
+                status='active'
+            )
+
+    def tearDown(self):
+        city_index.invalidate()
+
+    def api_seats(self, source):
+        response = self.client.get(reverse('bookings:api_travel_options'), {'source': source})
+        return [option['available_seats'] for option in response.json()['travel_options']]
+
+    def test_repeat_search_is_served_from_cache(self):
+        """Test a repeated search runs no queries and counts as a hit"""
+        self.client.get(reverse('bookings:search_results'), {'source': 'boston'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('bookings:search_results'), {'source': 'BOSTON '})
+        self.assertContains(response, 'FL4001')
+        self.assertEqual(get_stats()['hits'], 1)
+        self.assertEqual(get_stats()['misses'], 1)
+
+    def test_seat_change_invalidates_only_its_route(self):
+        """Test a booking bumps its own route and leaves other routes cached"""
+        self.assertEqual(self.api_seats('boston'), [10])
+        self.assertEqual(self.api_seats('denver'), [10])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.reserve_seats(self.routes['FL4001'], 3)
+        
+        self.assertEqual(self.api_seats('boston'), [7])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api_seats('denver'), [10])
+
+    def test_save_invalidates_unfiltered_searches(self):
+        """Test a model save invalidates searches with no route filter"""
+        self.assertEqual(sorted(self.api_seats('')), [10, 10])
+        
+        option = self.routes['FL4002']
+        option.available_seats = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            option.save()
+        
+        self.assertEqual(sorted(self.api_seats('')), [4, 10])
+        
+    def test_unindexed_city_uses_global_version(self):
+        """Test a search for a city the index has not seen is invalidated by any write"""
+        self.assertEqual(self.api_seats('reno'), [])
+        
+        # Added by another process: this process's city index never hears of it
+        with mock.patch.object(city_index, 'add'), self.captureOnCommitCallbacks(execute=True):
+            TravelOption.objects.create(
+                travel_id='FL4003', travel_type='flight', source='Reno', destination='Boston',
+                departure_date=date.today() + timedelta(days=4), departure_time=time(9, 0),
+                arrival_date=date.today() + timedelta(days=4), arrival_time=time(14, 0),
+                price=Decimal('180.00'), available_seats=6, total_seats=6, status='active'
+            )
+        self.assertEqual(self.api_seats('reno'), [6])
+        
+    def test_city_added_elsewhere_joins_matching_search(self):
+        """Test a search matching an indexed city also sees a matching city another process adds"""
+        self.assertEqual(self.api_seats('bo'), [10])
+        
+        # Boise is new to this process's city index, but "bo" already matches Boston
+        with mock.patch.object(city_index, 'add'), self.captureOnCommitCallbacks(execute=True):
+            boise = TravelOption.objects.create(
+                travel_id='FL4004', travel_type='flight', source='Boise', destination='Denver',
+                departure_date=date.today() + timedelta(days=4), departure_time=time(9, 0),
+                arrival_date=date.today() + timedelta(days=4), arrival_time=time(11, 0),
+                price=Decimal('90.00'), available_seats=6, total_seats=6, status='active'
+            )
+        self.assertEqual(sorted(self.api_seats('bo')), [6, 10])
+        
+        # Only the first write to a city reloads the index
+        with self.captureOnCommitCallbacks(execute=True):
+            boise.save()
+        with mock.patch.object(city_index, 'load') as load:
+            self.assertEqual(sorted(self.api_seats('bo')), [6, 10])
+        load.assert_not_called()
+
+    def test_route_search_depends_on_both_cities(self):
+        """Test a search by source and destination is keyed on both cities' versions"""
+        keys = search_cache._version_keys('boston', 'chicago')
+        self.assertEqual(keys, [search_cache._version_key('src', 'boston'),
+                                search_cache._version_key('dst', 'chicago')])
+
+class DashboardQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='dashuser',
+            email='dash@example.com',
+            password='pass123'
+        )
+        self.client.login(username='dashuser', password='pass123')
+
+    def add_bookings(self, count):
+        start = Booking.objects.count()
+        for i in range(start, start + count):
+            # Alternate between upcoming and past departures
+            departure = date.today() + timedelta(days=5 if i % 2 else -5)
+            option = TravelOption.objects.create(
+                travel_id=f'BU{5000 + i}',
+                travel_type='bus',
+                source='Austin',
+                destination='Dallas',
+                departure_date=departure,
+                departure_time=time(10, 0),
+                arrival_date=departure,
+                arrival_time=time(13, 0),
+                price=Decimal('30.00'),
+                available_seats=10,
+                total_seats=10,
+                status='active'
+            )
+            Booking.objects.create(
+                user=self.user,
+                travel_option=option,
+                number_of_seats=1,
+                passenger_name='Dash Passenger',
+                passenger_email='dash@example.com',
+                passenger_phone='1231231234'
+            )
+
+    def test_dashboard_query_count_is_constant(self):
+        """Test the dashboard query count does not grow with bookings"""
+        self.add_bookings(4)
+        # session, user, stats aggregate, upcoming list, past list, archive
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('bookings:dashboard'))
+        self.assertEqual(response.context['total_bookings'], 4)
+        self.assertEqual(response.context['upcoming_count'], 2)
+        self.assertEqual(response.context['past_count'], 2)
+        
+        self.add_bookings(40)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('bookings:dashboard'))
+        self.assertEqual(response.context['total_bookings'], 44)
+        self.assertEqual(response.context['upcoming_count'], 22)
+        self.assertEqual(len(response.context['past_bookings']), 3)
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='budgetuser',
+            email='budget@example.com',
+            password='pass123'
+        )
+        UserProfile.objects.create(user=self.user)
+        for i in range(6):
+            option = TravelOption.objects.create(
+                travel_id=f'FL{6000 + i}',
+                travel_type='flight',
+                source='Atlanta',
+                destination='Miami',
+                departure_date=date.today() + timedelta(days=1 + i),
+                departure_time=time(7, 0),
+                arrival_date=date.today() + timedelta(days=1 + i),
+                arrival_time=time(9, 0),
+                price=Decimal('180.00'),
+                available_seats=30,
+                total_seats=30,
+                status='active'
+            )
+            Booking.objects.create(
+                user=self.user,
+                travel_option=option,
+                number_of_seats=1,
+                passenger_name='Budget Passenger',
+                passenger_email='budget@example.com',
+                passenger_phone='4044044040'
+            )
+        self.client.login(username='budgetuser', password='pass123')
+
+    def test_query_shape_ignores_parameters(self):
+        """Test IN lists of different lengths share one shape"""
+        self.assertEqual(
+            query_shape('SELECT * FROM t WHERE id IN (%s, %s)'),
+            query_shape('SELECT  *  FROM t WHERE id IN (%s)')
+        )
+
+    def test_detects_n_plus_one(self):
+        """Test lazy foreign key access in a loop is reported as N+1"""
+        with QueryLog() as log:
+            for booking in Booking.objects.all():
+                booking.travel_option.source
+        self.assertEqual(log.count, 7)
+        self.assertEqual(list(log.repeated_shapes().values()), [6])
+        
+        with QueryLog() as log:
+            for booking in Booking.objects.select_related('travel_option'):
+                booking.travel_option.source
+        self.assertEqual(log.violations(budget=1), [])
+
+    def test_views_stay_within_budget(self):
+        """Test the main pages respect their declared budgets"""
+        booking = Booking.objects.first()
+        for url in [
+            reverse('bookings:home'),
+            reverse('bookings:search_results') + '?source=atlanta',
+            reverse('bookings:travel_detail', args=['FL6000']),
+            reverse('bookings:api_travel_options') + '?destination=miami',
+            reverse('bookings:dashboard'),
+            reverse('bookings:booking_detail', args=[booking.booking_id]),
+            reverse('accounts:profile'),
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIsNotNone(response.wsgi_request.query_budget, url)
+            self.assertWithinQueryBudget(response)
+
+    def test_over_budget_request_raises(self):
+        """Test raise mode fails a request that exceeds its budget"""
+        with mock.patch.object(views.home, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('bookings:home'))
+
+    def test_streamed_queries_count_towards_budget(self):
+        """Test queries run while a streaming response is consumed are recorded and checked"""
+        url = reverse('bookings:api_travel_options_v2')
+        response = self.client.get(url, {'source': 'atlanta'})
+        before = response.query_log.count
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))['travel_options']), 6)
+        self.assertGreater(response.query_log.count, before)
+        self.assertWithinQueryBudget(response)
+        
+        with mock.patch.object(views.api_travel_options_v2, 'query_budget', before):
+            response = self.client.get(url, {'source': 'atlanta'})
+            with self.assertRaises(QueryBudgetExceeded):
+                b''.join(response.streaming_content)
+
+class TravelOptionsApiV2Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(5):
+            TravelOption.objects.create(
+                travel_id=f'TR{7000 + i}',
+                travel_type='train',
+                source='Portland',
+                destination='Seattle',
+                departure_date=date.today() + timedelta(days=1 + i),
+                departure_time=time(6, 30),
+                arrival_date=date.today() + timedelta(days=1 + i),
+                arrival_time=time(10, 0),
+                price=Decimal('55.50'),
+                available_seats=60,
+                total_seats=60,
+                status='active'
+            )
+        self.url = reverse('bookings:api_travel_options_v2')
+
+    def get_json(self, response):
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_field_projection(self):
+        """Test only the requested fields are selected and returned"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'travel_id,price,travel_type', 'limit': 3})
+            data = self.get_json(response)
+        self.assertEqual(data['travel_options'], [
+            {'travel_id': 'TR7000', 'price': '55.50', 'travel_type': 'Train'},
+            {'travel_id': 'TR7001', 'price': '55.50', 'travel_type': 'Train'},
+            {'travel_id': 'TR7002', 'price': '55.50', 'travel_type': 'Train'},
+        ])
+        select = queries[-1]['sql']
+        self.assertNotIn('available_seats', select)
+        self.assertNotIn('"source"', select)
+
+    def test_unknown_field_rejected(self):
+        """Test unknown projection fields are a client error"""
+        response = self.client.get(self.url, {'fields': 'travel_id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        """Test unchanged results are answered with 304 until a row changes"""
+        response = self.client.get(self.url, {'source': 'portland'})
+        self.assertEqual(len(self.get_json(response)['travel_options']), 5)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        
+        response = self.client.get(self.url, {'source': 'portland'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        
+        option = TravelOption.objects.get(travel_id='TR7003')
+        reservations.reserve_seats(option, 2)
+        response = self.client.get(self.url, {'source': 'portland'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+class ImportTravelOptionsTest(TestCase):
+    header = 'travel_id,travel_type,source,destination,departure_date,departure_time,arrival_date,arrival_time,price,total_seats\n'
+
+    def write_file(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def import_file(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_travel_options', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_and_upsert(self):
+        """Test CSV rows are inserted, then updated in place on travel_id"""
+        day = (date.today() + timedelta(days=10)).isoformat()
+        path = self.write_file('.csv', self.header + ''.join(
+            f'BU{8000 + i},bus,Tulsa,Wichita,{day},08:00,{day},11:30,25.00,40\n' for i in range(5)
+        ) + f'BU9999,boat,Tulsa,Wichita,{day},08:00,{day},11:30,25.00,40\n')
+        
+        out, err = self.import_file(path, chunk_size=2)
+        self.assertIn('Upserted 5 travel options', out)
+        self.assertIn('Line 7', err)
+        option = TravelOption.objects.get(travel_id='BU8003')
+        self.assertEqual(option.available_seats, 40)
+        self.assertEqual(option.source_key, 'tulsa')
+        
+        # Seats booked since the last import survive a re-import
+        reservations.reserve_seats(option, 3)
+        path = self.write_file('.csv', self.header +
+                               f'BU8003,bus,Tulsa,Wichita,{day},09:00,{day},12:30,27.50,40\n')
+        self.import_file(path)
+        option.refresh_from_db()
+        self.assertEqual(TravelOption.objects.count(), 5)
+        self.assertEqual(option.price, Decimal('27.50'))
+        self.assertEqual(option.departure_time, time(9, 0))
+        self.assertEqual(option.available_seats, 37)
+
+    def test_reduced_capacity_caps_free_seats(self):
+        """Test an upsert lowering total_seats never leaves more free seats than seats"""
+        day = (date.today() + timedelta(days=10)).isoformat()
+        row = 'BU{},bus,Tulsa,Wichita,{},08:00,{},11:30,25.00,{}\n'
+        self.import_file(self.write_file('.csv', self.header + row.format(8100, day, day, 40) +
+                                         row.format(8101, day, day, 40)))
+        option, striped = TravelOption.objects.order_by('travel_id')
+        reservations.reserve_seats(option, 3)
+        reservations.stripe_seats(striped, 4)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_file(self.write_file('.csv', self.header + row.format(8100, day, day, 30) +
+                                             row.format(8101, day, day, 30)))
+        option.refresh_from_db()
+        striped.refresh_from_db()
+        self.assertEqual((option.total_seats, option.available_seats), (30, 30))
+        self.assertEqual((striped.total_seats, striped.available_seats), (30, 30))
+        self.assertEqual(sorted(SeatShard.objects.filter(travel_option=striped)
+                                .values_list('available_seats', flat=True)), [7, 7, 8, 8])
+        
+    def test_route_change_invalidates_old_route(self):
+        """Test an upsert moving an option to another route drops it from the old route's cached searches"""
+        cache.clear()
+        day = (date.today() + timedelta(days=10)).isoformat()
+        row = 'BU8200,bus,Tulsa,{},' + f'{day},08:00,{day},11:30,25.00,40\n'
+        other = f'BU8201,bus,Dallas,Wichita,{day},07:00,{day},12:00,30.00,40\n'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_file(self.write_file('.csv', self.header + row.format('Wichita') + other))
+        url = reverse('bookings:api_travel_options')
+        self.assertEqual(len(self.client.get(url, {'destination': 'wichita'}).json()['travel_options']), 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_file(self.write_file('.csv', self.header + row.format('Omaha')))
+        response = self.client.get(url, {'destination': 'wichita'})
+        self.assertEqual([o['travel_id'] for o in response.json()['travel_options']], ['BU8201'])
+
+    def test_jsonl_import(self):
+        """Test JSONL input with a duplicate id and a malformed line"""
+        day = (date.today() + timedelta(days=10)).isoformat()
+        row = {
+            'travel_id': 'FL8100', 'travel_type': 'flight', 'source': 'Reno',
+            'destination': 'Boise', 'departure_date': day, 'departure_time': '14:00',
+            'arrival_date': day, 'arrival_time': '15:20', 'price': 99, 'total_seats': 120,
+            'available_seats': 100,
+        }
+        lines = [json.dumps(row), json.dumps({**row, 'price': 89}), '{not json']
+        path = self.write_file('.jsonl', '\n'.join(lines) + '\n')
+        
+        out, err = self.import_file(path)
+        self.assertIn('Upserted 1 travel options', out)
+        self.assertIn('Line 3', err)
+        option = TravelOption.objects.get(travel_id='FL8100')
+        self.assertEqual(option.price, Decimal('89'))
+        self.assertEqual(option.available_seats, 100)
+
+    def test_strict_mode_aborts(self):
+        """Test --strict stops at the first invalid row"""
+        path = self.write_file('.csv', self.header + 'BU1,bus,A,B,not-a-date,08:00,2030-01-01,09:00,1,1\n')
+        with self.assertRaises(CommandError):
+            self.import_file(path, strict=True)
+
+
+@mock.patch.object(synthetic, 'SHARD_SIZE', 20)
+class GenerateLoadDataTest(TestCase):
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_load_data', options=50, users=8, seed='7', today='2030-01-01',
+                     workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def snapshot(self):
+        options = list(TravelOption.objects.order_by('travel_id').values_list(
+            'travel_id', 'source', 'destination', 'departure_date', 'price', 'available_seats'))
+        bookings = list(Booking.objects.order_by('booking_id').values_list(
+            'booking_id', 'user__username', 'travel_option__travel_id', 'number_of_seats', 'status'))
+        return options, bookings
+
+    def test_same_seed_same_data(self):
+        """Test regenerating with the same seed reproduces every row"""
+        self.generate(booking_rate=0.5)
+        first = self.snapshot()
+        self.assertEqual(len(first[0]), 50)
+        self.assertTrue(first[1])
+        self.assertEqual(User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX).count(), 8)
+        
+        with self.assertRaises(CommandError):
+            self.generate()
+        self.generate(booking_rate=0.5, flush=True)
+        self.assertEqual(self.snapshot(), first)
+        self.assertTrue(TravelOption.objects.get(travel_id='LT0000000000').source_key)
+
+    def test_flush_removes_dependent_rows(self):
+        """Test --flush succeeds once generated rows have shards, passengers and calendar days"""
+        self.generate(booking_rate=0.5)
+        booking = Booking.objects.filter(travel_option__travel_id__startswith=synthetic.TRAVEL_ID_PREFIX).first()
+        Passenger.objects.create(booking=booking, name='Extra', email='extra@example.com', phone='1')
+        reservations.stripe_seats(TravelOption.objects.filter(status='active').first(), 2)
+        self.assertTrue(FareCalendarDay.objects.exists())
+        
+        self.generate(booking_rate=0.5, flush=True)
+        self.assertFalse(SeatShard.objects.exists())
+        self.assertFalse(Passenger.objects.exists())
+        self.assertEqual(FareCalendarDay.objects.aggregate(options=Sum('options'))['options'],
+                         TravelOption.objects.filter(status='active').count())
+        
+    def test_network_is_built_once(self):
+        """Test every shard reuses one route network"""
+        synthetic.network.cache_clear()
+        with mock.patch.object(synthetic, 'Network', wraps=synthetic.Network) as network:
+            self.generate()
+        self.assertEqual(network.call_count, 1)
+        self.assertEqual(TravelOption.objects.count(), 50)
+
+    def test_seats_are_accounted_for(self):
+        """Test generated bookings never oversell a departure"""
+        self.generate(booking_rate=1.0)
+        for option in TravelOption.objects.all():
+            booked = sum(b.number_of_seats for b in option.bookings.all() if b.status == 'confirmed')
+            self.assertEqual(option.available_seats + booked, option.total_seats)
+
+
+class BenchmarkViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frequent', password='testpass123')
+        day = date.today() + timedelta(days=5)
+        for i in range(3):
+            option = TravelOption.objects.create(
+                travel_id=f'TR{7000 + i}', travel_type='train', source='Leeds', destination='York',
+                departure_date=day, departure_time=time(8 + i, 0), arrival_date=day,
+                arrival_time=time(10 + i, 0), price=Decimal('20.00'), available_seats=80,
+                total_seats=100, status='active',
+            )
+            Booking.objects.create(
+                booking_id=f'BKTEST{i}', user=self.user, travel_option=option, number_of_seats=1,
+                passenger_name='Frequent Flyer', passenger_email='ff@example.com',
+                passenger_phone='5551234567',
+            )
+
+    def test_client_driver_writes_results(self):
+        """Test every scenario runs within its query budget and the JSON report is written"""
+        handle = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        call_command('benchmark_views', requests=4, warmup=1, samples=2, output=handle.name, stdout=StringIO())
+        
+        with open(handle.name) as results:
+            report = json.load(results)
+        self.assertEqual(report['meta']['user'], 'frequent')
+        self.assertEqual(report['meta']['driver'], 'client')
+        views_by_scenario = {
+            'home': views.home,
+            'search_results': views.search_results,
+            'travel_option_detail': views.travel_option_detail,
+            'book_travel': views.book_travel,
+            'dashboard': views.dashboard,
+            'api_travel_options': views.api_travel_options,
+        }
+        self.assertEqual(set(report['scenarios']), set(views_by_scenario))
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['requests'], 4)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['queries_max'], views_by_scenario[name].query_budget, name)
+        
+        # The departure used for booking is removed again
+        self.assertFalse(TravelOption.objects.filter(travel_id__startswith='BENCH').exists())
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_compare_flags_regressions(self):
+        """Test latency, throughput and query increases against a baseline are reported"""
+        baseline = {'home': {'p50_ms': 10, 'p95_ms': 20, 'throughput_rps': 100, 'queries_max': 3, 'errors': 0}}
+        within = {'home': {'p50_ms': 11, 'p95_ms': 22, 'throughput_rps': 90, 'queries_max': 3, 'errors': 0}}
+        worse = {'home': {'p50_ms': 10, 'p95_ms': 30, 'throughput_rps': 60, 'queries_max': 4, 'errors': 0}}
+        self.assertEqual(benchmarks.compare(within, baseline, tolerance=0.2), [])
+        regressions = benchmarks.compare(worse, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(any('queries_max 3 -> 4' in r for r in regressions))
+
+
+class ScheduleFieldsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        day = date.today() + timedelta(days=3)
+        # Durations cycle through 90, 150, 210, 270 and 330 minutes
+        for i in range(15):
+            TravelOption.objects.create(
+                travel_id=f'BU{6000 + i}', travel_type='bus', source='Austin', destination='Dallas',
+                departure_date=day, departure_time=time(6 + i % 3, 0), arrival_date=day,
+                arrival_time=time(7 + i % 3 + i % 5, 30), price=Decimal('30.00'),
+                available_seats=50, total_seats=50, status='active',
+            )
+
+    def test_fields_follow_date_and_time_changes(self):
+        """Test departure_at, arrival_at and duration_minutes are kept in sync on save"""
+        option = TravelOption.objects.create(
+            travel_id='TR6100', travel_type='train', source='Austin', destination='Houston',
+            departure_date='2031-03-01', departure_time='22:15:00', arrival_date='2031-03-02',
+            arrival_time='01:45:00', price=Decimal('45.00'), available_seats=10, total_seats=10,
+        )
+        option.refresh_from_db()
+        self.assertEqual(option.duration_minutes, 210)
+        self.assertEqual(option.get_duration(), timedelta(hours=3, minutes=30))
+        self.assertEqual(option.departure_at, timezone.make_aware(timezone.datetime(2031, 3, 1, 22, 15)))
+        self.assertEqual(option.arrival_at, timezone.make_aware(timezone.datetime(2031, 3, 2, 1, 45)))
+        
+        option.arrival_time = time(3, 0)
+        option.save()
+        option.refresh_from_db()
+        self.assertEqual(option.duration_minutes, 285)
+
+    def test_unsaved_option_duration(self):
+        """Test get_duration works before save() has stored duration_minutes"""
+        option = TravelOption(departure_date=date(2031, 3, 1), departure_time=time(22, 15),
+                              arrival_date=date(2031, 3, 2), arrival_time=time(1, 45))
+        self.assertEqual(option.get_duration(), timedelta(hours=3, minutes=30))
+        
+    def test_update_must_write_derived_fields(self):
+        """Test queryset updates cannot change a schedule or route without its stored copies"""
+        options = TravelOption.objects.filter(source='Austin')
+        with self.assertRaisesMessage(ValueError, 'also requires arrival_at, duration_minutes'):
+            options.update(arrival_time=time(23, 0))
+        with self.assertRaisesMessage(ValueError, 'also requires source_key'):
+            options.update(source='Dallas')
+        self.assertEqual(options.update(price=Decimal('60.00')), options.count())
+        
+        option = options.first()
+        option.arrival_time = time(23, 0)
+        option.sync_derived_fields()
+        TravelOption.objects.bulk_update([option], ['arrival_time', 'arrival_at', 'duration_minutes'])
+        option.refresh_from_db()
+        self.assertEqual(option.arrival_at.time(), time(23, 0))
+
+    def test_save_with_update_fields_writes_derived_fields(self):
+        """Test save(update_fields=...) also writes the stored values derived from those fields"""
+        option = TravelOption.objects.filter(source='Austin').first()
+        option.source = '  San   Antonio '
+        option.arrival_time = time(23, 0)
+        option.save(update_fields=['source'])
+        
+        stored = TravelOption.objects.get(pk=option.pk)
+        self.assertEqual(stored.source_key, 'san antonio')
+        self.assertNotEqual(stored.arrival_time, time(23, 0))
+        
+        option.save(update_fields=['arrival_time'])
+        stored.refresh_from_db()
+        self.assertEqual(stored.arrival_at.time(), time(23, 0))
+        self.assertEqual(stored.duration_minutes, option.duration_minutes)
+
+    def test_shortest_first_with_max_duration(self):
+        """Test the sort and duration filter run in SQL and page with cursors"""
+        params = {'source': 'austin', 'sort': 'duration', 'max_duration': 5}
+        response = self.client.get(reverse('bookings:search_results'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result_count'], 12)
+        first = [o.duration_minutes for o in response.context['travel_options']]
+        self.assertEqual(first, sorted(first))
+        self.assertEqual(first[0], 90)
+        
+        response = self.client.get(reverse('bookings:search_results') + '?' + response.context['next_query'])
+        self.assertIsNone(response.context['result_count'])
+        rest = [o.duration_minutes for o in response.context['travel_options']]
+        self.assertEqual(len(first + rest), 12)
+        self.assertEqual(first + rest, sorted(first + rest))
+        self.assertEqual(rest, [270, 270])
+        
+        response = self.client.get(reverse('bookings:api_travel_options'),
+                                   {'sort': 'duration', 'max_duration': 2, 'limit': 5})
+        durations = [o['duration_minutes'] for o in response.json()['travel_options']]
+        self.assertEqual(durations, [90, 90, 90])
+
+
+@override_settings(ROOT_URLCONF='travel_booking.asgi_urls')
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        day = date.today() + timedelta(days=4)
+        for i in range(12):
+            TravelOption.objects.create(
+                travel_id=f'FL{5100 + i}', travel_type='flight', source='Salt Lake City',
+                destination='Spokane', departure_date=day, departure_time=time(6 + i, 0),
+                arrival_date=day, arrival_time=time(8 + i, 30 - 2 * i), price=Decimal('150.00'),
+                available_seats=90, total_seats=90, status='active',
+            )
+
+    @override_settings(QUERY_BUDGET_MODE='log')
+    async def test_async_views_match_sync_views(self):
+        """Test the async views are routed under ASGI and return what the sync views do"""
+        from bookings import async_views
+        response = await self.async_client.get(reverse('bookings:search_results'), {'source': 'salt'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.resolver_match.func, async_views.search_results)
+        self.assertEqual(response.context['result_count'], 12)
+        self.assertEqual(len(response.context['travel_options']), 10)
+        # Queries run in the executor thread are still counted by the middleware
+        self.assertGreater(response.query_log.count, 0)
+        
+        response = await self.async_client.get(
+            reverse('bookings:search_results') + '?' + response.context['next_query'])
+        self.assertEqual([o.travel_id for o in response.context['travel_options']], ['FL5110', 'FL5111'])
+        
+        response = await self.async_client.get(reverse('bookings:travel_detail', args=['FL5103']))
+        self.assertContains(response, 'Salt Lake City')
+        response = await self.async_client.get(reverse('bookings:travel_detail', args=['XX0000']))
+        self.assertEqual(response.status_code, 404)
+        
+        params = {'source': 'salt', 'sort': 'duration', 'limit': 5, 'count': 1}
+        async_data = (await self.async_client.get(reverse('bookings:api_travel_options'), params)).json()
+        cache.clear()
+        with override_settings(ROOT_URLCONF='travel_booking.urls'):
+            sync_data = (await sync_to_async(self.client.get)(reverse('bookings:api_travel_options'), params)).json()
+        self.assertEqual(async_data, sync_data)
+        self.assertEqual(async_data['approximate_count'], 12)
+        self.assertEqual(async_data['travel_options'][0]['travel_id'], 'FL5111')
+
+
+class ASGIApplicationTest(TransactionTestCase):
+    def test_asgi_application_serves_async_views(self):
+        """Test the project ASGI application routes search to the async view"""
+        from asgiref.testing import ApplicationCommunicator
+        from travel_booking.asgi import application
+        
+        async def get(path, query_string=b''):
+            communicator = ApplicationCommunicator(application, {
+                'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+                'headers': [(b'host', b'localhost')], 'server': ('localhost', 80),
+            })
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(timeout=10)
+            body = await communicator.receive_output(timeout=10)
+            return start['status'], body['body']
+        
+        day = date.today() + timedelta(days=2)
+        TravelOption.objects.create(
+            travel_id='BU5200', travel_type='bus', source='Fargo', destination='Bismarck',
+            departure_date=day, departure_time=time(9, 0), arrival_date=day, arrival_time=time(12, 0),
+            price=Decimal('40.00'), available_seats=30, total_seats=30, status='active',
+        )
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            status, body = async_to_sync(get)('/api/travel-options/', b'source=fargo')
+        self.assertEqual(status, 200)
+        self.assertEqual([o['travel_id'] for o in json.loads(body)['travel_options']], ['BU5200'])
+
+    def test_benchmark_compares_both_paths(self):
+        """Test benchmark_asgi serves every scenario through both applications without errors"""
+        handle = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        call_command('benchmark_asgi', requests=6, warmup=0, connections=3, wsgi_threads=2,
+                     samples=2, output=handle.name, stdout=StringIO())
+        
+        with open(handle.name) as results:
+            report = json.load(results)
+        for path in ('wsgi', 'asgi'):
+            self.assertEqual(set(report[path]), {'search_results', 'travel_option_detail', 'api_travel_options'})
+            for name, result in report[path].items():
+                self.assertEqual(result['requests'], 6)
+                self.assertEqual(result['errors'], 0, f'{path} {name}')
+        self.assertFalse(TravelOption.objects.filter(travel_id__startswith='BENCH').exists())
+
+
+class FareCalendarTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.day = date(2031, 5, 10)
+        self.user = User.objects.create_user(username='fareuser', password='pass123')
+        for i, (travel_type, price, seats) in enumerate([
+            ('flight', '120.00', 10), ('flight', '90.00', 2), ('bus', '35.00', 40),
+        ]):
+            TravelOption.objects.create(
+                travel_id=f'FC{100 + i}', travel_type=travel_type, source='Denver', destination='Omaha',
+                departure_date=self.day, departure_time=time(8 + i, 0), arrival_date=self.day,
+                arrival_time=time(12 + i, 0), price=Decimal(price), available_seats=seats,
+                total_seats=40, status='active',
+            )
+        for offset in (1, 2):
+            TravelOption.objects.create(
+                travel_id=f'FC{200 + offset}', travel_type='train', source='Denver', destination='Omaha',
+                departure_date=self.day + timedelta(days=offset), departure_time=time(9, 0),
+                arrival_date=self.day + timedelta(days=offset), arrival_time=time(18, 0),
+                price=Decimal('60.00') + offset, available_seats=100, total_seats=100, status='active',
+            )
+
+    def cell(self, travel_type='flight', day=None):
+        return FareCalendarDay.objects.get(
+            source_key='denver', destination_key='omaha',
+            departure_date=day or self.day, travel_type=travel_type,
+        )
+
+    def calendar_rows(self):
+        return sorted(FareCalendarDay.objects.values_list(
+            'source_key', 'destination_key', 'departure_date', 'travel_type',
+            'min_price', 'available_seats', 'options',
+        ))
+
+    def test_rollup_follows_option_changes(self):
+        """Test price, seat, status and schedule changes update the affected cells"""
+        cell = self.cell()
+        self.assertEqual((cell.min_price, cell.available_seats, cell.options), (Decimal('90.00'), 12, 2))
+        
+        # Selling out the cheapest flight moves the lowest fare to the next one
+        cheapest = TravelOption.objects.get(travel_id='FC101')
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.reserve_seats(cheapest, 2)
+        cell = self.cell()
+        self.assertEqual((cell.min_price, cell.available_seats), (Decimal('120.00'), 10))
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.release_seats(cheapest, 1)
+        self.assertEqual(self.cell().min_price, Decimal('90.00'))
+        
+        other = TravelOption.objects.get(travel_id='FC100')
+        other.price = Decimal('80.00')
+        other.save()
+        self.assertEqual(self.cell().min_price, Decimal('80.00'))
+        
+        other.status = 'cancelled'
+        other.save()
+        cell = self.cell()
+        self.assertEqual((cell.min_price, cell.options), (Decimal('90.00'), 1))
+        
+        # Moving the last flight to another day empties the old cell
+        cheapest.departure_date = cheapest.arrival_date = self.day + timedelta(days=1)
+        cheapest.save()
+        self.assertFalse(FareCalendarDay.objects.filter(departure_date=self.day, travel_type='flight').exists())
+        self.assertEqual(self.cell(day=self.day + timedelta(days=1)).options, 1)
+        
+        cheapest.delete()
+        self.assertFalse(FareCalendarDay.objects.filter(travel_type='flight').exists())
+
+    def test_booking_refreshes_cell_after_commit(self):
+        """Test a booking transaction never writes the calendar row; the refresh follows the commit"""
+        option = TravelOption.objects.get(travel_id='FC101')
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries, transaction.atomic():
+                reservations.reserve_seats(option, 2)
+            self.assertFalse(any('farecalendarday' in query['sql'] for query in queries))
+            self.assertEqual(self.cell().available_seats, 12)
+        self.assertEqual(self.cell().available_seats, 10)
+
+    def test_expired_holds_refresh_cells(self):
+        """Test seats returned by the hold sweeper reach the calendar"""
+        option = TravelOption.objects.get(travel_id='FC101')
+        booking = Booking(user=self.user, number_of_seats=2, passenger_name='Fare User',
+                          passenger_email='fare@example.com', passenger_phone='5550100')
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.hold_seats(booking, option)
+        self.assertEqual(self.cell().min_price, Decimal('120.00'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.release_expired_holds(now=timezone.now() + timedelta(days=1))
+        cell = self.cell()
+        self.assertEqual((cell.min_price, cell.available_seats), (Decimal('90.00'), 12))
+
+    def test_api_returns_a_month(self):
+        """Test one request answers a whole month from the rollup"""
+        url = reverse('bookings:api_fare_calendar')
+        response = self.client.get(url, {'source': 'denv', 'destination': 'Omaha', 'month': '2031-05'})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual(data['month'], '2031-05')
+        self.assertEqual(data['days'], [
+            {'date': '2031-05-10', 'min_price': '35.00', 'available_seats': 52, 'options': 3},
+            {'date': '2031-05-11', 'min_price': '61.00', 'available_seats': 100, 'options': 1},
+            {'date': '2031-05-12', 'min_price': '62.00', 'available_seats': 100, 'options': 1},
+        ])
+        
+        response = self.client.get(url, {'source': 'Denver', 'destination': 'Omaha',
+                                         'month': '2031-05', 'travel_type': 'flight'})
+        self.assertEqual([day['min_price'] for day in response.json()['days']], ['90.00'])
+        
+        response = self.client.get(url, {'source': 'Denver', 'destination': 'Omaha', 'month': '2031-06'})
+        self.assertEqual(response.json()['days'], [])
+        
+        for params in [{'source': 'Denver'}, {'source': 'Denver', 'destination': 'Omaha', 'month': '2031-13'},
+                       {'source': 'Denver', 'destination': 'Omaha', 'travel_type': 'boat'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+    def test_rebuild_command_and_bulk_writers(self):
+        """Test the rebuild command restores drifted rows and imports keep cells current"""
+        expected = self.calendar_rows()
+        FareCalendarDay.objects.filter(travel_type='bus').update(min_price=Decimal('1.00'))
+        FareCalendarDay.objects.filter(travel_type='train').delete()
+        
+        out = StringIO()
+        call_command('rebuild_fare_calendar', batch_size=2, stdout=out)
+        self.assertIn('Rebuilt 4 fare calendar days', out.getvalue())
+        self.assertEqual(self.calendar_rows(), expected)
+        
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        handle.write(ImportTravelOptionsTest.header +
+                     'FC102,train,Denver,Omaha,2031-05-11,08:00,2031-05-11,16:00,55.00,40\n')
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        call_command('import_travel_options', handle.name, stdout=StringIO())
+        self.assertFalse(FareCalendarDay.objects.filter(travel_type='bus').exists())
+        cell = self.cell('train', self.day + timedelta(days=1))
+        self.assertEqual((cell.min_price, cell.options), (Decimal('55.00'), 2))
+        
+        fares.rebuild_fare_calendar()
+        self.assertEqual(self.cell('train', self.day + timedelta(days=1)).available_seats, 140)
+
+
+class ConnectionSearchTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        connection_graph.invalidate()
+        self.day = date.today() + timedelta(days=5)
+        self.addCleanup(connection_graph.invalidate)
+        for travel_id, travel_type, source, destination, departs, arrives, price, seats in [
+            ('FL3001', 'flight', 'Reno', 'Boise', time(8, 0), time(10, 0), '100.00', 20),
+            ('FL3002', 'flight', 'Boise', 'Fargo', time(11, 30), time(13, 0), '100.00', 2),
+            # Leaves before the 90 minute flight-to-bus connection time is up
+            ('BU3003', 'bus', 'Boise', 'Fargo', time(10, 20), time(14, 0), '20.00', 40),
+            ('TR3004', 'train', 'Boise', 'Fargo', time(12, 0), time(15, 0), '30.00', 40),
+            ('BU3005', 'bus', 'Reno', 'Fargo', time(6, 0), time(20, 0), '40.00', 40),
+        ]:
+            TravelOption.objects.create(
+                travel_id=travel_id, travel_type=travel_type, source=source, destination=destination,
+                departure_date=self.day, departure_time=departs, arrival_date=self.day,
+                arrival_time=arrives, price=Decimal(price), available_seats=seats,
+                total_seats=40, status='active',
+            )
+
+    def search(self, objective='earliest', **kwargs):
+        return [[leg.travel_id for leg in itinerary.legs]
+                for itinerary in find_connections('Reno', 'Fargo', self.day, objective, **kwargs)]
+
+    def test_objectives_rank_the_pareto_set(self):
+        """Test earliest, cheapest and fewest-transfer searches with connection times"""
+        self.assertEqual(self.search('earliest'), [['FL3001', 'FL3002'], ['FL3001', 'TR3004'], ['BU3005']])
+        self.assertEqual(self.search('cheapest'), [['BU3005'], ['FL3001', 'TR3004'], ['FL3001', 'FL3002']])
+        self.assertEqual(self.search('fewest', limit=1), [['BU3005']])
+        self.assertEqual(self.search(travel_types=['flight']), [['FL3001', 'FL3002']])
+        self.assertEqual(self.search(passengers=3)[0], ['FL3001', 'TR3004'])
+        self.assertEqual(self.search(max_legs=1), [['BU3005']])
+        self.assertEqual(find_connections('Reno', 'Fargo', self.day + timedelta(days=1)), [])
+        
+        itinerary = find_connections('reno', 'far', self.day)[0]
+        self.assertEqual((itinerary.price, itinerary.transfers), (Decimal('200.00'), 1))
+        self.assertEqual(itinerary.get_duration(), timedelta(hours=5))
+        self.assertEqual(itinerary.layovers(), [timedelta(minutes=90)])
+
+    def test_earlier_arrival_keeps_later_one_past_its_layover(self):
+        """Test an earlier arrival whose layover window has closed does not prune a later one"""
+        for travel_id, source, destination, departs, arrives in [
+            ('BU3101', 'Ogden', 'Salem', time(0, 30), time(1, 0)),
+            ('BU3102', 'Ogden', 'Salem', time(13, 0), time(14, 0)),
+            # 14 hours after the early bus arrives, past the 12 hour maximum layover
+            ('BU3103', 'Salem', 'Provo', time(15, 0), time(17, 0)),
+        ]:
+            TravelOption.objects.create(
+                travel_id=travel_id, travel_type='bus', source=source, destination=destination,
+                departure_date=self.day, departure_time=departs, arrival_date=self.day,
+                arrival_time=arrives, price=Decimal('25.00'), available_seats=40,
+                total_seats=40, status='active',
+            )
+        connection_graph.invalidate()
+        
+        itineraries = find_connections('Ogden', 'Provo', self.day)
+        self.assertEqual([[leg.travel_id for leg in itinerary.legs] for itinerary in itineraries],
+                         [['BU3102', 'BU3103']])
+
+    def test_graph_follows_writes(self):
+        """Test saves, deletes and reservations update a loaded graph in place"""
+        stats = connection_graph.stats()
+        self.assertEqual((stats['legs'], stats['cities']), (5, 3))
+        self.assertGreater(stats['memory_bytes'], 0)
+        
+        with CaptureQueriesContext(connection) as queries:
+            reservations.reserve_seats(TravelOption.objects.get(travel_id='FL3002'), 2)
+            self.assertEqual(self.search()[0], ['FL3001', 'TR3004'])
+        
+        train = TravelOption.objects.get(travel_id='TR3004')
+        train.departure_time = time(10, 30)
+        train.save()
+        self.assertEqual(self.search()[0], ['BU3005'])
+        
+        TravelOption.objects.get(travel_id='BU3005').delete()
+        self.assertEqual(self.search(), [])
+        self.assertEqual(connection_graph.stats()['legs'], 4)
+        self.assertFalse(any('bookings_traveloption"."departure_at" >=' in q['sql'] for q in queries))
+
+    def test_api_and_search_fallback(self):
+        """Test the connections API and the itineraries shown when nothing runs direct"""
+        url = reverse('bookings:api_connections')
+        response = self.client.get(url, {'source': 'Reno', 'destination': 'Fargo',
+                                         'date': self.day.isoformat(), 'sort': 'cheapest'})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        connections = response.json()['connections']
+        self.assertEqual([c['price'] for c in connections], ['40.00', '130.00', '200.00'])
+        self.assertEqual([leg['travel_id'] for leg in connections[1]['legs']], ['FL3001', 'TR3004'])
+        self.assertEqual(connections[1]['duration_minutes'], 420)
+        
+        for params in [{'source': 'Reno'}, {'source': 'Reno', 'destination': 'Fargo', 'sort': 'fastest'},
+                       {'source': 'Reno', 'destination': 'Fargo', 'travel_types': 'boat'},
+                       {'source': 'Reno', 'destination': 'Fargo', 'date': 'soon'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+        
+        response = self.client.get(reverse('bookings:search_results'), {
+            'source': 'Reno', 'destination': 'Fargo', 'travel_type': 'flight',
+            'departure_date': self.day.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['travel_options']), 0)
+        self.assertEqual([[leg.travel_id for leg in c.legs] for c in response.context['connections']],
+                         [['FL3001', 'FL3002']])
+        self.assertContains(response, 'connect in other cities')
+        
+        response = self.client.get(reverse('bookings:search_results'), {'source': 'Reno', 'destination': 'Fargo'})
+        self.assertEqual(response.context['connections'], [])
+
+    def test_benchmark_reports_graph_and_latency(self):
+        """Test the benchmark command reports build time, memory and search latency"""
+        out = StringIO()
+        call_command('benchmark_connections', queries=5, days=10, stdout=out)
+        output = out.getvalue()
+        for label in ('Legs:           5', 'Build time:', 'Memory:', 'earliest', 'cheapest', 'fewest'):
+            self.assertIn(label, output)
+
+class TravelCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        day = date.today() + timedelta(days=12)
+        self.options = [
+            TravelOption.objects.create(
+                travel_id=f'TC{number}', travel_type='train', source='Boise', destination='Spokane',
+                departure_date=day, departure_time=time(6 + number, 0), arrival_date=day,
+                arrival_time=time(9 + number, 0), price=Decimal('55.00'), available_seats=40,
+                total_seats=40, status='active'
+            )
+            for number in range(3)
+        ]
+        renders = mock.patch.object(travel_cards, 'render_card', wraps=travel_cards.render_card)
+        self.render_card = renders.start()
+        self.addCleanup(renders.stop)
+
+    def search(self):
+        response = self.client.get(reverse('bookings:search_results'), {'source': 'boise'})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changed_option_rerenders_only_its_card(self):
+        """Test cards are reused until their travel option changes, one card at a time"""
+        self.search()
+        self.assertEqual(self.render_card.call_count, 3)
+        self.search()
+        self.assertEqual(self.render_card.call_count, 3)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.reserve_seats(self.options[1], 4)
+        response = self.search()
+        self.assertEqual(self.render_card.call_count, 4)
+        self.assertEqual(self.render_card.call_args.args, (self.options[1], 'search'))
+        self.assertContains(response, '36 seats left')
+        self.assertContains(response, '40 seats left', count=2)
+
+    def test_variants_are_cached_separately(self):
+        """Test the home page does not reuse search cards, but repeat visits reuse its own"""
+        self.search()
+        self.client.get(reverse('bookings:home'))
+        self.assertEqual(self.render_card.call_count, 6)
+        response = self.client.get(reverse('bookings:home'))
+        self.assertEqual(self.render_card.call_count, 6)
+        self.assertContains(response, '40 seats available', count=3)
+
+    def test_cache_can_be_disabled(self):
+        """Test a zero CARD_CACHE_TIMEOUT renders every card on every request"""
+        with self.settings(CARD_CACHE_TIMEOUT=0):
+            self.search()
+            self.search()
+        self.assertEqual(self.render_card.call_count, 6)
+        with self.assertRaises(TemplateSyntaxError):
+            Template("{% load travel_cards %}{% travel_card option 'grid' %}").render(
+                Context({'option': self.options[0]}))
+
+    def test_cache_key_is_safe_for_any_travel_id(self):
+        """Test card cache keys hash the travel ID, so spaces and unicode cannot reach the cache backend"""
+        option = self.options[0]
+        option.travel_id = 'TC ÿ\n1'
+        key = travel_cards.card_cache_key(option, 'search')
+        self.assertRegex(key, r'^travel-card:search:[0-9a-f]{32}:\d+$')
+        self.assertNotEqual(key, travel_cards.card_cache_key(self.options[1], 'search'))
+        self.assertEqual(list(memcache_key_warnings(key)), [])
+
+    def test_benchmark_reports_each_mode(self):
+        """Test the render benchmark times the page uncached, with a cold and with a warm cache"""
+        out = StringIO()
+        call_command('benchmark_cards', cards=5, repeat=3, warmup=1, stdout=out)
+        for mode in ('uncached', 'cold cache', 'warm cache'):
+            self.assertIn(f'Mode:              {mode}', out.getvalue())
+        self.assertIn('Cards per page:    5', out.getvalue())
@@ -8,8 +8,15 @@ urlpatterns = [
     path('search/', views.search_results, name='search_results'),
     path('travel/<str:travel_id>/', views.travel_option_detail, name='travel_detail'),
     path('book/<str:travel_id>/', views.book_travel, name='book_travel'),
+    path('book/<str:travel_id>/hold/', views.hold_travel, name='hold_travel'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('booking/<str:booking_id>/', views.booking_detail, name='booking_detail'),
     path('booking/<str:booking_id>/cancel/', views.cancel_booking, name='cancel_booking'),
+    path('booking/<str:booking_id>/confirm/', views.confirm_booking, name='confirm_booking'),
     path('api/travel-options/', views.api_travel_options, name='api_travel_options'),
+    path('api/cities/', views.api_cities, name='api_cities'),
+    path('api/connections/', views.api_connections, name='api_connections'),
+    path('api/fare-calendar/', views.api_fare_calendar, name='api_fare_calendar'),
+    path('api/group-bookings/', views.api_group_booking, name='api_group_booking'),
+    path('api/v2/travel-options/', views.api_travel_options_v2, name='api_travel_options_v2'),
 ]
@@ -1,15 +1,31 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count, Max, Q, Window
 from django.utils import timezone
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from .models import TravelOption, Booking
-from .forms import BookingForm, TravelSearchForm
-import uuid
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from travel_booking.db_router import read_replica
+from travel_booking.query_budget import query_budget
+from .models import TravelOption, Booking, ArchivedBooking
+from .forms import BookingForm, PassengerForm, TravelSearchForm
+from .search import filter_route, normalize_city
+from .pagination import DURATION_ORDERING, KEYSET_ORDERING, paginate, approximate_count
+from .cities import city_index
+from .search_cache import cached_search
+from .fares import fare_calendar, month_range
+from .connections import OBJECTIVES, find_connections
+from .archive import find_booking
+from . import reservations
+from datetime import date, timedelta
+import hashlib
+import json
 
+@query_budget(4)
+@read_replica
 def home(request):
     """Home page with search form"""
     form = TravelSearchForm()
@@ -24,49 +40,113 @@ def home(request):
     }
     return render(request, 'bookings/home.html', context)
 
-def search_results(request):
-    """Search and filter travel options"""
-    form = TravelSearchForm(request.GET)
-    travel_options = TravelOption.objects.filter(
+def _filtered_travel_options(filters):
+    """Active upcoming travel options matching TravelSearchForm cleaned data"""
+    travel_options = filter_route(
+        _upcoming_travel_options(),
+        source=filters.get('source'),
+        destination=filters.get('destination'),
+    )
+    return _apply_filters(travel_options, filters)
+
+def _upcoming_travel_options():
+    return TravelOption.objects.filter(
         status='active',
         departure_date__gte=timezone.now().date()
     )
+
+def _apply_filters(travel_options, filters):
+    """Apply the search filters other than the route"""
+    if filters.get('departure_date'):
+        travel_options = travel_options.filter(
+            departure_date=filters['departure_date']
+        )
+    if filters.get('travel_type'):
+        travel_options = travel_options.filter(
+            travel_type=filters['travel_type']
+        )
+    if filters.get('max_price'):
+        travel_options = travel_options.filter(
+            price__lte=filters['max_price']
+        )
+    if filters.get('max_duration'):
+        travel_options = travel_options.filter(
+            duration_minutes__lte=filters['max_duration'] * 60
+        )
+    return travel_options
+
+def _ordering(filters):
+    """Keyset ordering for the requested sort"""
+    return DURATION_ORDERING if filters.get('sort') == 'duration' else KEYSET_ORDERING
+
+@query_budget(8)
+@read_replica
+def search_results(request):
+    """Search and filter travel options"""
+    form = TravelSearchForm(request.GET)
+    filters = form.cleaned_data if form.is_valid() else {}
+    cursor = request.GET.get('cursor')
+    with_count = _with_count(request, cursor)
+    
+    def build():
+        travel_options = _filtered_travel_options(filters)
+        return {
+            'page_obj': paginate(travel_options, cursor, 10, _ordering(filters)),
+            'result_count': approximate_count(travel_options) if with_count else None,
+        }
     
-    # Apply filters
-    if form.is_valid():
-        if form.cleaned_data['source']:
-            travel_options = travel_options.filter(
-                source__icontains=form.cleaned_data['source']
-            )
-        if form.cleaned_data['destination']:
-            travel_options = travel_options.filter(
-                destination__icontains=form.cleaned_data['destination']
-            )
-        if form.cleaned_data['departure_date']:
-            travel_options = travel_options.filter(
-                departure_date=form.cleaned_data['departure_date']
-            )
-        if form.cleaned_data['travel_type']:
-            travel_options = travel_options.filter(
-                travel_type=form.cleaned_data['travel_type']
-            )
-        if form.cleaned_data['max_price']:
-            travel_options = travel_options.filter(
-                price__lte=form.cleaned_data['max_price']
-            )
-    
-    # Pagination
-    paginator = Paginator(travel_options, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    results = cached_search('search_results', {**filters, 'cursor': cursor, 'count': with_count}, build)
+    page_obj = results['page_obj']
     
     context = {
         'form': form,
         'page_obj': page_obj,
         'travel_options': page_obj,
+        'result_count': results['result_count'],
+        'next_query': _cursor_query(request, page_obj.next_cursor),
+        'previous_query': _cursor_query(request, page_obj.previous_cursor),
+        'connections': _connections_without_direct(filters, page_obj, cursor),
     }
     return render(request, 'bookings/search_results.html', context)
 
+def _with_count(request, cursor):
+    """Whether to count the results: on the first page, or when ?count=1 asks"""
+    return not cursor or bool(request.GET.get('count'))
+
+def _connections_without_direct(filters, page_obj, cursor):
+    """Itineraries with transfers for a route search that found no direct options.
+    
+    Not cached with the search results: the legs depart from cities other
+    than the searched ones, whose cache versions would not cover them.
+    """
+    if list(page_obj) or cursor or not filters.get('source') or not filters.get('destination'):
+        return []
+    
+    connections = find_connections(
+        filters['source'],
+        filters['destination'],
+        day=filters.get('departure_date'),
+        objective='earliest',
+        travel_types=[filters['travel_type']] if filters.get('travel_type') else None,
+    )
+    return [
+        itinerary for itinerary in connections
+        if itinerary.transfers
+        and (not filters.get('max_price') or itinerary.price <= filters['max_price'])
+        and (not filters.get('max_duration') or itinerary.get_duration() <= timedelta(hours=filters['max_duration']))
+    ]
+
+def _cursor_query(request, cursor):
+    """Current query string with the pagination cursor replaced"""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('page', None)
+    query['cursor'] = cursor
+    return query.urlencode()
+
+@query_budget(4)
+@read_replica
 def travel_option_detail(request, travel_id):
     """Detail view for a travel option"""
     travel_option = get_object_or_404(TravelOption, travel_id=travel_id, status='active')
@@ -76,6 +156,7 @@ def travel_option_detail(request, travel_id):
     }
     return render(request, 'bookings/travel_detail.html', context)
 
+@query_budget(11)
 @login_required
 def book_travel(request, travel_id):
     """Handle travel booking"""
@@ -87,22 +168,16 @@ def book_travel(request, travel_id):
             booking = form.save(commit=False)
             booking.user = request.user
             booking.travel_option = travel_option
-            booking.total_price = booking.number_of_seats * travel_option.price
 
-            if booking.number_of_seats > travel_option.available_seats:
+            try:
+                reservations.create_booking(booking, travel_option)
+            except reservations.SeatsUnavailable:
                 messages.error(request, 'Not enough seats available.')
                 return render(request, 'bookings/book_travel.html', {
                     'form': form,
                     'travel_option': travel_option,
                 })
 
-            # Update available seats
-            travel_option.available_seats -= booking.number_of_seats
-            travel_option.save()
-
-            booking.booking_id = str(uuid.uuid4())
-            booking.save()
-
             messages.success(request, 'Booking confirmed!')
             return redirect('bookings:booking_detail', booking_id=booking.booking_id)
     else:
@@ -114,35 +189,98 @@ def book_travel(request, travel_id):
     }
     return render(request, 'bookings/book_travel.html', context)
 
+@query_budget(11)
+@login_required
+@require_POST
+def hold_travel(request, travel_id):
+    """Hold seats on a travel option while the user completes checkout"""
+    travel_option = get_object_or_404(TravelOption, travel_id=travel_id, status='active')
+    form = BookingForm(request.POST)
+    
+    if not form.is_valid():
+        return render(request, 'bookings/book_travel.html', {
+            'form': form,
+            'travel_option': travel_option,
+        })
+    
+    booking = form.save(commit=False)
+    booking.user = request.user
+    
+    try:
+        reservations.hold_seats(booking, travel_option)
+    except reservations.SeatsUnavailable:
+        messages.error(request, 'Not enough seats available.')
+        return render(request, 'bookings/book_travel.html', {
+            'form': form,
+            'travel_option': travel_option,
+        })
+    
+    messages.success(request, 'Seats held. Confirm your booking before the hold expires.')
+    return redirect('bookings:booking_detail', booking_id=booking.booking_id)
+
+@query_budget(7)
+@login_required
+@require_POST
+def confirm_booking(request, booking_id):
+    """Confirm a held booking"""
+    booking = get_object_or_404(Booking, booking_id=booking_id, user=request.user)
+    
+    if reservations.confirm_hold(booking):
+        messages.success(request, 'Booking confirmed!')
+    else:
+        messages.error(request, 'This hold has expired or its departure is no longer available. Please book again.')
+    return redirect('bookings:booking_detail', booking_id=booking_id)
+
+@query_budget(6)
 @login_required
 def dashboard(request):
     """User dashboard with bookings"""
+    today = timezone.now().date()
     bookings = Booking.objects.filter(user=request.user)
-    upcoming_bookings = bookings.filter(
-        travel_option__departure_date__gte=timezone.now().date(),
-        status='confirmed'
-    )
-    past_bookings = bookings.filter(
-        travel_option__departure_date__lt=timezone.now().date()
+    upcoming = Q(travel_option__departure_date__gte=today, status='confirmed')
+    past = Q(travel_option__departure_date__lt=today)
+    
+    # All statistics in a single conditional aggregate query
+    stats = bookings.aggregate(
+        total_bookings=Count('id'),
+        upcoming_count=Count('id', filter=upcoming),
+        past_count=Count('id', filter=past),
     )
+    upcoming_bookings = bookings.filter(upcoming).select_related('travel_option')
+    past_bookings = list(bookings.filter(past).select_related('travel_option')[:3])
+    
+    # Archived bookings are all in the past; one query returns the latest few
+    # together with their total through a window count. Fetch at least one
+    # row even when the live ones fill the list: the count rides on the rows.
+    remaining = max(3 - len(past_bookings), 1)
+    archived = list(ArchivedBooking.objects.filter(user=request.user).select_related('travel_option')
+                    .annotate(archived_count=Window(Count('id')))[:remaining])
+    archived_count = archived[0].archived_count if archived else 0
+    past_bookings = (past_bookings + archived)[:3]
     
     context = {
         'upcoming_bookings': upcoming_bookings,
         'past_bookings': past_bookings,
-        'total_bookings': bookings.count(),
+        'total_bookings': stats['total_bookings'] + archived_count,
+        'upcoming_count': stats['upcoming_count'],
+        'past_count': stats['past_count'] + archived_count,
     }
     return render(request, 'bookings/dashboard.html', context)
 
+@query_budget(4)
 @login_required
 def booking_detail(request, booking_id):
-    """Detail view for a booking"""
-    booking = get_object_or_404(Booking, booking_id=booking_id, user=request.user)
+    """Detail view for a booking, live or archived"""
+    booking = find_booking(booking_id, user=request.user)
+    if booking is None:
+        raise Http404('No booking matches the given query.')
     
     context = {
         'booking': booking,
     }
     return render(request, 'bookings/booking_detail.html', context)
 
+@query_budget(9)
 @login_required
 @require_POST
 def cancel_booking(request, booking_id):
@@ -154,36 +292,57 @@ def cancel_booking(request, booking_id):
         return redirect('bookings:booking_detail', booking_id=booking_id)
     
     # Cancel booking and restore seats
-    booking.status = 'cancelled'
-    booking.save()
-    
-    travel_option = booking.travel_option
-    travel_option.available_seats += booking.number_of_seats
-    travel_option.save()
+    if not reservations.cancel_booking(booking):
+        messages.error(request, 'This booking cannot be cancelled.')
+        return redirect('bookings:booking_detail', booking_id=booking_id)
     
     messages.success(request, 'Booking cancelled successfully.')
     return redirect('bookings:dashboard')
 
+@query_budget(6)
+@read_replica
 def api_travel_options(request):
     """API endpoint for travel options (for AJAX calls)"""
-    source = request.GET.get('source', '')
-    destination = request.GET.get('destination', '')
-    departure_date = request.GET.get('departure_date', '')
+    filters, params = _api_params(request)
     
-    travel_options = TravelOption.objects.filter(
-        status='active',
-        departure_date__gte=timezone.now().date()
-    )
+    def build():
+        travel_options = _filtered_travel_options(filters)
+        page = paginate(travel_options, params['cursor'], params['limit'], _ordering(filters))
+        count = approximate_count(travel_options) if params['count'] else None
+        return _api_payload(page, count)
     
-    if source:
-        travel_options = travel_options.filter(source__icontains=source)
-    if destination:
-        travel_options = travel_options.filter(destination__icontains=destination)
-    if departure_date:
-        travel_options = travel_options.filter(departure_date=departure_date)
+    return JsonResponse(cached_search('api_travel_options', params, build))
+
+def _api_params(request):
+    """Parse api_travel_options query parameters into (filters, cache params)"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    try:
+        max_duration = max(int(request.GET.get('max_duration', 0)), 0)
+    except ValueError:
+        max_duration = 0
     
+    filters = {
+        'source': request.GET.get('source', ''),
+        'destination': request.GET.get('destination', ''),
+        'departure_date': request.GET.get('departure_date', ''),
+        'max_duration': max_duration,
+        'sort': request.GET.get('sort', ''),
+    }
+    params = {
+        **filters,
+        'cursor': request.GET.get('cursor'),
+        'limit': limit,
+        'count': bool(request.GET.get('count')),
+    }
+    return filters, params
+
+def _api_payload(page, count=None):
+    """JSON body for one page of api_travel_options"""
     data = []
-    for option in travel_options[:20]:  # Limit results
+    for option in page:
         data.append({
             'travel_id': option.travel_id,
             'travel_type': option.get_travel_type_display(),
@@ -191,8 +350,275 @@ def api_travel_options(request):
             'destination': option.destination,
             'departure_date': option.departure_date.strftime('%Y-%m-%d'),
             'departure_time': option.departure_time.strftime('%H:%M'),
+            'duration_minutes': option.duration_minutes,
             'price': str(option.price),
             'available_seats': option.available_seats,
         })
     
-    return JsonResponse({'travel_options': data})
+    response = {
+        'travel_options': data,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+    if count is not None:
+        response['approximate_count'] = count
+    return response
+
+# Fields the v2 API can project, with their per-value JSON formatting
+TRAVEL_TYPE_LABELS = dict(TravelOption.TRAVEL_TYPES)
+API_V2_FIELDS = {
+    'travel_id': str,
+    'travel_type': TRAVEL_TYPE_LABELS.get,
+    'source': str,
+    'destination': str,
+    'departure_date': lambda value: value.isoformat(),
+    'departure_time': lambda value: value.strftime('%H:%M'),
+    'arrival_date': lambda value: value.isoformat(),
+    'arrival_time': lambda value: value.strftime('%H:%M'),
+    'departure_at': lambda value: value.isoformat(),
+    'arrival_at': lambda value: value.isoformat(),
+    'duration_minutes': int,
+    'price': str,
+    'available_seats': int,
+    'total_seats': int,
+}
+API_V2_DEFAULT_FIELDS = [
+    'travel_id', 'travel_type', 'source', 'destination',
+    'departure_date', 'departure_time', 'price', 'available_seats',
+]
+API_V2_MAX_LIMIT = 50000
+
+def _stream_travel_options(rows, fields):
+    """Yield a JSON document for value rows one chunk at a time"""
+    formatters = [API_V2_FIELDS[field] for field in fields]
+    yield '{"travel_options":['
+    separator = ''
+    for row in rows:
+        item = {field: fmt(value) for field, fmt, value in zip(fields, formatters, row)}
+        yield separator + json.dumps(item)
+        separator = ','
+    yield ']}'
+
+@query_budget(8)
+@require_GET
+def api_travel_options_v2(request):
+    """Streaming API endpoint for travel options with field projection.
+    
+    Only the requested columns are selected and rows are streamed from a
+    server-side iterator, so large result sets never sit in memory. The ETag
+    and Last-Modified headers come from the newest updated_at and the row
+    count, so unchanged results are answered with a 304.
+    """
+    fields = [f for f in request.GET.get('fields', '').split(',') if f] or API_V2_DEFAULT_FIELDS
+    unknown = [f for f in fields if f not in API_V2_FIELDS]
+    if unknown:
+        return JsonResponse({'error': f"Unknown fields: {', '.join(unknown)}"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 1000)), 1), API_V2_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    form = TravelSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+    travel_options = _filtered_travel_options(form.cleaned_data)
+    
+    # One aggregate query validates the client's cached copy
+    state = travel_options.order_by().aggregate(last_modified=Max('updated_at'), total=Count('id'))
+    last_modified = state['last_modified']
+    etag = quote_etag(hashlib.md5(
+        f"{state['total']}|{last_modified}|{request.GET.urlencode()}".encode(),
+        usedforsecurity=False,
+    ).hexdigest())
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if not_modified is not None:
+        return not_modified
+    
+    rows = (travel_options
+            .order_by(*_ordering(form.cleaned_data))
+            .values_list(*fields)[:limit]
+            .iterator(chunk_size=2000))
+    response = StreamingHttpResponse(
+        _stream_travel_options(rows, fields),
+        content_type='application/json',
+    )
+    response['ETag'] = etag
+    if last_modified_ts is not None:
+        response['Last-Modified'] = http_date(last_modified_ts)
+    return response
+
+@query_budget(3)
+@require_GET
+def api_connections(request):
+    """API endpoint for itineraries with up to max_legs legs, direct or via other cities.
+    
+    Answered from the in-memory connection graph (bookings.connections); the
+    only query loads the legs of the returned itineraries.
+    """
+    source = request.GET.get('source', '')
+    destination = request.GET.get('destination', '')
+    if not normalize_city(source) or not normalize_city(destination):
+        return JsonResponse({'error': 'source and destination are required'}, status=400)
+    
+    sort = request.GET.get('sort') or 'earliest'
+    if sort not in OBJECTIVES:
+        return JsonResponse({'error': f"sort must be one of {', '.join(OBJECTIVES)}"}, status=400)
+    travel_types = [t for t in request.GET.get('travel_types', '').split(',') if t]
+    unknown = [t for t in travel_types if t not in TRAVEL_TYPE_LABELS]
+    if unknown:
+        return JsonResponse({'error': f"Unknown travel types: {', '.join(unknown)}"}, status=400)
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else None
+        max_legs = min(max(int(request.GET.get('max_legs', 3)), 1), 4)
+        passengers = min(max(int(request.GET.get('passengers', 1)), 1), 10)
+        limit = min(max(int(request.GET.get('limit', 5)), 1), 20)
+    except ValueError:
+        return JsonResponse({'error': 'date must be YYYY-MM-DD and numbers must be integers'}, status=400)
+    
+    connections = find_connections(source, destination, day, sort, max_legs, passengers, travel_types or None, limit)
+    data = []
+    for itinerary in connections:
+        data.append({
+            'departure_at': itinerary.departure_at.isoformat(),
+            'arrival_at': itinerary.arrival_at.isoformat(),
+            'duration_minutes': int(itinerary.get_duration().total_seconds() // 60),
+            'price': str(itinerary.price),
+            'transfers': itinerary.transfers,
+            'legs': [
+                {
+                    'travel_id': leg.travel_id,
+                    'travel_type': leg.get_travel_type_display(),
+                    'source': leg.source,
+                    'destination': leg.destination,
+                    'departure_at': leg.departure_at.isoformat(),
+                    'arrival_at': leg.arrival_at.isoformat(),
+                    'price': str(leg.price),
+                }
+                for leg in itinerary.legs
+            ],
+        })
+    
+    return JsonResponse({'connections': data})
+
+@query_budget(6)
+@require_GET
+def api_fare_calendar(request):
+    """API endpoint for the lowest fare and open seats per day of a month on a route.
+    
+    Served from the FareCalendarDay rollup, so a month costs one indexed
+    range query instead of a search per day. Past days are left out.
+    """
+    source = request.GET.get('source', '')
+    destination = request.GET.get('destination', '')
+    if not normalize_city(source) or not normalize_city(destination):
+        return JsonResponse({'error': 'source and destination are required'}, status=400)
+    
+    today = timezone.now().date()
+    month = request.GET.get('month') or today.strftime('%Y-%m')
+    try:
+        first, last = month_range(month)
+    except ValueError:
+        return JsonResponse({'error': 'month must be in YYYY-MM format'}, status=400)
+    
+    travel_type = request.GET.get('travel_type', '')
+    if travel_type and travel_type not in TRAVEL_TYPE_LABELS:
+        return JsonResponse({'error': f'Unknown travel_type: {travel_type}'}, status=400)
+    
+    params = {
+        'source': source,
+        'destination': destination,
+        'month': first.strftime('%Y-%m'),
+        'travel_type': travel_type,
+    }
+    
+    def build():
+        return {
+            **params,
+            'days': fare_calendar(source, destination, max(first, today), last, travel_type),
+        }
+    
+    return JsonResponse(cached_search('api_fare_calendar', params, build))
+
+GROUP_BOOKING_MAX_PASSENGERS = 10
+GROUP_BOOKING_MAX_LEGS = 4
+
+@query_budget(12)
+@login_required
+@require_POST
+def api_group_booking(request):
+    """API endpoint that books several passengers on one or more travel options at once.
+    
+    Takes a JSON body {"travel_ids": [...], "passengers": [{"name", "email",
+    "phone"}, ...], "hold": false} and books every passenger on every leg in
+    one transaction, or nothing (see reservations.create_group_booking).
+    """
+    try:
+        body = json.loads(request.body)
+        travel_ids = list(dict.fromkeys(body['travel_ids']))
+        passenger_data = list(body['passengers'])
+        hold = bool(body.get('hold'))
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Body must be JSON with travel_ids and passengers lists'}, status=400)
+    if not 1 <= len(travel_ids) <= GROUP_BOOKING_MAX_LEGS:
+        return JsonResponse({'error': f'Book between 1 and {GROUP_BOOKING_MAX_LEGS} travel options'}, status=400)
+    if not 1 <= len(passenger_data) <= GROUP_BOOKING_MAX_PASSENGERS:
+        return JsonResponse({'error': f'Book between 1 and {GROUP_BOOKING_MAX_PASSENGERS} passengers'}, status=400)
+    
+    passengers = []
+    for index, data in enumerate(passenger_data):
+        form = PassengerForm(data if isinstance(data, dict) else {})
+        if not form.is_valid():
+            return JsonResponse({'error': f'Invalid passenger {index + 1}', 'fields': form.errors}, status=400)
+        passengers.append(form.save(commit=False))
+    
+    found = TravelOption.objects.in_bulk(travel_ids, field_name='travel_id')
+    missing = [travel_id for travel_id in travel_ids if travel_id not in found or found[travel_id].status != 'active']
+    if missing:
+        return JsonResponse({'error': f"Unknown or inactive travel options: {', '.join(map(str, missing))}"}, status=404)
+    
+    try:
+        bookings = reservations.create_group_booking(
+            request.user,
+            [found[travel_id] for travel_id in travel_ids],
+            passengers,
+            hold_minutes=settings.BOOKING_HOLD_MINUTES if hold else None,
+        )
+    except reservations.SeatsUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+    
+    return JsonResponse({
+        'group_id': bookings[0].group_id,
+        'status': bookings[0].status,
+        'passengers': len(passengers),
+        'total_price': str(sum(booking.total_price for booking in bookings)),
+        'bookings': [
+            {
+                'booking_id': booking.booking_id,
+                'travel_id': booking.travel_option.travel_id,
+                'seats': booking.number_of_seats,
+                'total_price': str(booking.total_price),
+            }
+            for booking in bookings
+        ],
+    }, status=201)
+
+@query_budget(3)
+def api_cities(request):
+    """API endpoint for city autocomplete, served from the in-memory city index"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    
+    data = []
+    if query.strip():
+        for name, departures in city_index.suggest(query, limit):
+            data.append({
+                'name': name,
+                'departures': departures,
+            })
+    
+    return JsonResponse({'cities': data})
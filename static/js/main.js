@@ -62,52 +62,60 @@ function initializeSearch() {
     const sourceInput = document.querySelector('input[name="source"]');
     const destinationInput = document.querySelector('input[name="destination"]');
     
-    if (sourceInput || destinationInput) {
-        const cities = [
-            'New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix',
-            'Philadelphia', 'San Antonio', 'San Diego', 'Dallas', 'San Jose',
-            'Austin', 'Jacksonville', 'Fort Worth', 'Columbus', 'Charlotte',
-            'San Francisco', 'Indianapolis', 'Seattle', 'Denver', 'Washington DC',
-            'Boston', 'El Paso', 'Nashville', 'Detroit', 'Oklahoma City',
-            'Portland', 'Las Vegas', 'Memphis', 'Louisville', 'Baltimore',
-            'Milwaukee', 'Albuquerque', 'Tucson', 'Fresno', 'Sacramento',
-            'Kansas City', 'Mesa', 'Atlanta', 'Colorado Springs', 'Omaha'
-        ];
+    [sourceInput, destinationInput].forEach(input => {
+        if (input) {
+            setupAutoComplete(input, fetchCitySuggestions);
+        }
+    });
+}
 
-        [sourceInput, destinationInput].forEach(input => {
-            if (input) {
-                setupAutoComplete(input, cities);
-            }
-        });
-    }
+// City suggestions from the server-side autocomplete index
+function fetchCitySuggestions(query) {
+    return fetch(`/api/cities/?q=${encodeURIComponent(query)}`, {
+        headers: {'X-Requested-With': 'XMLHttpRequest'}
+    })
+        .then(response => response.ok ? response.json() : {cities: []})
+        .then(data => data.cities.map(city => city.name))
+        .catch(() => []);
 }
 
 // Auto-complete setup
-function setupAutoComplete(input, suggestions) {
+function setupAutoComplete(input, fetchSuggestions) {
     let currentFocus = -1;
+    let debounceTimer = null;
     
     input.addEventListener('input', function() {
         const value = this.value;
         closeAllLists();
+        clearTimeout(debounceTimer);
         
-        if (!value) return false;
-        
-        const listContainer = document.createElement('div');
-        listContainer.setAttribute('id', this.id + '-autocomplete-list');
-        listContainer.setAttribute('class', 'autocomplete-items');
-        this.parentNode.appendChild(listContainer);
+        if (!value.trim()) return false;
         
-        suggestions.forEach(suggestion => {
-            if (suggestion.toLowerCase().includes(value.toLowerCase())) {
-                const item = document.createElement('div');
-                item.innerHTML = suggestion.replace(new RegExp(value, 'gi'), '<strong>$&</strong>');
-                item.addEventListener('click', function() {
-                    input.value = suggestion;
-                    closeAllLists();
+        debounceTimer = setTimeout(() => {
+            fetchSuggestions(value).then(suggestions => {
+                if (input.value !== value) return;
+                closeAllLists();
+                currentFocus = -1;
+                
+                const listContainer = document.createElement('div');
+                listContainer.setAttribute('id', input.id + '-autocomplete-list');
+                listContainer.setAttribute('class', 'autocomplete-items');
+                input.parentNode.appendChild(listContainer);
+                
+                suggestions.forEach(suggestion => {
+                    const item = document.createElement('div');
+                    const strong = document.createElement('strong');
+                    strong.textContent = suggestion.substring(0, value.trim().length);
+                    item.appendChild(strong);
+                    item.appendChild(document.createTextNode(suggestion.substring(value.trim().length)));
+                    item.addEventListener('click', function() {
+                        input.value = suggestion;
+                        closeAllLists();
+                    });
+                    listContainer.appendChild(item);
                 });
-                listContainer.appendChild(item);
-            }
-        });
+            });
+        }, 150);
     });
     
     input.addEventListener('keydown', function(e) {
@@ -2,6 +2,8 @@
 ASGI config for travel_booking project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests served through it use travel_booking.asgi_urls, which routes the
+search and API views to their native async versions in bookings.async_views.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +11,25 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travel_booking.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'travel_booking.asgi_urls'
+
+
+class TravelBookingASGIHandler(ASGIHandler):
+    """ASGI handler that resolves requests against the async URLconf"""
+
+    async def get_response_async(self, request):
+        request.urlconf = ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+application = TravelBookingASGIHandler()
+
+from bookings.sweeper import start_configured_hold_sweeper  # noqa: E402
+
+start_configured_hold_sweeper()
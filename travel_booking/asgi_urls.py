@@ -0,0 +1,20 @@
+"""
+URL configuration for the ASGI application (see asgi.py).
+
+The same routes as travel_booking.urls, except that the bookings app is
+served from bookings.async_urls.
+"""
+from django.contrib import admin
+from django.urls import path, include
+from django.conf import settings
+from django.conf.urls.static import static
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('bookings.async_urls')),
+    path('accounts/', include('accounts.urls')),
+]
+
+# Serve media files during development
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
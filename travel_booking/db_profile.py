@@ -0,0 +1,102 @@
+"""
+Database tuning profiles.
+
+DATABASE_PROFILE picks how connections to every database in DATABASES are
+opened and kept. The profile owns CONN_MAX_AGE and CONN_HEALTH_CHECKS (and
+SQLite's transaction_mode), so change the profile rather than those keys.
+
+'development' keeps Django's defaults: a new connection per request and
+SQLite's rollback journal.
+
+'production' keeps connections open across requests (CONN_MAX_AGE) and pings
+them before reuse (CONN_HEALTH_CHECKS), so a dropped connection is replaced
+instead of failing the request. On SQLite every new connection also runs
+SQLITE_PRAGMAS:
+
+* journal_mode=WAL lets searches keep reading while a booking is being
+  written, instead of waiting for the writer's exclusive lock. The mode is
+  stored in the database file and survives switching back to 'development'.
+* synchronous=NORMAL syncs at checkpoints rather than every commit. The
+  database stays consistent; a power cut may lose the last few commits.
+* busy_timeout waits for the write lock instead of failing at once with
+  "database is locked".
+* mmap_size and cache_size serve reads from mapped memory and a larger page
+  cache.
+
+Transactions also start IMMEDIATE, taking the write lock up front, so a
+transaction that reads before it writes never fails upgrading its lock.
+
+MySQL has no connection pool in Django; the profile gives each worker thread
+a persistent, health-checked connection. Put a pooler such as ProxySQL in
+front of the server to share connections between processes.
+
+Run `manage.py benchmark_database` to compare the profiles.
+"""
+import copy
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+
+PROFILES = ('development', 'production')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # milliseconds
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative means KiB: 64 MiB per connection
+    'temp_store': 'MEMORY',
+}
+
+PRODUCTION_CONN_MAX_AGE = {
+    # Seconds; keep MySQL's below the server's wait_timeout
+    'sqlite': 600,
+    'mysql': 300,
+}
+DEFAULT_CONN_MAX_AGE = 300
+
+
+def vendor(config):
+    """'sqlite', 'mysql', 'postgresql'... from a DATABASES entry's ENGINE"""
+    return config.get('ENGINE', '').rsplit('.', 1)[-1].replace('sqlite3', 'sqlite')
+
+
+def tune_database(config, profile):
+    """Return a copy of one DATABASES entry set up for the profile"""
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(
+            f"DATABASE_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}.")
+
+    tuned = copy.deepcopy(config)
+    tuned['PROFILE'] = profile
+    options = tuned.setdefault('OPTIONS', {})
+    engine = vendor(tuned)
+    if profile == 'development':
+        tuned['CONN_MAX_AGE'] = 0
+        tuned['CONN_HEALTH_CHECKS'] = False
+        if engine == 'sqlite':
+            options.pop('transaction_mode', None)
+        return tuned
+
+    tuned['CONN_MAX_AGE'] = PRODUCTION_CONN_MAX_AGE.get(engine, DEFAULT_CONN_MAX_AGE)
+    tuned['CONN_HEALTH_CHECKS'] = True
+    if engine == 'sqlite':
+        options['transaction_mode'] = 'IMMEDIATE'
+    elif engine == 'mysql':
+        options.setdefault('connect_timeout', 5)
+        options.setdefault('init_command', "SET sql_mode='STRICT_TRANS_TABLES'")
+    return tuned
+
+
+def apply_database_profile(databases, profile):
+    """Tune every entry of DATABASES for the profile"""
+    return {alias: tune_database(config, profile) for alias, config in databases.items()}
+
+
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or connection.settings_dict.get('PROFILE') != 'production':
+        return
+    for name, value in SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(set_sqlite_pragmas, dispatch_uid='travel_booking.db_profile')
@@ -0,0 +1,127 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Views marked with @read_replica send their reads of REPLICA_APP_LABELS models
+to the REPLICA_DATABASE_ALIAS database when it is configured in DATABASES;
+everything else, every write, select_for_update() and any read inside a
+transaction stays on 'default'. Sessions and users are read from the primary
+because they are written on every login.
+
+Replicas lag behind the primary, so after a user changes something (any
+successful POST, PUT, PATCH or DELETE) ReplicaRoutingMiddleware sets a signed
+cookie holding a deadline, and their requests read from the primary until
+REPLICA_STICKY_SECONDS have passed. The cookie costs no query, unlike a
+session write, so it never counts against a write view's query budget; they see their own booking or
+cancellation immediately instead of a stale replica. Cached search results
+are keyed on whether they were read from the replica (see
+bookings.search_cache), so a lagging replica's rows are never served to a
+user reading from the primary.
+
+Without a replica alias the router sends everything to 'default' and the
+middleware does nothing, so single-database setups are unaffected.
+"""
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'primary_until'
+STICKY_COOKIE_SALT = 'travel_booking.db_router'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def read_replica(view_func):
+    """Allow a read-only view to read from the replica"""
+    view_func.read_replica = True
+    return view_func
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is no replica"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', None)
+    return alias if alias and alias in connections.settings else None
+
+
+def replica_reads_active():
+    """Whether reads of REPLICA_APP_LABELS models currently go to the replica"""
+    return (_replica_reads.get() and replica_alias() is not None
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block)
+
+
+def stick_to_primary(response):
+    """Send the user's reads to the primary for REPLICA_STICKY_SECONDS"""
+    seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 15)
+    response.set_signed_cookie(STICKY_COOKIE, str(time.time() + seconds), salt=STICKY_COOKIE_SALT,
+                               max_age=seconds, httponly=True, samesite='Lax')
+
+
+def is_sticky(request):
+    deadline = request.get_signed_cookie(STICKY_COOKIE, default=None, salt=STICKY_COOKIE_SALT)
+    try:
+        return deadline is not None and float(deadline) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryReplicaRouter:
+    """Database router for one primary ('default') and an optional replica"""
+
+    def db_for_read(self, model, **hints):
+        if (not replica_reads_active()
+                or model._meta.app_label not in getattr(settings, 'REPLICA_APP_LABELS', ['bookings'])):
+            return DEFAULT_DB_ALIAS
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write instances read from the replica back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Route @read_replica views to the replica unless the user recently wrote"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self.after_response(request, response)
+
+    async def __acall__(self, request):
+        token = _replica_reads.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self.after_response(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (getattr(view_func, 'read_replica', False) and request.method in SAFE_METHODS
+                and replica_alias() and not is_sticky(request)):
+            _replica_reads.set(True)
+
+    def after_response(self, request, response):
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and replica_alias()):
+            stick_to_primary(response)
+        return response
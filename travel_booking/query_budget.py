@@ -0,0 +1,167 @@
+"""
+Per-request SQL query budgets with N+1 detection.
+
+Views declare how many queries a request may run with the @query_budget
+decorator. QueryBudgetMiddleware records every statement executed while the
+request is handled, groups statements by shape (the SQL with its parameters
+and IN-list lengths stripped) and reports requests that exceed their budget or
+repeat one shape QUERY_BUDGET_REPEAT_THRESHOLD times or more, which is the
+signature of an N+1 loop.
+
+QUERY_BUDGET_MODE controls what happens on a violation: 'log' emits a
+warning, 'raise' raises QueryBudgetExceeded (useful in tests), and None (the
+default) disables recording. Settings turn on 'log' only when DEBUG is set.
+
+Queries a StreamingHttpResponse runs while its content is iterated count
+towards the request too; the check then runs once the stream is exhausted,
+after the headers have gone out, so X-Query-Count is not sent for it.
+
+Under ASGI, database work for a request runs in the request's thread-sensitive
+executor thread rather than on the event loop, and connections are per
+thread, so the middleware installs its wrappers from that thread.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in 'raise' mode when a request breaks its query budget"""
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of queries a view may run per request"""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def query_shape(sql):
+    """Reduce a SQL statement to its shape so parameter variations compare equal"""
+    return _WHITESPACE.sub(' ', _IN_LIST.sub('(%s...)', sql)).strip()
+
+
+class QueryLog:
+    """Collects the SQL executed on every database connection while active"""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated_shapes(self, threshold=None):
+        """Return {shape: count} for shapes executed at least threshold times"""
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+        counts = Counter(query_shape(sql) for sql in self.queries)
+        return {shape: n for shape, n in counts.items() if n >= threshold}
+
+    def violations(self, budget=None):
+        """Describe budget and N+1 violations, one string per problem"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} queries exceeds the budget of {budget}')
+        for shape, n in self.repeated_shapes().items():
+            problems.append(f'possible N+1: {n}x {shape[:200]}')
+        return problems
+
+
+class QueryBudgetMiddleware:
+    """Record queries per request and enforce the view's declared budget"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', None)
+        if not mode:
+            return self.get_response(request)
+
+        with QueryLog() as log:
+            response = self.get_response(request)
+        return self.check(request, response, log, mode)
+
+    async def __acall__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', None)
+        if not mode:
+            return await self.get_response(request)
+
+        log = QueryLog()
+        await sync_to_async(log.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(log.__exit__)(None, None, None)
+        return self.check(request, response, log, mode)
+
+    def check(self, request, response, log, mode):
+        response.query_log = log
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(request, response.streaming_content, log, mode)
+            return response
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(log.count)
+        self.report(request, log, mode)
+        return response
+
+    def stream(self, request, content, log, mode):
+        """Keep recording while a streaming response is iterated, then check"""
+        with log:
+            yield from content
+        self.report(request, log, mode)
+
+    def report(self, request, log, mode):
+        problems = log.violations(getattr(request, 'query_budget', None))
+        if problems:
+            message = f'{request.method} {request.path}: ' + '; '.join(problems)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin with assertions over the middleware's query log"""
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        log = response.query_log
+        if budget is None:
+            budget = response.wsgi_request.query_budget
+        problems = log.violations(budget)
+        if problems:
+            self.fail('; '.join(problems))
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from travel_booking.db_profile import apply_database_profile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,11 +44,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'travel_booking.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'travel_booking.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,8 +61,16 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process. Django already does this
+            # by default; listed explicitly so customizing the loaders keeps it.
+            # The development server still picks up edited templates.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -84,6 +96,20 @@ DATABASES = {
     }
 }
 
+# Read-only views (marked @read_replica) read from this alias when it is defined;
+# writes stay on 'default' (see travel_booking/db_router.py). To try it locally
+# with a second SQLite file, copy db.sqlite3 to db.replica.sqlite3 and add:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'db.replica.sqlite3',
+# }
+DATABASE_ROUTERS = ['travel_booking.db_router.PrimaryReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+REPLICA_APP_LABELS = ['bookings']
+# Seconds a user's reads stay on the primary after they book, cancel or
+# otherwise write, so they never see a lagging replica
+REPLICA_STICKY_SECONDS = 15
+
 # Uncomment below for MySQL configuration
 # DATABASES = {
 #     'default': {
@@ -99,6 +125,25 @@ DATABASES = {
 #     }
 # }
 
+# Connection tuning for every database above (see travel_booking/db_profile.py).
+# 'development' keeps Django's defaults; 'production' keeps connections open
+# with health checks and, on SQLite, turns on WAL and the other pragmas.
+# The profile sets CONN_MAX_AGE and CONN_HEALTH_CHECKS, so don't set them above.
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'development')
+DATABASES = apply_database_profile(DATABASES, DATABASE_PROFILE)
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Swap the backend for Redis or Memcached to share the search cache across processes
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'travel-booking',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -149,6 +194,51 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'bookings:dashboard'
 LOGOUT_REDIRECT_URL = 'bookings:home'
 
+# Query budgets (see travel_booking/query_budget.py)
+# 'log' warns about over-budget or N+1 requests, 'raise' fails them, None disables.
+# Recording wraps every query, so it is only on while developing
+QUERY_BUDGET_MODE = 'log' if DEBUG else None
+QUERY_BUDGET_REPEAT_THRESHOLD = 5
+
+# Seat holds
+BOOKING_HOLD_MINUTES = 15
+# Seconds between sweeps of expired holds by a thread in each WSGI/ASGI server
+# process; None disables the sweeper (use the release_expired_holds management
+# command from cron instead)
+BOOKING_HOLD_SWEEP_INTERVAL = None
+
+# Node number (0-1048575) embedded in booking IDs (see bookings/ids.py); give each
+# worker process its own to guarantee unique IDs, or leave None for a random one
+BOOKING_ID_NODE = None
+
+# Days after departure before travel options and their bookings move to the
+# archive tables (see bookings/archive.py and the archive_departed command)
+ARCHIVE_AFTER_DAYS = 30
+
+# Seconds before the in-memory city autocomplete index reloads from the database
+CITY_INDEX_MAX_AGE = 300
+
+# Connection search (see bookings/connections.py). Minimum minutes between legs
+# is the larger of the two modes' values, plus a penalty when the mode changes
+CONNECTION_MIN_MINUTES = {'flight': 60, 'train': 15, 'bus': 15}
+CONNECTION_MODE_CHANGE_MINUTES = 30
+CONNECTION_MAX_LAYOVER_MINUTES = 12 * 60
+# Seconds before the in-memory connection graph reloads from the database
+CONNECTION_GRAPH_MAX_AGE = 300
+
+# Seconds a search result count is cached for the keyset paginator
+KEYSET_COUNT_CACHE_SECONDS = 60
+
+# Search result cache; entries are invalidated per route on any TravelOption change
+SEARCH_CACHE_ALIAS = 'default'
+SEARCH_CACHE_TIMEOUT = 120
+
+# Rendered travel option cards (see bookings/templatetags/travel_cards.py). Keys
+# include travel_id and updated_at, so a changed option never shows stale markup;
+# 0 renders every card fresh
+CARD_CACHE_ALIAS = 'default'
+CARD_CACHE_TIMEOUT = 3600
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
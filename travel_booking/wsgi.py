@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travel_booking.settings')
 
 application = get_wsgi_application()
+
+from bookings.sweeper import start_configured_hold_sweeper  # noqa: E402
+
+start_configured_hold_sweeper()